@@ -1,8 +1,11 @@
 import json
+import os
 import argparse
 from tqdm import tqdm
 from src.data.loader import NuScenesLoader
 from src.model.vlm_client import VLMClient
+from src.data.images import load_camera_images
+from src.cache import DiskLRUCache
 from src.benchmark_deprecated import GROUND_TRUTH, ALL_TAGS
 
 # Standard Prompt (The "Naive" Approach)
@@ -28,7 +31,9 @@ def check_metadata(loader, token):
 def run_baselines():
     print("🚀 Running Baselines on Gold Set...")
     loader = NuScenesLoader()
-    client = VLMClient(model_id="qwen3-vl-instruct") # Use standard model
+    # Reruns replay identical requests from the response cache instead of regenerating
+    os.makedirs("output/cache", exist_ok=True)
+    client = VLMClient(model_id="qwen3-vl-instruct", response_cache=DiskLRUCache("output/cache/responses.sqlite")) # Use standard model
     
     results = []
 
@@ -39,7 +44,7 @@ def run_baselines():
         # 2. Vanilla VLM Baseline
         paths = loader.get_camera_paths(token)
         # Load images (simple load)
-        images = {k: client._load_image_from_path(v) for k,v in paths.items() if k in ["CAM_FRONT_LEFT", "CAM_FRONT", "CAM_FRONT_RIGHT"]} # You might need to adjust image loading logic here to match your main script
+        images = load_camera_images({k: v for k,v in paths.items() if k in ["CAM_FRONT_LEFT", "CAM_FRONT", "CAM_FRONT_RIGHT"]}, max_size=(1280, 1280))
         
         # Call VLM (Simple)
         try:
@@ -59,7 +64,7 @@ def run_baselines():
     with open("output/baseline_results.jsonl", "w") as f:
         for r in results:
             f.write(json.dumps(r) + "\n")
-    print("✅ Baselines Done.")
+    print(f"✅ Baselines Done. Response cache: {client.response_cache.stats()}")
 
 if __name__ == "__main__":
     # Note: Ensure you have your VLMClient image loading logic accessible or adapted
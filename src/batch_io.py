@@ -0,0 +1,138 @@
+# src/batch_io.py
+# Offline batch mode for the VLM stage.
+#
+# EXPORT: decode + YOLOE + encode every frame on CPU and write the ready-to-send
+#         chat requests (OpenAI batch format, keyed by sample token) to sharded files.
+# IMPORT: read the matching batch output files produced by an offline engine
+#         (vLLM run_batch, OpenAI Batch API, ...) and run the usual JSON extraction,
+#         metrics and index/log writing over them.
+#
+# A manifest next to the shards keeps what the index needs but the engine never sees
+# (YOLO inventory, detector latency, sanitized prompt).
+import glob
+import json
+import os
+import time
+from tqdm import tqdm
+
+from src.mining import load_camera_images, run_detector, build_log_entry, build_index_entry, commit_frame, MAX_IMAGE_SIZE
+
+
+def _manifest_path(export_dir, output_name):
+    return os.path.join(export_dir, f"manifest_{output_name}.jsonl")
+
+
+def _read_jsonl(path):
+    with open(path, 'r') as f:
+        for line in f:
+            try: yield json.loads(line)
+            except: pass
+
+
+def export_requests(loader, detector, client, system_prompt, tokens, export_dir, output_name, shard_size=500,
+                    max_image_size=MAX_IMAGE_SIZE, detection_store=None):
+    """Writes requests_{output_name}_NNNNN.jsonl shards. Re-running continues where it stopped."""
+    os.makedirs(export_dir, exist_ok=True)
+    manifest_file = _manifest_path(export_dir, output_name)
+
+    exported = set()
+    if os.path.exists(manifest_file):
+        exported = {m['token'] for m in _read_jsonl(manifest_file)}
+    shard = len(glob.glob(os.path.join(export_dir, f"requests_{output_name}_*.jsonl")))
+    todo = [t for t in tokens if t not in exported]
+    print(f"📦 Exporting {len(todo)} request(s) to {export_dir} ({len(exported)} already exported)")
+
+    f_shard = None
+    in_shard = 0
+    with open(manifest_file, 'a') as f_manifest:
+        try:
+            for token in tqdm(todo):
+                images = load_camera_images(loader, token, max_size=max_image_size)
+                if images is None: continue
+
+                t0 = time.time()
+                inventory = run_detector(detector, images, detection_store, token)
+                yolo_duration = time.time() - t0
+                messages = client.build_messages(images, system_prompt, object_inventory=inventory)
+
+                # Always start a fresh shard per run so a partly written one is never appended to
+                if f_shard is None or in_shard >= shard_size:
+                    if f_shard: f_shard.close()
+                    shard_file = os.path.join(export_dir, f"requests_{output_name}_{shard:05d}.jsonl")
+                    f_shard = open(shard_file, 'w')
+                    shard += 1
+                    in_shard = 0
+
+                request = {
+                    "custom_id": token,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": client.request_kwargs(messages),
+                }
+                f_shard.write(json.dumps(request) + "\n")
+                f_shard.flush()
+                in_shard += 1
+
+                f_manifest.write(json.dumps({
+                    "token": token,
+                    "timestamp": t0,
+                    "model": client.model_id,
+                    "yolo_inventory": inventory,
+                    "perf_yolo_latency": yolo_duration,
+                    "prompt_messages": client._sanitize_for_logging(messages),
+                    "shard": os.path.basename(shard_file),
+                }) + "\n")
+                f_manifest.flush()
+        finally:
+            if f_shard: f_shard.close()
+
+    print(f"✅ Export done. Feed {export_dir}/requests_{output_name}_*.jsonl to the batch engine.")
+
+
+def import_responses(client, response_glob, export_dir, output_name, index_file, log_file, processed_tokens, verbose=False,
+                     prompt_registry=None):
+    """Parses batch output lines into the standard index/log files (resume-safe)."""
+    manifest_file = _manifest_path(export_dir, output_name)
+    if not os.path.exists(manifest_file):
+        raise FileNotFoundError(f"No manifest at {manifest_file}. Export requests first.")
+    manifest = {m['token']: m for m in _read_jsonl(manifest_file)}
+
+    response_files = sorted(glob.glob(response_glob))
+    print(f"📥 Importing {len(response_files)} response file(s) for {len(manifest)} exported frame(s)")
+
+    n_ok = n_fail = n_skip = 0
+    with open(index_file, 'a') as f_index, open(log_file, 'a') as f_log:
+        for path in response_files:
+            for line in tqdm(list(_read_jsonl(path)), desc=os.path.basename(path)):
+                token = line.get("custom_id")
+                meta = manifest.get(token)
+                if meta is None or token in processed_tokens:
+                    n_skip += 1
+                    continue
+
+                response = line.get("response") or {}
+                body = response.get("body")
+                if line.get("error") or response.get("status_code", 200) != 200 or not body:
+                    result = client._new_result(meta.get("prompt_messages"))
+                    result["error"] = str(line.get("error") or body or "Empty batch response")
+                else:
+                    result = client.parse_completion(body, meta.get("prompt_messages"))
+
+                inventory = meta.get("yolo_inventory")
+                # Generation time is not observable offline -> VLM latency is 0 here
+                log_entry = build_log_entry(
+                    token, meta.get("model", client.model_id), inventory, result, 1,
+                    meta.get("timestamp", 0), meta.get("perf_yolo_latency", 0), 0, time.time(),
+                    prompt_registry=prompt_registry,
+                )
+                index_entry = None
+                if result["success"]:
+                    index_entry = build_index_entry(token, output_name, inventory, result)
+                    n_ok += 1
+                else:
+                    n_fail += 1
+                    if verbose: print(f"\n❌ Failed Token {token}: {result['error']}")
+                commit_frame(f_index, f_log, log_entry, index_entry)
+                processed_tokens.add(token)
+
+    print(f"✅ Import done: {n_ok} indexed, {n_fail} failed, {n_skip} skipped (unknown or already indexed)")
@@ -0,0 +1,82 @@
+# src/cache.py
+# Small persistent key -> bytes cache with size-bounded LRU eviction.
+# One SQLite file per cache; safe to share between threads and between processes on one box.
+import sqlite3
+import threading
+import time
+
+
+class DiskLRUCache:
+    def __init__(self, path, max_bytes=4 * 1024**3, evict_every=64):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+        self.conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM entries WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE entries SET last_access=? WHERE key=?", (time.time(), key))
+            self.conn.commit()
+            return bytes(row[0])
+
+    def put(self, key, value):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries(key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()))
+            self.conn.commit()
+            self._puts += 1
+            if self._puts % self.evict_every == 0:
+                self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            self.conn.execute("DELETE FROM entries WHERE key=?", (key,))
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until we are back under 90% of the budget
+        target = int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            if total - freed <= target: break
+            victims.append((key,))
+            freed += size
+        self.conn.executemany("DELETE FROM entries WHERE key=?", victims)
+        self.conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "mb": round(total / 1024**2, 1),
+        }
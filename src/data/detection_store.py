@@ -0,0 +1,127 @@
+# src/data/detection_store.py
+# Structured YOLOE detections, stored once per frame and reused forever.
+#
+# Before this, only the formatted inventory string survived in the index and every
+# scout run re-ran YOLOE. The store keeps per-token, per-camera boxes, classes,
+# confidences and relative sizes in one SQLite file; the prompt inventory is just
+# format_inventory() over those rows, so mining, the Judge and SymbolicVerifier all
+# read the same data.
+#
+# Detections for one frame: {cam: [{"cls", "conf", "size", "box": [x1, y1, x2, y2]}, ...]}
+# Camera order and per-camera detection order (YOLO's) are preserved.
+import sqlite3
+import threading
+import time
+
+
+# --- INVENTORY FORMATTING (the text the VLM / Judge see) ---
+
+def size_label(rel_size):
+    return "Large" if rel_size > 0.1 else "Med" if rel_size > 0.01 else "Small"
+
+
+def format_camera_line(cam_name, dets):
+    """'[CAM]: 2 cars (Large/0.91, Small/0.55); 1 person (Med/0.62)' or '[CAM]: Clear'."""
+    if not dets:
+        return f"[{cam_name}]: Clear"
+    grouped = {}  # Classes in order of first appearance
+    for det in dets:
+        grouped.setdefault(det["cls"], []).append(det)
+    parts = []
+    for name, items in grouped.items():
+        items = sorted(items, key=lambda x: x['size'], reverse=True)
+        desc_list = [f"{size_label(item['size'])}/{item['conf']:.2f}" for item in items[:3]]  # Top 3 only
+        parts.append(f"{len(items)} {name}{'s' if len(items)>1 else ''} ({', '.join(desc_list)})")
+    return f"[{cam_name}]: " + "; ".join(parts)
+
+
+def format_inventory(detections):
+    return "\n".join(format_camera_line(cam, dets) for cam, dets in detections.items())
+
+
+def detected_classes(detections):
+    return {det["cls"] for dets in detections.values() for det in dets}
+
+
+# --- STORE ---
+
+class DetectionStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()  # Pipeline detect workers share the connection
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS frames (
+                token TEXT PRIMARY KEY,
+                detector TEXT,
+                created REAL
+            )""")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS detections (
+                token TEXT NOT NULL,
+                cam_idx INTEGER NOT NULL,
+                cam TEXT NOT NULL,
+                det_idx INTEGER NOT NULL,  -- -1 marks a camera with no detections
+                cls TEXT,
+                conf REAL,
+                size REAL,
+                x1 REAL, y1 REAL, x2 REAL, y2 REAL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_token ON detections(token)")
+        self.conn.commit()
+
+    def __contains__(self, token):
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM frames WHERE token=?", (token,)).fetchone() is not None
+
+    def tokens(self, detector=None):
+        """Stored tokens; with 'detector', only those detected by that detector tag."""
+        with self._lock:
+            if detector is None:
+                return {r[0] for r in self.conn.execute("SELECT token FROM frames")}
+            return {r[0] for r in self.conn.execute("SELECT token FROM frames WHERE detector=?", (detector,))}
+
+    def get(self, token, detector=None):
+        """
+        Detections for token, or None if the frame was never detected. With 'detector' (a
+        detector tag), detections made by another model / threshold / taxonomy / backend are a miss too.
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT detector FROM frames WHERE token=?", (token,)).fetchone()
+            if row is None or (detector is not None and row[0] != detector):
+                return None
+            rows = self.conn.execute(
+                "SELECT cam, det_idx, cls, conf, size, x1, y1, x2, y2 FROM detections "
+                "WHERE token=? ORDER BY cam_idx, det_idx", (token,)).fetchall()
+        detections = {}
+        for cam, det_idx, cls, conf, size, x1, y1, x2, y2 in rows:
+            dets = detections.setdefault(cam, [])
+            if det_idx >= 0:
+                dets.append({"cls": cls, "conf": conf, "size": size, "box": [x1, y1, x2, y2]})
+        return detections
+
+    def put(self, token, detections, detector=None):
+        rows = []
+        for cam_idx, (cam, dets) in enumerate(detections.items()):
+            if not dets:
+                rows.append((token, cam_idx, cam, -1, None, None, None, None, None, None, None))
+            for det_idx, det in enumerate(dets):
+                x1, y1, x2, y2 = det["box"]
+                rows.append((token, cam_idx, cam, det_idx, det["cls"], det["conf"], det["size"], x1, y1, x2, y2))
+        with self._lock:
+            # Replace, so a re-detection never leaves duplicate rows behind
+            self.conn.execute("DELETE FROM detections WHERE token=?", (token,))
+            self.conn.executemany("INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.conn.execute("INSERT OR REPLACE INTO frames(token, detector, created) VALUES (?, ?, ?)",
+                              (token, detector, time.time()))
+            self.conn.commit()
+
+    def inventory(self, token, detector=None):
+        """Formatted inventory string for token, or None if not stored (see get)."""
+        detections = self.get(token, detector)
+        return format_inventory(detections) if detections is not None else None
+
+    def count(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM frames").fetchone()[0]
@@ -0,0 +1,119 @@
+# src/data/images.py
+# Shared image loading for every consumer (mining, montage/CLIP benchmark, figure export, curator).
+#
+# NuScenes frames are 1600x900 JPEGs but most consumers want them smaller. Instead of a full
+# decode followed by a resize, we ask libjpeg to decode straight to 1/2, 1/4 or 1/8 scale in
+# the DCT domain (PIL draft mode) where that still covers the target, and finish with a small
+# resize. The file is read and closed up-front, so long runs never leak descriptors.
+import hashlib
+from io import BytesIO
+import numpy as np
+from PIL import Image
+
+
+def file_sha1(path):
+    """Hex sha1 of a file's bytes (stable cache key for a source image)."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def source_sha1(pil_image):
+    """sha1 of the file a loaded image came from (computed once, then kept in .info), or None."""
+    info = pil_image.info
+    if info.get("source_sha1") is None and info.get("source_path") is not None:
+        info["source_sha1"] = file_sha1(info["source_path"])
+    return info.get("source_sha1")
+
+
+class LoadedImage:
+    """A decoded RGB frame with both a PIL and a (lazy) NumPy view."""
+    def __init__(self, pil, path=None):
+        self.pil = pil
+        self.path = path
+        self._array = None
+
+    @property
+    def size(self):
+        return self.pil.size
+
+    @property
+    def sha1(self):
+        # Of the source file bytes; only hashed when asked for (e.g. by the payload cache)
+        return source_sha1(self.pil)
+
+    @property
+    def array(self):
+        # HxWx3 uint8, RGB order (NOT the BGR that cv2/ultralytics assume for raw arrays)
+        if self._array is None:
+            self._array = np.asarray(self.pil)
+        return self._array
+
+
+def fit_within(size, max_size):
+    """Thumbnail-style box fit: keeps aspect ratio, never upscales."""
+    w, h = size
+    max_w, max_h = max_size
+    if w <= max_w and h <= max_h:
+        return size
+    ratio = min(max_w / w, max_h / h)
+    return (max(1, round(w * ratio)), max(1, round(h * ratio)))
+
+
+def target_size(size, max_size=None, scale=None):
+    w, h = size
+    if scale is not None and scale != 1.0:
+        w, h = int(w * scale), int(h * scale)
+    if max_size is not None:
+        w, h = fit_within((w, h), max_size)
+    return (w, h)
+
+
+def load_image(path, max_size=None, scale=None, resample=Image.Resampling.LANCZOS):
+    """
+    Decodes 'path' to RGB at the requested size.
+      max_size: (w, h) box to fit in. Exactly PIL thumbnail (draft + BICUBIC with reducing_gap),
+                so YOLOE and the VLM see the same pixels as before this loader existed.
+      scale:    resize factor (like config.RESIZE_FACTOR), DCT draft + 'resample' (LANCZOS, as the montage always did)
+    Returns a LoadedImage. With neither argument this is a plain full-resolution decode.
+    """
+    # Read and close the file up-front; decoding happens from memory
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    with Image.open(BytesIO(data)) as img:
+        source_format, source_size = img.format, img.size
+        if scale is None or scale == 1.0:
+            if max_size is not None:
+                img.thumbnail(max_size)  # Drafts (JPEG) and resizes in one go
+            pil = img.convert("RGB")  # Forces the decode
+        else:
+            target = target_size(img.size, max_size=max_size, scale=scale)
+            # JPEG only (no-op for other formats): picks the largest DCT scale >= target
+            img.draft("RGB", target)
+            pil = img.convert("RGB")
+            if pil.size != target:
+                pil = pil.resize(target, resample)
+
+    # .info survives thumbnail()/convert(), so encoders downstream can still identify the source.
+    # The content hash is left to source_sha1(), so loads that need no cache key don't pay for it.
+    pil.info["source_path"] = path
+    pil.info["source_format"] = source_format
+    pil.info["source_size"] = source_size
+    return LoadedImage(pil, path)
+
+
+def load_camera_images(camera_paths, max_size=None, scale=None, strict=False):
+    """
+    Loads {cam: path} -> {cam: PIL.Image}. Unreadable cameras are skipped
+    (or raise if strict=True) so callers can decide what a usable frame is.
+    """
+    images = {}
+    for cam, path in camera_paths.items():
+        try:
+            images[cam] = load_image(path, max_size=max_size, scale=scale).pil
+        except Exception:
+            if strict: raise
+    return images
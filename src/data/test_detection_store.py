@@ -0,0 +1,64 @@
+# python -m pytest src/data/test_detection_store.py
+from src.data.detection_store import DetectionStore, format_inventory
+from src.mining import run_detector_many
+from src.model.taxonomy import detector_tag
+
+DETECTIONS = {
+    "CAM_FRONT_LEFT": [],
+    "CAM_FRONT": [
+        {"cls": "car", "conf": 0.91, "size": 0.12, "box": [10.0, 20.0, 300.0, 400.0]},
+        {"cls": "person", "conf": 0.55, "size": 0.004, "box": [5.0, 6.0, 7.0, 8.0]},
+    ],
+    "CAM_FRONT_RIGHT": [{"cls": "traffic cone", "conf": 0.48, "size": 0.02, "box": [1.0, 2.0, 3.0, 4.0]}],
+}
+TAG = detector_tag()
+
+
+class CountingDetector:
+    def __init__(self, tag):
+        self.tag = tag
+        self.frames = 0
+
+    def detect_many_structured(self, frames):
+        self.frames += len(frames)
+        return [DETECTIONS for _ in frames]
+
+
+def test_round_trip_keeps_order_and_empty_cameras(tmp_path):
+    store = DetectionStore(str(tmp_path / "det.sqlite"))
+    assert store.get("t1") is None and "t1" not in store
+    store.put("t1", DETECTIONS, detector=TAG)
+    assert store.get("t1") == DETECTIONS
+    assert list(store.get("t1")) == list(DETECTIONS)
+    assert store.inventory("t1") == format_inventory(DETECTIONS)
+    assert "t1" in store and store.count() == 1
+
+
+def test_put_replaces(tmp_path):
+    store = DetectionStore(str(tmp_path / "det.sqlite"))
+    store.put("t1", DETECTIONS, detector=TAG)
+    store.put("t1", {"CAM_FRONT": []}, detector=TAG)
+    assert store.get("t1") == {"CAM_FRONT": []}
+
+
+def test_other_detector_is_a_miss(tmp_path):
+    store = DetectionStore(str(tmp_path / "det.sqlite"))
+    other = detector_tag(conf_threshold=0.25)
+    store.put("t1", DETECTIONS, detector=TAG)
+    store.put("t2", DETECTIONS, detector=other)
+    assert store.get("t1", detector=TAG) == DETECTIONS
+    assert store.get("t1", detector=other) is None
+    assert store.get("t1") == DETECTIONS  # No tag: any detector
+    assert store.tokens() == {"t1", "t2"}
+    assert store.tokens(detector=TAG) == {"t1"}
+
+
+def test_run_detector_many_redetects_on_tag_mismatch(tmp_path):
+    store = DetectionStore(str(tmp_path / "det.sqlite"))
+    store.put("t1", {"CAM_FRONT": []}, detector=detector_tag(backend="onnx"))
+    store.put("t2", DETECTIONS, detector=TAG)
+    detector = CountingDetector(TAG)
+    inventories = run_detector_many(detector, [{}, {}], store, ["t1", "t2"])
+    assert detector.frames == 1  # Only t1, stored by another backend
+    assert inventories == [format_inventory(DETECTIONS)] * 2
+    assert store.tokens(detector=TAG) == {"t1", "t2"}
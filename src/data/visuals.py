@@ -1,6 +1,7 @@
 # src/data/visuals.py
 from PIL import Image, ImageDraw, ImageFont
 from src.config import CAM_ORDER, RESIZE_FACTOR
+from src.data.images import load_camera_images
 
 def create_surround_montage(camera_paths, resize_factor=RESIZE_FACTOR):
     """
@@ -9,19 +10,12 @@ def create_surround_montage(camera_paths, resize_factor=RESIZE_FACTOR):
     [Front Left] [Front] [Front Right]
     [Back Left]  [Back]  [Back Right]
     """
-    images = {}
-    
-    # 1. Load and Resize
-    for cam, path in camera_paths.items():
-        try:
-            img = Image.open(path)
-            if resize_factor != 1.0:
-                new_size = (int(img.width * resize_factor), int(img.height * resize_factor))
-                img = img.resize(new_size, Image.Resampling.LANCZOS)
-            images[cam] = img
-        except Exception as e:
-            print(f"Error loading {path}: {e}")
-            return None
+    # 1. Load and Resize (decoded straight to the reduced size)
+    try:
+        images = load_camera_images(camera_paths, scale=resize_factor, strict=True)
+    except Exception as e:
+        print(f"Error loading {camera_paths}: {e}")
+        return None
 
     # 2. Calculate Montage Dimensions
     # Assuming all images are same size (they are in NuScenes)
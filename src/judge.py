@@ -1,22 +1,29 @@
 # src/judge.py
+import asyncio
 import json
 import os
 import argparse
 import re
 from tqdm import tqdm
+import openai
 from openai import OpenAI
 from src.reward import SymbolicVerifier
+from src.data.detection_store import DetectionStore, format_inventory
 
 # IMPORT THE SCHEMA DEFINITIONS
 # This ensures the Judge knows the allowed Enums (e.g., "jaywalking_hesitant")
 from src.model.prompts import SCHEMA_GUIDE, OUTPUT_SKELETON
+from src.model.schema import response_format
+from src.model.json_repair import repair_output
+from src.model.async_vlm_client import AsyncVLMClient
+from src.mining import call_vlm_with_retry_async
 
 # --- CONFIGURATION ---
 JUDGE_API_URL = "http://localhost:1234/v1" 
 JUDGE_API_KEY = "lm-studio"
 JUDGE_MODEL_ID = "local-model"
-
-client = OpenAI(base_url=JUDGE_API_URL, api_key=JUDGE_API_KEY)
+JUDGE_TEMPERATURE = 0.3
+SCHEMA_PENALTY = 3.0  # Per violation left after repair: kept as a candidate, but ranked below clean ones
 
 # --- SYSTEM PROMPT (Enforcing Uniformity) ---
 SYSTEM_PROMPT = f"""
@@ -50,99 +57,205 @@ def clean_json_string(content):
             content = match.group(1)
     return content.strip()
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--files", nargs='+', required=True, help="Input jsonl files")
-    parser.add_argument("--output", type=str, default="output/consensus_final.jsonl")
-    parser.add_argument("--n", type=int, default=3, help="Best-of-N attempts")
-    args = parser.parse_args()
-
-    # ... [Rest of the file remains the same] ...
-    # (Load Data logic...)
-    
-    # Intersection of tokens
+def load_scout_files(files):
     data_maps = []
-    print(f"📂 Loading {len(args.files)} scout files...")
-    for f in args.files:
+    print(f"📂 Loading {len(files)} scout files...")
+    for f in files:
         d = {}
         with open(f, 'r') as file:
             for line in file:
                 try:
                     obj = json.loads(line)
-                    if obj.get('success'): 
+                    # Index lines are successes by construction and carry no 'success' field
+                    if obj.get('success', True):
                         d[obj['token']] = obj
                 except: pass
         data_maps.append(d)
+    return data_maps
 
-    all_tokens = set().union(*[d.keys() for d in data_maps])
-    verifier = SymbolicVerifier()
+def build_prompt(token, data_maps, detection_store=None):
+    """(user_content, yolo_context, detections) for one frame, or None if no scout has it."""
+    # 1. Aggregate Reports
+    reports = []
+    yolo_context = "No YOLO Data"
     
-    print(f"👨‍⚖️ Judge initialized. Processing {len(all_tokens)} frames...")
-
-    with open(args.output, 'w') as f_out:
-        for token in tqdm(all_tokens):
+    for i, d in enumerate(data_maps):
+        if token in d:
+            item = d[token]
+            if yolo_context == "No YOLO Data" and "yolo_inventory" in item:
+                yolo_context = item["yolo_inventory"]
+            
+            # Clean the item for the prompt (remove bulky fields)
+            # We remove _reasoning_trace from the JSON dump because we pass it separately or summarize it
+            clean_obj = {k:v for k,v in item.items() if k not in ['token', '_reasoning_trace', 'yolo_inventory', 'raw_response', 'input_messages_log', 'usage']}
             
-            # 1. Aggregate Reports
-            reports = []
-            yolo_context = "No YOLO Data"
+            # Get trace
+            trace = item.get('_reasoning_trace', 'No trace')[:500] 
             
-            for i, d in enumerate(data_maps):
-                if token in d:
-                    item = d[token]
-                    if yolo_context == "No YOLO Data" and "yolo_inventory" in item:
-                        yolo_context = item["yolo_inventory"]
-                    
-                    # Clean the item for the prompt (remove bulky fields)
-                    # We remove _reasoning_trace from the JSON dump because we pass it separately or summarize it
-                    clean_obj = {k:v for k,v in item.items() if k not in ['token', '_reasoning_trace', 'yolo_inventory', 'raw_response', 'input_messages_log', 'usage']}
-                    
-                    # Get trace
-                    trace = item.get('_reasoning_trace', 'No trace')[:500] 
-                    
-                    reports.append(f"--- SCOUT {i+1} ---\n[Trace]: {trace}...\n[JSON]: {json.dumps(clean_obj)}")
-
-            if not reports: continue
-
-            # 2. Construct Prompt
-            user_content = f"### SYMBOLIC GROUNDING (YOLO):\n{yolo_context}\n\n"
-            user_content += "### SCOUT REPORTS:\n" + "\n\n".join(reports)
-            user_content += "\n\nSynthesize the Consensus JSON."
-
-            # 3. Best-of-N Loop
-            candidates = []
-            for attempt in range(args.n):
+            reports.append(f"--- SCOUT {i+1} ---\n[Trace]: {trace}...\n[JSON]: {json.dumps(clean_obj)}")
+
+    if not reports: return None
+
+    # Prefer stored structured detections over the inventory string copied into the index
+    detections = detection_store.get(token) if detection_store is not None else None
+    if detections is not None:
+        yolo_context = format_inventory(detections)
+
+    # 2. Construct Prompt
+    user_content = f"### SYMBOLIC GROUNDING (YOLO):\n{yolo_context}\n\n"
+    user_content += "### SCOUT REPORTS:\n" + "\n\n".join(reports)
+    user_content += "\n\nSynthesize the Consensus JSON."
+    return user_content, yolo_context, detections
+
+def judge_messages(user_content):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_content}
+    ]
+
+def judge_request(args, user_content):
+    request = dict(
+        model=args.judge_model,
+        messages=judge_messages(user_content),
+        temperature=JUDGE_TEMPERATURE,
+        max_tokens=16384
+    )
+    if args.constrained:
+        request["response_format"] = response_format()
+    return request
+
+def drop_response_format(args, request, e):
+    if not args.constrained: raise e
+    print(f"\n⚠️ Judge server does not accept response_format ({e}). Falling back to unconstrained decoding.")
+    args.constrained = False
+    request.pop("response_format", None)
+
+def score_candidate(content, verifier, yolo_context, detections):
+    json_text = clean_json_string(content)
+    # Near-misses (comments, trailing commas, enum typos) are fixed instead of wasting the sample
+    candidate_json, repairs, errors = repair_output(json_text)
+    if candidate_json is None: return None
+    score, reasons = verifier.calculate_score(candidate_json, yolo_context, detections=detections)
+    if errors:
+        score -= SCHEMA_PENALTY * len(errors)
+        reasons.append(f"❌ Schema violations ({len(errors)}): {'; '.join(errors[:5])}")
+    return {"json": candidate_json, "score": score, "reasons": reasons, "repairs": repairs, "schema_errors": errors}
+
+def final_record(token, candidates, yolo_context):
+    candidates = [c for c in candidates if c is not None]
+    if not candidates: return None
+
+    # 4. Pick Winner
+    candidates.sort(key=lambda x: x['score'], reverse=True)
+    best = candidates[0]
+    
+    record = best['json']
+    record['token'] = token
+    record['judge_score'] = best['score']
+    record['judge_log'] = best['reasons']
+    record['judge_repairs'] = best['repairs']
+    record['judge_schema_errors'] = best['schema_errors']
+    record['yolo_inventory'] = yolo_context
+    return record
+
+def judge_sync(args, tokens, data_maps, verifier, detection_store, f_out):
+    client = OpenAI(base_url=args.judge_url, api_key=args.api_key)
+    for token in tqdm(tokens):
+        prompt = build_prompt(token, data_maps, detection_store)
+        if prompt is None: continue
+        user_content, yolo_context, detections = prompt
+
+        # 3. Best-of-N Loop
+        candidates = []
+        for attempt in range(args.n):
+            try:
+                request = judge_request(args, user_content)
                 try:
-                    response = client.chat.completions.create(
-                        model=JUDGE_MODEL_ID,
-                        messages=[
-                            {"role": "system", "content": SYSTEM_PROMPT},
-                            {"role": "user", "content": user_content}
-                        ],
-                        temperature=0.3,
-                        max_tokens=16384
-                    )
-                    
-                    json_text = clean_json_string(response.choices[0].message.content)
-                    candidate_json = json.loads(json_text)
-                    
-                    score, reasons = verifier.calculate_score(candidate_json, yolo_context)
-                    candidates.append({"json": candidate_json, "score": score, "reasons": reasons})
-                except: pass
+                    response = client.chat.completions.create(**request)
+                except (openai.BadRequestError, openai.UnprocessableEntityError) as e:
+                    drop_response_format(args, request, e)
+                    response = client.chat.completions.create(**request)
+                candidates.append(score_candidate(response.choices[0].message.content, verifier, yolo_context, detections))
+            except: pass
 
-            if not candidates: continue
+        record = final_record(token, candidates, yolo_context)
+        if record is None: continue
+        f_out.write(json.dumps(record) + "\n")
+        f_out.flush()
 
-            # 4. Pick Winner
-            candidates.sort(key=lambda x: x['score'], reverse=True)
-            best = candidates[0]
-            
-            final_record = best['json']
-            final_record['token'] = token
-            final_record['judge_score'] = best['score']
-            final_record['judge_log'] = best['reasons']
-            final_record['yolo_inventory'] = yolo_context
-            
-            f_out.write(json.dumps(final_record) + "\n")
-            f_out.flush()
+async def judge_async(args, tokens, data_maps, verifier, detection_store, f_out):
+    """
+    Up to --concurrency requests in flight on one event loop over a pooled keep-alive
+    connection set; the N samples of a frame run concurrently too. Output is in completion order.
+    """
+    client = AsyncVLMClient(model_id=args.judge_model, base_url=args.judge_url, api_key=args.api_key,
+                            max_connections=args.concurrency, max_keepalive=args.concurrency,
+                            constrained=args.constrained, temperature=JUDGE_TEMPERATURE)
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def sample(user_content, yolo_context, detections):
+        # Same retry policy and circuit breaker as the scouts (src.mining)
+        async with slots:
+            result, _, _ = await call_vlm_with_retry_async(client, judge_messages(user_content))
+        if result is None or not result["success"]: return None
+        try:
+            return score_candidate(result["raw_response"], verifier, yolo_context, detections)
+        except: return None
+
+    async def judge_frame(token):
+        prompt = build_prompt(token, data_maps, detection_store)
+        if prompt is None: return None
+        user_content, yolo_context, detections = prompt
+        candidates = await asyncio.gather(*[sample(user_content, yolo_context, detections) for _ in range(args.n)])
+        return final_record(token, candidates, yolo_context)
+
+    try:
+        # Frames are scheduled in windows so memory stays flat on huge runs
+        window = max(args.concurrency * 4, 1)
+        pending = set()
+        token_iter = iter(tokens)
+        with tqdm(total=len(tokens)) as bar:
+            while True:
+                while len(pending) < window:
+                    token = next(token_iter, None)
+                    if token is None: break
+                    pending.add(asyncio.ensure_future(judge_frame(token)))
+                if not pending: break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    record = task.result()
+                    bar.update(1)
+                    if record is None: continue
+                    f_out.write(json.dumps(record) + "\n")
+                    f_out.flush()
+    finally:
+        await client.aclose()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", nargs='+', required=True, help="Input jsonl files")
+    parser.add_argument("--output", type=str, default="output/consensus_final.jsonl")
+    parser.add_argument("--n", type=int, default=3, help="Best-of-N attempts")
+    parser.add_argument("--detections", type=str, default=None, help="Detection store written by src.main --detections (grounding from stored boxes)")
+    parser.add_argument("--judge_url", type=str, default=JUDGE_API_URL, help="OpenAI-compatible base URL of the judge model")
+    parser.add_argument("--judge_model", type=str, default=JUDGE_MODEL_ID)
+    parser.add_argument("--api_key", type=str, default=JUDGE_API_KEY)
+    parser.add_argument("--constrained", action="store_true", help="Constrain the judge output to the JSON schema (response_format)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight (>1 uses the asyncio client)")
+    args = parser.parse_args()
+
+    data_maps = load_scout_files(args.files)
+    all_tokens = sorted(set().union(*[d.keys() for d in data_maps]))
+    verifier = SymbolicVerifier()
+    detection_store = DetectionStore(args.detections) if args.detections else None
+    
+    print(f"👨‍⚖️ Judge initialized. Processing {len(all_tokens)} frames...")
+
+    with open(args.output, 'w') as f_out:
+        if args.concurrency > 1:
+            asyncio.run(judge_async(args, all_tokens, data_maps, verifier, detection_store, f_out))
+        else:
+            judge_sync(args, all_tokens, data_maps, verifier, detection_store, f_out)
 
 if __name__ == "__main__":
     main()
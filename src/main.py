@@ -1,59 +1,187 @@
 # src/main.py
-import json
 import time
 import os
 import sys
 import argparse
-import traceback
+import contextlib
 from tqdm import tqdm
-from PIL import Image
 
 sys.path.append(os.path.abspath('..'))
 sys.path.append(os.path.abspath('.'))
 
-from src.data.loader import NuScenesLoader
 from src.model.vlm_client import VLMClient
-from src.model.detector import ObjectDetector
+from src.model.vlm_pool import VLMPool, parse_endpoint
+from src.model.detector_service import RemoteDetector
+from src.model.taxonomy import detector_tag
 from src.model.prompts import SYSTEM_PROMPT
+from src.mining import (
+    load_processed_tokens, load_camera_images, run_detector, call_vlm_with_retry, MAX_IMAGE_SIZE,
+    build_log_entry, build_index_entry, commit_frame,
+)
+from src.pipeline import MiningPipeline, Scout
+from src.cache import DiskLRUCache
+from src.tracing import Tracer, NULL_TRACER
+from src.prompt_registry import PromptRegistry, registry_path
+from src.data.detection_store import DetectionStore
+from src.batch_io import export_requests, import_responses
+from src.work_queue import WorkQueue, LeaseHeartbeat, default_worker_id, shard_paths
 
-def main():
+def main(argv=None, loader=None, detector=None):
+    """'loader' / 'detector' can be injected (e.g. synthetic frames in src.tools.load_test)."""
     parser = argparse.ArgumentParser()
-    parser.add_argument("--model", type=str, required=True, help="Model ID in LM Studio")
-    parser.add_argument("--output_name", type=str, required=True, help="Suffix for output file")
+    parser.add_argument("--model", type=str, default=None, help="Model ID in LM Studio")
+    parser.add_argument("--output_name", type=str, default=None, help="Suffix for output file")
     parser.add_argument("--port", type=int, default=1234, help="Server Port")
     parser.add_argument("--sparse", action="store_true", help="Use Sparse Sampling (3 frames/scene)")
     parser.add_argument("--limit", type=int, default=None)
     parser.add_argument("--verbose", action="store_true")
-    args = parser.parse_args()
+    parser.add_argument("--output_dir", type=str, default="output", help="Where index_/logs_/prompts_ files go")
+    # Pipelined mode: overlap decode / YOLOE / encode / VLM / write
+    parser.add_argument("--pipeline", action="store_true", help="Run stages concurrently over bounded queues")
+    parser.add_argument("--unordered", action="store_true", help="Pipeline: commit frames as they finish instead of in sample order")
+    parser.add_argument("--queue_size", type=int, default=8, help="Pipeline: max frames buffered between stages")
+    parser.add_argument("--load_workers", type=int, default=2, help="Pipeline: image decode threads")
+    parser.add_argument("--detect_workers", type=int, default=1, help="Pipeline: YOLOE threads (>1 only useful with --detector_address)")
+    parser.add_argument("--detect_batch_frames", type=int, default=1, help="Pipeline: frames per YOLOE predict call (cross-frame batching)")
+    parser.add_argument("--encode_workers", type=int, default=1, help="Pipeline: payload encode threads")
+    parser.add_argument("--vlm_workers", type=int, default=1, help="Pipeline: concurrent VLM requests")
+    # Shared detector service (python -m src.model.detector_service)
+    parser.add_argument("--detector_address", type=str, default=None, help="host:port of a running detector service instead of loading YOLOE here")
+    parser.add_argument("--detector_authkey", type=str, default=None, help="Detector service secret (default: $SEMANTIC_DRIVE_DETECTOR_AUTHKEY or the service's key file)")
+    # CPU export of YOLOE with the class vocabulary baked in (python -m src.tools.benchmark_detector to compare)
+    parser.add_argument("--detector_backend", type=str, default="pytorch", choices=["pytorch", "onnx", "openvino"], help="Run the YOLOE checkpoint or a cached ONNX/OpenVINO export")
+    parser.add_argument("--detector_int8", action="store_true", help="int8-quantised export (openvino backend)")
+    # Request pool: several endpoints and/or several requests in flight
+    parser.add_argument("--endpoints", nargs='+', default=None, help="Pool: ports, host:port or full URLs (overrides --port)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Pool: initial requests in flight")
+    parser.add_argument("--max_concurrency", type=int, default=16, help="Pool: upper bound for adaptive concurrency")
+    parser.add_argument("--no_adaptive", action="store_true", help="Pool: keep concurrency fixed instead of AIMD")
+    # Multi-scout: several models over each frame in one pass
+    parser.add_argument("--scouts", nargs='+', default=None, help="output_name=model[@endpoint] per scout (replaces --model/--output_name)")
+    # Offline batch mode: export requests / import batch responses
+    parser.add_argument("--export_requests", type=str, default=None, help="Batch: write VLM requests to sharded files in this dir instead of calling the server")
+    parser.add_argument("--import_responses", type=str, default=None, help="Batch: glob of batch output files to parse into the index (needs the export dir)")
+    parser.add_argument("--batch_dir", type=str, default="output/batch", help="Batch: export dir used by --import_responses")
+    parser.add_argument("--shard_size", type=int, default=500, help="Batch: requests per shard file")
+    # Encoded image payload cache (reruns / ablations skip JPEG+base64 encoding)
+    parser.add_argument("--payload_cache", type=str, default=None, help="SQLite file caching encoded image payloads (e.g. output/cache/payloads.sqlite)")
+    parser.add_argument("--payload_cache_gb", type=float, default=4.0, help="Payload cache size budget (LRU eviction)")
+    # Response cache (reruns with identical inputs become lookups)
+    parser.add_argument("--response_cache", type=str, default=None, help="SQLite file caching successful VLM answers (e.g. output/cache/responses.sqlite)")
+    parser.add_argument("--response_cache_gb", type=float, default=2.0, help="Response cache size budget (LRU eviction)")
+    parser.add_argument("--bypass_response_cache", action="store_true", help="Ignore cached answers (fresh answers are still stored)")
+    # Structured detections (YOLOE runs once per frame, ever)
+    parser.add_argument("--detections", type=str, default=None, help="SQLite detection store to read/write (e.g. output/detections.sqlite)")
+    # Streaming (early stop on complete JSON, repetition loops, think-budget overrun)
+    parser.add_argument("--stream", action="store_true", help="Stream answers and stop as soon as the JSON is complete")
+    parser.add_argument("--think_budget", type=int, default=None, help="Streaming: abort after this many reasoning chunks (~tokens)")
+    # Constrained decoding (JSON schema generated from prompts.py, see src.model.schema)
+    parser.add_argument("--constrained", action="store_true", help="Send the output JSON schema as response_format (falls back if the server refuses)")
+    parser.add_argument("--no_repair", action="store_true", help="Take parseable JSON as-is: no local repair, no schema validation (old behaviour)")
+    parser.add_argument("--strict_schema", action="store_true", help="Retry answers that still break the schema after repair instead of logging the violations")
+    # Tracing / live metrics
+    parser.add_argument("--trace", type=str, default=None, help="Write a Chrome trace of every stage span (e.g. output/trace.json)")
+    parser.add_argument("--metrics_file", type=str, default=None, help="Rewrite Prometheus-style metrics here every 10s")
+    parser.add_argument("--metrics_port", type=int, default=None, help="Serve metrics on http://127.0.0.1:<port>/metrics (and /json)")
+    # Logs
+    parser.add_argument("--full_prompt_logs", action="store_true", help="Store full prompt_messages in every log line instead of a prompt_id (see src.prompt_registry)")
+    # Image size / encoding
+    parser.add_argument("--max_image_size", type=int, default=MAX_IMAGE_SIZE[0], help="Longest side sent to YOLO/VLM (1600 = native nuScenes resolution)")
+    parser.add_argument("--jpeg_passthrough", action="store_true", help="Send source JPEG bytes as-is when no resize is needed (no re-encode)")
+    parser.add_argument("--prompt_layout", choices=["classic", "static_first"], default="classic", help="static_first: fixed text before images/inventory for server prefix caching")
+    parser.add_argument("--encode_threads", type=int, default=3, help="Cameras of one frame encoded in parallel (1 = sequential)")
+    parser.add_argument("--debug", action="store_true", help="Print raw responses / reasoning extraction from the VLM client")
+    # Distributed work queue (shared SQLite file)
+    parser.add_argument("--queue_db", type=str, default=None, help="Work queue: shared SQLite file to lease tokens from")
+    parser.add_argument("--worker_id", type=str, default=None, help="Work queue: worker name (default host-pid)")
+    parser.add_argument("--lease_batch", type=int, default=8, help="Work queue: tokens leased per request")
+    parser.add_argument("--lease_seconds", type=int, default=600, help="Work queue: lease expiry without heartbeat")
+    args = parser.parse_args(argv)
+
+    if not args.scouts and not (args.model and args.output_name):
+        parser.error("either --model and --output_name, or --scouts is required")
 
     # Paths
-    OUTPUT_DIR = "output"
+    OUTPUT_DIR = args.output_dir
     if not os.path.exists(OUTPUT_DIR): os.makedirs(OUTPUT_DIR)
-    
-    # FILE 1: The Clean Index (For Search)
-    INDEX_FILE = os.path.join(OUTPUT_DIR, f"index_{args.output_name}.jsonl")
-    # FILE 2: The Full Log (For Debugging/Paper Appendix)
-    LOG_FILE = os.path.join(OUTPUT_DIR, f"logs_{args.output_name}.jsonl")
+
+    # One (output_name, model, endpoints) per scout. The classic CLI is a single scout.
+    if args.scouts:
+        specs = [parse_scout_spec(spec) for spec in args.scouts]
+        specs = [(name, model, [endpoint] if endpoint else (args.endpoints or [args.port])) for name, model, endpoint in specs]
+    else:
+        specs = [(args.output_name, args.model, args.endpoints or [args.port])]
+
+    if (args.export_requests or args.import_responses) and len(specs) != 1:
+        parser.error("--export_requests / --import_responses work on a single --model/--output_name")
+
+    if args.import_responses:
+        # No dataset / detector / server needed: everything comes from the batch files
+        output_name, model, endpoints = specs[0]
+        client = VLMClient(model_id=model, base_url=parse_endpoint(endpoints[0]))
+        index_file = os.path.join(OUTPUT_DIR, f"index_{output_name}.jsonl")
+        log_file = os.path.join(OUTPUT_DIR, f"logs_{output_name}.jsonl")
+        import_responses(client, args.import_responses, args.batch_dir, output_name,
+                         index_file, log_file, load_processed_tokens(index_file), verbose=args.verbose,
+                         prompt_registry=None if args.full_prompt_logs else PromptRegistry(registry_path(OUTPUT_DIR, output_name)))
+        return
 
     # Initialize Components
-    print("1. Loading NuScenes...")
-    loader = NuScenesLoader()
+    if loader is None:
+        # Imported here so injected loaders/detectors (load tests, CI) need neither nuscenes-devkit nor ultralytics
+        from src.data.loader import NuScenesLoader
+        print("1. Loading NuScenes...")
+        loader = NuScenesLoader()
     
-    print("2. Loading YOLOE Detector...")
-    detector = ObjectDetector() 
-
-    print(f"3. Connecting to VLM ({args.model}) on port {args.port}...")
-    client = VLMClient(model_id=args.model, port=args.port)
-
-    # Resume Logic
-    processed_tokens = set()
-    if os.path.exists(INDEX_FILE):
-        with open(INDEX_FILE, 'r') as f:
-            for line in f:
-                try: processed_tokens.add(json.loads(line)['token'])
-                except: pass
+    client_kwargs = {"passthrough": args.jpeg_passthrough, "stream": args.stream, "think_budget": args.think_budget,
+                     "constrained": args.constrained, "repair": not args.no_repair,
+                     "strict_schema": args.strict_schema,
+                     "encode_threads": args.encode_threads, "debug": args.debug, "prompt_layout": args.prompt_layout}
+    if args.payload_cache:
+        os.makedirs(os.path.dirname(args.payload_cache) or ".", exist_ok=True)
+        client_kwargs["payload_cache"] = DiskLRUCache(args.payload_cache, max_bytes=int(args.payload_cache_gb * 1024**3))
+    if args.response_cache:
+        os.makedirs(os.path.dirname(args.response_cache) or ".", exist_ok=True)
+        client_kwargs["response_cache"] = DiskLRUCache(args.response_cache, max_bytes=int(args.response_cache_gb * 1024**3))
+        client_kwargs["cache_bypass"] = args.bypass_response_cache
+
+    # Export never calls a server: a plain VLMClient builds the requests (the pool has no request_kwargs)
+    use_pool = (bool(args.endpoints) or args.concurrency > 1) and not args.export_requests
+    scouts = []
+    for output_name, model, endpoints in specs:
+        if use_pool:
+            print(f"3. Connecting VLM pool ({model}) to {len(endpoints)} endpoint(s)...")
+            client = VLMPool(
+                model, endpoints, concurrency=args.concurrency,
+                max_concurrency=max(args.concurrency, args.max_concurrency), adaptive=not args.no_adaptive,
+                **client_kwargs,
+            )
+        else:
+            print(f"3. Connecting to VLM ({model}) at {parse_endpoint(endpoints[0])}...")
+            client = VLMClient(model_id=model, base_url=parse_endpoint(endpoints[0]), **client_kwargs)
+
+        # FILE 1: The Clean Index (For Search)
+        index_file = os.path.join(OUTPUT_DIR, f"index_{output_name}.jsonl")
+        # FILE 2: The Full Log (For Debugging/Paper Appendix)
+        log_file = os.path.join(OUTPUT_DIR, f"logs_{output_name}.jsonl")
+        # Resume Logic (per scout)
+        prompts = None if args.full_prompt_logs else PromptRegistry(registry_path(OUTPUT_DIR, output_name))
+        scout = Scout(model, output_name, client, index_file, log_file, processed=load_processed_tokens(index_file), prompts=prompts)
+        scouts.append(scout)
+        print(f"🚀 [{output_name}] Processed so far: {len(scout.processed)}")
+
+    if use_pool:
+        # The pool only pays off with several requests in flight -> needs the pipeline.
+        # Spawn enough VLM workers to reach the max limit; the limiter gates the real count.
+        args.pipeline = True
+        args.vlm_workers = max(args.vlm_workers, max(args.concurrency, args.max_concurrency) * len(scouts))
+    if len(scouts) > 1:
+        # Fan-out lives in the pipeline; give every scout at least one request in flight
+        print(f"🛰️ Mode: MULTI-SCOUT ({', '.join(s.output_name for s in scouts)}) - decode/detect/encode once per frame")
+        args.pipeline = True
+        args.vlm_workers = max(args.vlm_workers, len(scouts))
     
-    print(f"🚀 Starting Mining. Processed so far: {len(processed_tokens)}")
+    print("🚀 Starting Mining.")
     
     if args.sparse:
         print("⚡ Mode: SPARSE SAMPLING (3 frames per scene)")
@@ -65,138 +193,174 @@ def main():
     print(f"🚀 Total Frames to Process: {len(samples)}")
     
     target_samples = samples[:args.limit] if args.limit else samples
+    # A frame still needs work if ANY scout has not processed it
+    pending = [t for t in target_samples if any(t not in s.processed for s in scouts)]
+
+    # Tag of the detector this run uses (weights@conf/taxonomy[/backend]). Known before YOLOE is
+    # loaded, so a store filled by the same detector can make loading it unnecessary.
+    if detector is not None:
+        print(f"2. Using provided detector ({getattr(detector, 'tag', type(detector).__name__)})")
+        tag = getattr(detector, "tag", None)
+    elif args.detector_address:
+        print(f"2. Connecting to YOLOE detector service ({args.detector_address})...")
+        detector = RemoteDetector(args.detector_address, authkey=args.detector_authkey)
+        tag = detector.tag
+    else:
+        tag = detector_tag(backend=args.detector_backend, int8=args.detector_int8)
+
+    # Detection store: frames detected by an earlier run with the same detector skip YOLOE
+    detection_store = None
+    if args.detections:
+        os.makedirs(os.path.dirname(args.detections) or ".", exist_ok=True)
+        detection_store = DetectionStore(args.detections)
+        stored = detection_store.tokens(detector=tag)
+        print(f"🗃️ Detection store {args.detections}: {sum(t in stored for t in pending)}/{len(pending)} pending frame(s) already detected by {tag}")
 
-    # Open both files
-    with open(INDEX_FILE, 'a') as f_index, open(LOG_FILE, 'a') as f_log:
+    # Queue workers may lease frames seeded by other boxes, so they always need a detector
+    if detector is None:
+        if detection_store is not None and not args.queue_db and all(t in stored for t in pending):
+            print("2. Every pending frame is in the detection store, YOLOE not needed")
+        else:
+            from src.model.detector import ObjectDetector
+            print("2. Loading YOLOE Detector...")
+            detector = ObjectDetector(backend=args.detector_backend, int8=args.detector_int8)
+
+    if args.export_requests:
+        scout = scouts[0]
+        export_requests(loader, detector, scout.client, SYSTEM_PROMPT, pending,
+                        args.export_requests, scout.output_name, shard_size=args.shard_size,
+                        max_image_size=(args.max_image_size, args.max_image_size), detection_store=detection_store)
+        return
+
+    # Work-queue mode: tokens come from shared leases and output goes to this worker's shards.
+    # The canonical index is still honoured so a merged run never re-mines a frame.
+    wq = None
+    heartbeat = contextlib.nullcontext()
+    on_commit = None
+    if args.queue_db:
+        worker_id = args.worker_id or default_worker_id()
+        wq = WorkQueue(args.queue_db, lease_seconds=args.lease_seconds)
+        added = wq.seed(pending)
+        for scout in scouts:
+            scout.index_file, scout.log_file = shard_paths(OUTPUT_DIR, scout.output_name, worker_id)
+        print(f"🗂️ Mode: WORK QUEUE ({args.queue_db}) as worker '{worker_id}'. Seeded {added} new task(s): {wq.counts()}")
+        todo, total = wq.iter_tokens(worker_id, args.lease_batch), None
+        heartbeat = LeaseHeartbeat(wq, worker_id)
+        on_commit = lambda token, success: wq.complete(worker_id, token, success)
+    else:
+        todo, total = pending, len(pending)
+
+    # Open both files (per scout)
+    with contextlib.ExitStack() as stack:
+        for scout in scouts:
+            scout.f_index = stack.enter_context(open(scout.index_file, 'a'))
+            scout.f_log = stack.enter_context(open(scout.log_file, 'a'))
+        stack.enter_context(heartbeat)
+        tracer = stack.enter_context(Tracer(
+            enabled=bool(args.trace or args.metrics_file or args.metrics_port),
+            trace_file=args.trace, metrics_file=args.metrics_file, metrics_port=args.metrics_port, total=total,
+        ))
+        try:
+            mine(args, loader, detector, scouts, todo, total, on_commit, detection_store, tracer)
+        finally:
+            if wq is not None:
+                wq.release(worker_id)
+
+    if use_pool:
+        for scout in scouts:
+            print(f"📊 [{scout.output_name}] Pool stats: {scout.client.stats()}")
+    if args.payload_cache:
+        print(f"📦 Payload cache: {client_kwargs['payload_cache'].stats()}")
+    if args.response_cache:
+        print(f"💬 Response cache: {client_kwargs['response_cache'].stats()}")
+    if wq is not None:
+        names = " ".join(s.output_name for s in scouts)
+        print(f"🗂️ Queue status: {wq.counts()}. Run 'python -m src.work_queue merge --output_name <name>' for: {names} when all workers finish.")
+
+def parse_scout_spec(spec):
+    """'qwen3_run=qwen3-30b-docker@1235' -> ('qwen3_run', 'qwen3-30b-docker', '1235'). Endpoint is optional."""
+    if "=" not in spec:
+        raise ValueError(f"Scout spec must look like output_name=model[@endpoint], got '{spec}'")
+    output_name, rest = spec.split("=", 1)
+    model, _, endpoint = rest.partition("@")
+    return output_name, model, endpoint or None
+
+def mine(args, loader, detector, scouts, todo, total, on_commit=None, detection_store=None, tracer=NULL_TRACER):
+    if args.pipeline:
+        print(f"🔀 Mode: PIPELINED ({'ordered' if not args.unordered else 'unordered'} commit, "
+              f"{args.vlm_workers} VLM worker(s), queue size {args.queue_size})")
+        pipeline = MiningPipeline(
+            loader, detector, scouts, SYSTEM_PROMPT,
+            queue_size=args.queue_size, load_workers=args.load_workers, detect_workers=args.detect_workers,
+            encode_workers=args.encode_workers, vlm_workers=args.vlm_workers,
+            detect_batch_frames=args.detect_batch_frames, ordered=not args.unordered, verbose=args.verbose,
+            max_image_size=(args.max_image_size, args.max_image_size), detection_store=detection_store,
+            tracer=tracer,
+        )
+        pipeline.run(todo, total=total, on_commit=on_commit)
+        return
+
+    # Sequential loop (single scout)
+    scout = scouts[0]
+    client = scout.client
+    for token in tqdm(todo, total=total):
+        if token in scout.processed:
+            # Leased but already in the canonical index (work queue): finish the lease without re-mining
+            if on_commit: on_commit(token, True)
+            continue
+
+        # 1. Load Images
+        with tracer.span("decode", token):
+            images = load_camera_images(loader, token, max_size=(args.max_image_size, args.max_image_size))
+        if images is None:
+            tracer.count("frames_committed")
+            tracer.count("frames_failed")
+            if on_commit: on_commit(token, False)
+            continue 
+
+        t0 = time.time()
         
-        for token in tqdm(target_samples):
-            if token in processed_tokens: continue
-
-            # 1. Load Images
-            paths = loader.get_camera_paths(token)
-            images = {}
-            for cam, path in paths.items():
-                try: 
-                    img = Image.open(path)
-                    img.thumbnail((1280, 1280))  # The image will be resized if too large
-                    images[cam] = img
-                except: pass
-            
-            if len(images) < 3: continue 
-
-            t0 = time.time()
-            
-            # 2. Run YOLOE
-            try:
-                inventory = detector.detect_batch(images)
-            except Exception as e:
-                print(f"Detector Failed: {e}")
-                inventory = "Detector Error"
-            
-            # inventory = "ERROR. Identification Failed. Identify the objects by yourself."
-            # print(f'Inventory: {inventory}')
-            t1 = time.time() # YOLO Done
-
-            # 3. Run VLM Reasoning (Retry Logic)
-            result = None
-            attempts_used = 0 # <--- TRACK THIS
-
-            for attempt in range(3):
-                attempts_used = attempt + 1
-                try:
-                    start_time = time.time()
-                    result = client.analyze_multiview(
-                        images, 
-                        SYSTEM_PROMPT, 
-                        object_inventory=inventory
-                    )
-                    
-                    if result["success"]:
-                        break # Exit retry loop on success
-                    
-                    # If JSON parse failed but we got text, wait and retry
-                    time.sleep(1)
-                except Exception as e:
-                    print(f"API Error: {e}")
-                    time.sleep(2)
-
-            # 4. Prepare Data for Saving
-            timestamp = time.time()
-            t2 = time.time() # VLM Done
-
-            # 4. CALCULATE METRICS
-            yolo_duration = t1 - t0
-            vlm_duration = t2 - t1
-            total_duration = t2 - t0
-            
-            # TPS Calculation
-            tps = 0
-            if result and result.get("usage"):
-                total_gen_tokens = result["usage"].get("output_tokens", 0)
-                if vlm_duration > 0:
-                    tps = total_gen_tokens / vlm_duration
-
-            # Extract Criticality for fast sorting
-            criticality = -1
-            if result and result["success"] and "parsed_json" in result:
-                # Safe navigation
-                try:
-                    crit_block = result["parsed_json"].get("scenario_criticality", {})
-                    criticality = int(crit_block.get("risk_score", -1))
-                except: pass
-                
-            # --- BUILD LOG ENTRY (Saves EVERYTHING) ---
-            log_entry = {
-                "token": token,
-                "timestamp": t0,
-                "model": args.model,
-                "yolo_inventory": inventory,
-                
-                # --- NEW METRICS ---
-                "perf_yolo_latency": round(yolo_duration, 4),
-                "perf_vlm_latency": round(vlm_duration, 4),
-                "perf_total_latency": round(total_duration, 4),
-                "perf_tps": round(tps, 2),
-                "meta_attempts_needed": attempts_used,
-                "meta_risk_score": criticality,
-                # -------------------
-                
-                # Token Metrics
-                "usage": result.get("usage") if result else None,
-                "error": result["error"] if result else "Loop Failed",
-                "success": result["success"] if result else False,
-                
-                "latency_seconds": time.time() - start_time, # <--- ADD THIS
-                
-                "prompt_messages": result["input_messages_log"] if result else "API Call Failed",
-                "raw_response": result["raw_response"] if result else None,
-                "reasoning_trace": result["reasoning_trace"] if result else None
-            }
-            
-            # Write Log
-            f_log.write(json.dumps(log_entry) + "\n")
-            f_log.flush()
-
-            # --- BUILD INDEX ENTRY (Only if success) ---
-            if result and result["success"]:
-                clean_data = result["parsed_json"]
-                clean_data['token'] = token
-                clean_data['model_source'] = args.output_name
-                
-                clean_data['yolo_inventory'] = inventory 
-
-                
-                # Write Index
-                f_index.write(json.dumps(clean_data) + "\n")
-                f_index.flush()
-
-                # Print to console if verbose
-                if args.verbose and result.get("reasoning_trace"):
-                    print(f"\n[Token: {token}] 🧠 Reasoning:\n{result['reasoning_trace'][:300]}...\n")
-            
-            elif result and not result["success"]:
-                # Print failure to console
-                print(f"\n❌ Failed Token {token}: {result['error']}")
+        # 2. Run YOLOE
+        with tracer.span("detect", token):
+            inventory = run_detector(detector, images, detection_store, token)
+        
+        # inventory = "ERROR. Identification Failed. Identify the objects by yourself."
+        # print(f'Inventory: {inventory}')
+        t1 = time.time() # YOLO Done
+
+        # 3. Run VLM Reasoning (Retry Logic)
+        with tracer.span("encode", token):
+            messages = client.build_messages(images, SYSTEM_PROMPT, object_inventory=inventory)
+        with tracer.span("vlm", token):
+            result, attempts_used, start_time = call_vlm_with_retry(client, messages)
+        if result is not None:
+            tracer.add_timings(result.get("timings"), token)
+
+        t2 = time.time() # VLM Done
+
+        # 4. Build Log + Index entries and write them
+        log_entry = build_log_entry(
+            token, scout.model, inventory, result, attempts_used,
+            t0, t1 - t0, t2 - t1, start_time, prompt_registry=scout.prompts,
+        )
+        index_entry = None
+        if result and result["success"]:
+            index_entry = build_index_entry(token, scout.output_name, inventory, result)
+        with tracer.span("write", token):
+            commit_frame(scout.f_index, scout.f_log, log_entry, index_entry)
+        tracer.count("frames_committed")
+        tracer.count("frames_ok" if index_entry is not None else "frames_failed")
+
+        if index_entry is not None:
+            # Print to console if verbose
+            if args.verbose and result.get("reasoning_trace"):
+                print(f"\n[Token: {token}] 🧠 Reasoning:\n{result['reasoning_trace'][:300]}...\n")
+        
+        elif result and not result["success"]:
+            # Print failure to console
+            print(f"\n❌ Failed Token {token}: {result['error']}")
+
+        if on_commit: on_commit(token, index_entry is not None)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
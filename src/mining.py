@@ -0,0 +1,215 @@
+# src/mining.py
+# Frame-level building blocks shared by the sequential loop in main.py
+# and the stage-overlapped pipeline in pipeline.py.
+import asyncio
+import json
+import os
+import time
+from src.data.images import load_camera_images as load_images
+from src.data.detection_store import format_inventory
+from src.model.retry import RetryPolicy, RetryLoop
+
+# Same budget main.py always used before sending frames to YOLO/VLM.
+# nuScenes frames are 1600x900, so --max_image_size 1600 keeps them untouched (see --jpeg_passthrough).
+MAX_IMAGE_SIZE = (1280, 1280)
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+def load_processed_tokens(index_file):
+    """Resume Logic: every token already present in the index is skipped."""
+    processed_tokens = set()
+    if os.path.exists(index_file):
+        with open(index_file, 'r') as f:
+            for line in f:
+                try: processed_tokens.add(json.loads(line)['token'])
+                except: pass
+    return processed_tokens
+
+
+def load_camera_images(loader, token, max_size=MAX_IMAGE_SIZE):
+    """Returns {cam: PIL.Image} or None if fewer than 3 cameras could be read."""
+    # Decoded straight to the target size (DCT scaling) when the image is too large
+    images = load_images(loader.get_camera_paths(token), max_size=max_size)
+    if len(images) < 3: return None
+    return images
+
+
+def run_detector(detector, images, store=None, token=None):
+    """
+    Inventory string for one frame. With a DetectionStore, frames detected by an
+    earlier run are formatted from the store and YOLOE is not called at all.
+    """
+    if store is not None:
+        return run_detector_many(detector, [images], store, [token])[0]
+    try:
+        return detector.detect_batch(images)
+    except Exception as e:
+        print(f"Detector Failed: {e}")
+        return "Detector Error"
+
+
+def run_detector_many(detector, frames, store=None, tokens=None):
+    """Cross-frame batched detection; falls back to one call per frame if that fails."""
+    if store is None:
+        try:
+            return detector.detect_many(frames)
+        except Exception as e:
+            print(f"Batched Detector Failed ({e}), retrying frame by frame")
+            return [run_detector(detector, images) for images in frames]
+
+    # Only detections made by this very detector count (same weights, threshold, taxonomy, backend)
+    tag = getattr(detector, "tag", None)
+    inventories = [None] * len(frames)
+    missing = []
+    for i, token in enumerate(tokens):
+        detections = store.get(token, detector=tag)
+        if detections is not None:
+            inventories[i] = format_inventory(detections)
+        else:
+            missing.append(i)
+    if not missing:
+        return inventories
+
+    try:
+        structured = detector.detect_many_structured([frames[i] for i in missing])
+    except Exception as e:
+        print(f"Detector Failed: {e}")
+        structured = [None] * len(missing)
+    for i, detections in zip(missing, structured):
+        if detections is None:
+            inventories[i] = "Detector Error"  # Not stored, so the next run tries again
+            continue
+        store.put(tokens[i], detections, detector=tag)
+        inventories[i] = format_inventory(detections)
+    return inventories
+
+
+def call_vlm_with_retry(client, messages, policy=DEFAULT_RETRY_POLICY):
+    """
+    Sends the same pre-built messages (encoded once) until success or until the
+    policy gives up on the failure kind. Waits on the client's circuit breaker
+    (if any) so a dead server parks the workers instead of failing every frame.
+    Returns (result, attempts_used, last_attempt_start); result["failure_kinds"]
+    lists what went wrong on each failed attempt. Only the first attempt consults
+    the response cache: a retry is always a fresh request.
+    """
+    loop = RetryLoop(client, policy)
+    while True:
+        loop.wait_breaker()
+        loop.begin()
+        try:
+            result, exc = client.complete(messages, lookup=loop.attempts_used == 1), None
+        except Exception as e:
+            result, exc = None, e
+        delay = loop.end(result, exc)
+        if delay is None:
+            break
+        if delay > 0:
+            time.sleep(delay)
+    return loop.outcome()
+
+
+async def call_vlm_with_retry_async(client, messages, policy=DEFAULT_RETRY_POLICY):
+    """call_vlm_with_retry for AsyncVLMClient: same policy, breaker and return value, awaited."""
+    loop = RetryLoop(client, policy)
+    while True:
+        if loop.breaker is not None and loop.breaker.state != "closed":
+            # Blocking wait in a thread so the other requests on the loop keep going
+            t_wait = time.time()
+            await asyncio.to_thread(loop.breaker.wait)
+            loop.note_wait(t_wait)
+        loop.begin()
+        try:
+            result, exc = await client.complete(messages, lookup=loop.attempts_used == 1), None
+        except Exception as e:
+            result, exc = None, e
+        delay = loop.end(result, exc)
+        if delay is None:
+            break
+        if delay > 0:
+            await asyncio.sleep(delay)
+    return loop.outcome()
+
+
+def build_log_entry(token, model, inventory, result, attempts_used, t0, yolo_duration, vlm_duration, last_attempt_start,
+                    prompt_registry=None):
+    """
+    The Full Log (saves EVERYTHING) for debugging and the paper appendix.
+    With a PromptRegistry the prompt is stored once and referenced by 'prompt_id'.
+    """
+    total_duration = yolo_duration + vlm_duration
+
+    # TPS Calculation
+    tps = 0
+    if result and result.get("usage"):
+        total_gen_tokens = result["usage"].get("output_tokens", 0)
+        if vlm_duration > 0:
+            tps = total_gen_tokens / vlm_duration
+
+    # Extract Criticality for fast sorting
+    criticality = -1
+    if result and result["success"] and "parsed_json" in result:
+        # Safe navigation
+        try:
+            crit_block = result["parsed_json"].get("scenario_criticality", {})
+            criticality = int(crit_block.get("risk_score", -1))
+        except: pass
+
+    entry = {
+        "token": token,
+        "timestamp": t0,
+        "model": model,
+        "yolo_inventory": inventory,
+
+        # --- METRICS ---
+        "perf_yolo_latency": round(yolo_duration, 4),
+        "perf_vlm_latency": round(vlm_duration, 4),
+        "perf_total_latency": round(total_duration, 4),
+        "perf_tps": round(tps, 2),
+        "perf_ttft": round(result["ttft"], 4) if result and result.get("ttft") is not None else None,  # Prompt processing (see usage.cached_tokens)
+        "meta_attempts_needed": attempts_used,
+        "meta_failure_kinds": result.get("failure_kinds") if result else None,
+        "meta_stop_reason": result.get("stop_reason") if result else None,
+        "meta_risk_score": criticality,
+        "meta_cache_hit": bool(result and result.get("cache_hit")),  # Latencies are lookup times, not generation
+        "meta_constrained": bool(result and result.get("constrained")),  # Decoded under the JSON schema
+        "meta_repairs": result.get("repairs") if result else None,  # Local JSON fixes (src.model.json_repair)
+        "meta_schema_errors": result.get("schema_errors") if result else None,  # Left after repair (fatal only with --strict_schema)
+        # -------------------
+
+        # Token Metrics
+        "usage": result.get("usage") if result else None,
+        "error": result["error"] if result else "Loop Failed",
+        "success": result["success"] if result else False,
+
+        # Duration of the final attempt. (Used to be measured at log time, so it also
+        # counted queueing behind the writer.)
+        "latency_seconds": result["last_attempt_latency"] if result and "last_attempt_latency" in result else time.time() - last_attempt_start,
+
+        "prompt_messages": result["input_messages_log"] if result else "API Call Failed",
+        "raw_response": result["raw_response"] if result else None,
+        "reasoning_trace": result["reasoning_trace"] if result else None
+    }
+    if prompt_registry is not None and isinstance(entry["prompt_messages"], list):
+        entry["prompt_id"] = prompt_registry.intern(entry.pop("prompt_messages"), inventory)
+    return entry
+
+
+def build_index_entry(token, output_name, inventory, result):
+    """The Clean Index (for search). Only successful frames make it here."""
+    clean_data = result["parsed_json"]
+    clean_data['token'] = token
+    clean_data['model_source'] = output_name
+    clean_data['yolo_inventory'] = inventory
+    return clean_data
+
+
+def commit_frame(f_index, f_log, log_entry, index_entry=None):
+    # Write Log
+    f_log.write(json.dumps(log_entry) + "\n")
+    f_log.flush()
+
+    # Write Index (only on success)
+    if index_entry is not None:
+        f_index.write(json.dumps(index_entry) + "\n")
+        f_index.flush()
@@ -0,0 +1,110 @@
+# src/model/async_vlm_client.py
+# asyncio flavour of VLMClient: one event loop drives hundreds of requests in flight over a
+# pooled keep-alive connection set, instead of one OS thread per outstanding request.
+#
+# Same encoding, caches, streaming early stop, constrained decoding, JSON repair and result
+# package as VLMClient (it subclasses it); only the network calls are awaited:
+#
+#   client = AsyncVLMClient(model_id="qwen3-vl-30b", port=1234, max_connections=256)
+#   result = await client.analyze_multiview(images, SYSTEM_PROMPT, object_inventory=inventory)
+#   result, attempts, start = await call_vlm_with_retry_async(client, messages)   # src.mining
+#   await client.aclose()
+import asyncio
+import time
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from src.model.retry import classify_exception
+from src.model.streaming import StreamMonitor
+from src.model.vlm_client import VLMClient
+
+
+class AsyncVLMClient(VLMClient):
+    def __init__(self, model_id="qwen3-vl-30b", port=1234, base_url=None, max_connections=256,
+                 max_keepalive=64, keepalive_expiry=60.0, **client_kwargs):
+        super().__init__(model_id=model_id, port=port, base_url=base_url, **client_kwargs)
+        # One pool for every request: connections are reused (no TCP setup per frame) and
+        # capped so a burst can't open thousands of sockets against a single server
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                                keepalive_expiry=keepalive_expiry),
+            timeout=self.timeout,
+        )
+        # No SDK-level retries: call_vlm_with_retry_async is the only place that retries
+        self.aclient = AsyncOpenAI(base_url=self.base_url, api_key=self.api_key, http_client=self.http_client,
+                                   max_retries=0, timeout=self.timeout)
+
+    async def _create(self, messages, **extra):
+        """Awaitable VLMClient._create (same response_format fallback)."""
+        kwargs = self.request_kwargs(messages)
+        try:
+            return await self.aclient.chat.completions.create(**kwargs, **extra)
+        except (openai.BadRequestError, openai.UnprocessableEntityError) as e:
+            if "response_format" not in kwargs:
+                raise
+            self.schema_supported = False
+            try:
+                response = await self.aclient.chat.completions.create(**self.request_kwargs(messages), **extra)
+            except Exception:
+                self.schema_supported = True
+                raise
+            print(f"\n⚠️ {self.base_url} does not accept response_format ({e}). Falling back to unconstrained decoding.")
+            return response
+
+    async def complete(self, messages, lookup=True):
+        t_lookup = time.time()
+        cached = self.cached_result(messages) if lookup else None
+        if cached is not None:
+            cached["timings"].append(("cache_lookup", t_lookup, time.time()))
+            return cached
+
+        result_pkg = self._new_result(self._sanitize_for_logging(messages))
+        if self.stream:
+            return await self._complete_stream(messages, result_pkg)
+        t_gen = time.time()
+        try:
+            response = await self._create(messages)
+            self._handle_response(messages, response, result_pkg, t_gen)
+        except Exception as e:
+            result_pkg["error"] = str(e)
+            result_pkg["error_kind"] = classify_exception(e)
+
+        result_pkg["constrained"] = self.constrained and self.schema_supported
+        return result_pkg
+
+    async def _complete_stream(self, messages, result_pkg):
+        monitor = StreamMonitor(think_budget=self.think_budget)
+        usage = None
+        stream = None
+        t_gen = time.time()
+        try:
+            stream = await self._create(messages, stream=True)
+            async for chunk in stream:
+                stop, usage = self._feed_chunk(chunk, monitor, result_pkg, usage)
+                if stop is not None:
+                    break
+        except Exception as e:
+            result_pkg["error"] = str(e)
+            result_pkg["error_kind"] = classify_exception(e)
+        finally:
+            if stream is not None:
+                await stream.close()  # Cancels generation server-side
+            result_pkg["timings"].append(("generation", t_gen, time.time()))
+        return self._finish_stream(messages, result_pkg, monitor, usage, t_gen)
+
+    async def analyze_multiview(self, camera_images, system_prompt, object_inventory=None, verbose=False):
+        # JPEG/base64 encoding is CPU work: run it in a thread so the loop keeps serving other requests
+        messages = await asyncio.to_thread(self.build_messages, camera_images, system_prompt,
+                                           object_inventory=object_inventory, verbose=verbose)
+        return await self.complete(messages)
+
+    async def aclose(self):
+        await self.aclient.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
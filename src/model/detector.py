@@ -1,91 +1,197 @@
 # src/model/detector.py
-from ultralytics import YOLOE
+import hashlib
+import os
+import shutil
+
+import ultralytics
+from ultralytics import YOLO, YOLOE
+import numpy as np
 import torch
 
+from src.model.taxonomy import CLASSES, TAXONOMY_VERSION, classes_hash, detector_tag, DEFAULT_WEIGHTS, DEFAULT_CONF
+
+TEXT_PE_CACHE_DIR = "output/cache/text_pe"
+EXPORT_DIR = "output/cache/exports"
+
+# "pytorch" runs the checkpoint; the others run a CPU export with the class vocabulary baked in
+BACKENDS = ("pytorch", "onnx", "openvino")
+
+
+def _weights_key(weights):
+    """Content hash of the checkpoint (plus the ultralytics version, which picks the text encoder)."""
+    h = hashlib.sha1(ultralytics.__version__.encode())
+    if os.path.isfile(weights):
+        with open(weights, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    else:
+        h.update(str(weights).encode())
+    return f"{os.path.splitext(os.path.basename(str(weights)))[0]}-{h.hexdigest()[:16]}"
+
+
+def _export_path(weights, classes, backend, int8, imgsz, export_dir):
+    """Where the export of these weights/classes/settings lives (known before the checkpoint is loaded)."""
+    key = f"{_weights_key(weights)}_{classes_hash(classes)}_{imgsz}{'_int8' if int8 else ''}"
+    # Ultralytics recognises the export format by its file / directory name
+    return os.path.join(export_dir, f"{key}.onnx" if backend == "onnx" else f"{key}_openvino_model")
+
+
 class ObjectDetector:
-    def __init__(self, model_size='yoloe-11l-seg.pt', conf_threshold=0.40):
+    def __init__(self, model_size=DEFAULT_WEIGHTS, conf_threshold=DEFAULT_CONF, classes=None,
+                 text_pe_cache=TEXT_PE_CACHE_DIR, backend="pytorch", int8=False, imgsz=640,
+                 export_dir=EXPORT_DIR, calib_data=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown detector backend '{backend}' (choose from {', '.join(BACKENDS)})")
+        if int8 and backend != "openvino":
+            raise ValueError("int8 quantisation is only available for the openvino backend")
+        self.conf = conf_threshold
+        self.backend = backend
+        taxonomy = TAXONOMY_VERSION if classes is None else f"custom-{classes_hash(classes)}"
+        self.tag = detector_tag(model_size, conf_threshold, taxonomy, backend, int8)  # Recorded next to stored detections
+        
+        # Class list lives in src/model/taxonomy.py (versioned); 'classes' overrides it for experiments
+        self.custom_classes = list(classes) if classes is not None else list(CLASSES)
+        
+        if backend != "pytorch":
+            # A cached export already has the prompts baked in: skip the checkpoint and the text encoder
+            path = _export_path(model_size, self.custom_classes, backend, int8, imgsz, export_dir)
+            if not os.path.exists(path):
+                self._load(model_size, text_pe_cache)
+                path = self._export(model_size, backend, int8, imgsz, export_dir, calib_data)
+            print(f"⚡ Running exported YOLOE ({path})")
+            self.model = YOLO(path, task="segment")
+        else:
+            self._load(model_size, text_pe_cache)
+        
+    def _load(self, model_size, text_pe_cache):
         print(f"🚀 Loading YOLOE-11 Open-Vocabulary Segmentor ({model_size})...")
         self.model = YOLOE(model_size)
-        self.conf = conf_threshold
+        # Compile prompts (text embeddings come from disk when this weights/class-list pair was seen before)
+        self.model.set_classes(self.custom_classes, self._text_pe(model_size, text_pe_cache))
         
-        # DEFINING THE LONG-TAIL TAXONOMY (WOD-E2E Optimized)
-        # We include synonyms to boost recall for specific edge cases.
-        self.custom_classes = [
-            # 1. VRUs (Vulnerable Road Users)
-            "person", "pedestrian", "child", 
-            "cyclist", "bicyclist", "motorcyclist", "scooter rider",
-            "construction worker", "worker in safety vest", "police officer",
-            
-            # 2. Vehicles (Specialized)
-            "car", "pickup truck", "suv", "van", "sedan", "coupe",
-            "truck", "semi truck", "trailer", "cement mixer",
-            "bus", "school bus",
-            "police car", "police vehicle", "ambulance", "fire truck",
-            "construction vehicle", "bulldozer", "excavator", "forklift",
-            "road sweeper", "street cleaner",
-            
-            # 3. Construction & Barriers
-            "traffic cone", "orange cone",  "traffic drum",
-            "construction barrel", "orange drum", # Crucial for Highway Construction
-            "traffic barrier", "concrete barrier", "jersey barrier",
-            "road work sign", "temporary sign",
-            "construction fence", "safety fence",
-            "scaffolding", "construction scaffolding",
-            
-            # 4. Hazards / Debris (FOD)
-            "debris", "cardboard box", "tire", 
-            "plastic bag", "tree branch", "large rock",
-            "puddle", 
-            
-            # 5. Traffic Control
-            "traffic light", "traffic signal", "red light", 
-            "stop sign", "yield sign", "speed limit sign",
-            "pedestrian crossing sign", "school zone sign",
-            "crosswalk",
-        ]
+    def _export(self, model_size, backend, int8, imgsz, export_dir, calib_data):
+        """
+        Exports the prompted model once (the text embeddings are folded into the head, so the export
+        only knows custom_classes) and reuses it while weights, class list and settings are unchanged.
+        """
+        weights = getattr(self.model, "ckpt_path", None) or model_size
+        path = _export_path(weights, self.custom_classes, backend, int8, imgsz, export_dir)
+        if os.path.exists(path):
+            return path
         
-        # Compile prompts
-        self.model.set_classes(self.custom_classes, self.model.get_text_pe(self.custom_classes))
+        print(f"📦 Exporting YOLOE to {backend}{' (int8)' if int8 else ''}; this happens once per weights/class list...")
+        export_kwargs = {"format": backend, "imgsz": imgsz, "dynamic": True}  # dynamic: cross-frame batches
+        if int8:
+            export_kwargs["int8"] = True
+            if calib_data:
+                export_kwargs["data"] = calib_data  # Calibration images; Ultralytics' default set otherwise
+        exported = self.model.export(**export_kwargs)
+        os.makedirs(export_dir, exist_ok=True)
+        shutil.move(exported, path)
+        return path
         
-    def detect_batch(self, images_dict):
-        summary_lines = []
-        cam_names = list(images_dict.keys())
-        batch_images = [images_dict[k] for k in cam_names]
+
+    def _text_pe(self, model_size, cache_dir):
+        """
+        get_text_pe() runs the text encoder over every class phrase on each start. The result only
+        depends on the weights and the class list, so it is stored under cache_dir keyed by both.
+        """
+        if not cache_dir:
+            return self.model.get_text_pe(self.custom_classes)
+        
+        weights = getattr(self.model, "ckpt_path", None) or model_size
+        path = os.path.join(cache_dir, f"{_weights_key(weights)}_{classes_hash(self.custom_classes)}.pt")
+        if os.path.exists(path):
+            try:
+                return torch.load(path, map_location="cpu")
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable text embedding cache {path}: {e}")
+        
+        text_pe = self.model.get_text_pe(self.custom_classes)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"  # Several workers may start at once: write then rename
+        torch.save(text_pe.detach().cpu(), tmp)
+        os.replace(tmp, path)
+        return text_pe
+        
+    def _arrays(self, result):
+        """
+        Whole-tensor post-processing of one camera's YOLO result: ONE device->host copy
+        per field instead of per box. Returns (cls_ids, confs, rel_sizes, xyxy) in YOLO order.
+        """
+        boxes = result.boxes
+        xyxy = boxes.xyxy.cpu().numpy()
+        cls_ids = boxes.cls.cpu().numpy().astype(np.int64)
+        confs = boxes.conf.cpu().numpy()
+        
+        # Relative Size Calculation (area in float32 like the boxes, ratio in float64)
+        areas = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+        img_area = result.orig_shape[0] * result.orig_shape[1]
+        rel_sizes = areas.astype(np.float64) / img_area
+        return cls_ids, confs, rel_sizes, xyxy
+
+    def _format_arrays(self, cam_name, cls_ids, confs, rel_sizes):
+        """Same text as detection_store.format_camera_line, grouped and ranked with NumPy."""
+        if len(cls_ids) == 0:
+            return f"[{cam_name}]: Clear"
+        
+        # Classes in order of first appearance
+        uniq, first_idx, counts = np.unique(cls_ids, return_index=True, return_counts=True)
+        order = np.argsort(first_idx)
+        
+        parts = []
+        for u, count in zip(uniq[order], counts[order]):
+            idx = np.flatnonzero(cls_ids == u)
+            # Stable descending sort keeps YOLO order among equal sizes (like list.sort(reverse=True))
+            top = idx[np.argsort(-rel_sizes[idx], kind='stable')[:3]]
+            labels = np.where(rel_sizes[top] > 0.1, "Large", np.where(rel_sizes[top] > 0.01, "Med", "Small"))
+            desc_list = [f"{label}/{conf:.2f}" for label, conf in zip(labels, confs[top].tolist())]
+            name = self.custom_classes[int(u)]
+            parts.append(f"{count} {name}{'s' if count>1 else ''} ({', '.join(desc_list)})")
+        return f"[{cam_name}]: " + "; ".join(parts)
+
+    def _extract(self, result):
+        """One camera's YOLO result -> [{"cls", "conf", "size", "box"}] in YOLO order."""
+        cls_ids, confs, rel_sizes, xyxy = self._arrays(result)
+        return [
+            {"cls": self.custom_classes[c], "conf": conf, "size": size, "box": box}
+            for c, conf, size, box in zip(cls_ids.tolist(), confs.tolist(), rel_sizes.tolist(), xyxy.tolist())
+        ]
+
+    def _format_line(self, cam_name, result):
+        cls_ids, confs, rel_sizes, _ = self._arrays(result)
+        return self._format_arrays(cam_name, cls_ids, confs, rel_sizes)
+
+    def _predict(self, frames):
+        """ONE predict call over every camera of every frame. Yields (frame_idx, cam_name, result)."""
+        keys = []
+        batch_images = []
+        for f_idx, images_dict in enumerate(frames):
+            for cam_name, img in images_dict.items():
+                keys.append((f_idx, cam_name))
+                batch_images.append(img)
         
         # Run Inference
         results = self.model.predict(batch_images, verbose=False, conf=self.conf)
-        
-        for i, result in enumerate(results):
-            cam_name = cam_names[i]
-            detections = {}
-            
-            for box in result.boxes:
-                cls_id = int(box.cls)
-                class_name = self.custom_classes[cls_id]
-                conf = float(box.conf)
-                
-                # Relative Size Calculation
-                bbox = box.xyxy[0].cpu().numpy()
-                area = (bbox[2]-bbox[0]) * (bbox[3]-bbox[1])
-                img_area = result.orig_shape[0] * result.orig_shape[1]
-                rel_size = area / img_area
-                
-                if class_name not in detections: detections[class_name] = []
-                detections[class_name].append({"conf": conf, "size": rel_size})
-            
-            # Format Output
-            if detections:
-                parts = []
-                for name, items in detections.items():
-                    items.sort(key=lambda x: x['size'], reverse=True)
-                    desc_list = []
-                    for item in items[:3]: # Top 3 only
-                        size_str = "Large" if item['size'] > 0.1 else "Med" if item['size'] > 0.01 else "Small"
-                        desc_list.append(f"{size_str}/{item['conf']:.2f}")
-                    parts.append(f"{len(items)} {name}{'s' if len(items)>1 else ''} ({', '.join(desc_list)})")
-                line = f"[{cam_name}]: " + "; ".join(parts)
-            else:
-                line = f"[{cam_name}]: Clear"
-            summary_lines.append(line)
-            
-        return "\n".join(summary_lines)
\ No newline at end of file
+        for (f_idx, cam_name), result in zip(keys, results):
+            yield f_idx, cam_name, result
+
+    def detect_many_structured(self, frames):
+        """
+        Cross-frame batching: 'frames' is a list of {cam: image} dicts (e.g. 8-16 samples x 3 cameras).
+        Returns one {cam: detections} dict per frame (the format kept by src.data.detection_store).
+        """
+        structured = [{} for _ in frames]
+        for f_idx, cam_name, result in self._predict(frames):
+            structured[f_idx][cam_name] = self._extract(result)
+        return structured
+
+    def detect_many(self, frames):
+        """One inventory string per frame, identical to calling detect_batch on each frame."""
+        summary_lines = [[] for _ in frames]
+        for f_idx, cam_name, result in self._predict(frames):
+            summary_lines[f_idx].append(self._format_line(cam_name, result))
+        return ["\n".join(lines) for lines in summary_lines]
+
+    def detect_batch(self, images_dict):
+        return self.detect_many([images_dict])[0]
@@ -0,0 +1,240 @@
+# src/model/detector_service.py
+# Long-lived YOLOE service.
+#
+# Loading yoloe-11l-seg.pt and compiling the text prompts for the taxonomy takes a while,
+# and every main.py run / notebook used to pay it again. This process loads the detector
+# ONCE per worker at startup and serves detect_batch() over a local socket, so several
+# mining processes (and notebooks / the curator) can share it.
+#
+# Workers are separate processes ('spawn', so no OpenMP state is inherited through fork),
+# each pinned to 'threads' torch threads. workers * threads ~= physical cores saturates a
+# GPU-less preprocessing node without oversubscription.
+#
+# Server:  python -m src.model.detector_service --address 127.0.0.1:6000 --workers 4 --threads 2
+# Client:  detector = RemoteDetector("127.0.0.1:6000"); detector.detect_batch(images)
+# Both sides read the authkey from --authkey / $SEMANTIC_DRIVE_DETECTOR_AUTHKEY / ~/.cache/semantic-drive/detector_authkey
+# (the service generates the file on first start). Only loopback addresses unless --allow_remote.
+import argparse
+import multiprocessing as mp
+import os
+import secrets
+import sys
+import threading
+from multiprocessing.connection import Listener, Client
+
+sys.path.append(os.path.abspath('.'))
+
+from src.model.taxonomy import TAXONOMY_VERSION, detector_tag
+
+DEFAULT_ADDRESS = "127.0.0.1:6000"
+# The Listener unpickles what clients send, so the authkey is what stands between the port and
+# code execution: it is never a shared constant. Explicit key > env var > per-user key file.
+AUTHKEY_ENV = "SEMANTIC_DRIVE_DETECTOR_AUTHKEY"
+AUTHKEY_FILE = os.path.join(os.path.expanduser("~"), ".cache", "semantic-drive", "detector_authkey")
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+# The connection is gone (service restarted, socket closed): RemoteDetector reconnects once
+TRANSPORT_ERRORS = (EOFError, ConnectionResetError, BrokenPipeError)
+
+# --- WORKER PROCESS ---
+_DETECTOR = None
+
+def _init_worker(model_size, conf_threshold, threads, backend="pytorch", int8=False):
+    global _DETECTOR
+    import torch
+    torch.set_num_threads(threads)
+    from src.model.detector import ObjectDetector
+    _DETECTOR = ObjectDetector(model_size=model_size, conf_threshold=conf_threshold, backend=backend, int8=int8)
+
+def _worker_tag():
+    return _DETECTOR.tag
+
+def _worker_detect(images_dict):
+    return _DETECTOR.detect_batch(images_dict)
+
+def _worker_detect_many(frames):
+    return _DETECTOR.detect_many(frames)
+
+def _worker_detect_many_structured(frames):
+    return _DETECTOR.detect_many_structured(frames)
+
+
+def parse_address(address):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def load_authkey(authkey=None, path=AUTHKEY_FILE, create=False):
+    """
+    bytes authkey from the argument, $SEMANTIC_DRIVE_DETECTOR_AUTHKEY or the key file.
+    create=True (the service) writes a fresh random key to the file (mode 0600) if there is none.
+    """
+    if authkey:
+        return authkey.encode() if isinstance(authkey, str) else authkey
+    if os.environ.get(AUTHKEY_ENV):
+        return os.environ[AUTHKEY_ENV].encode()
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read().strip()
+    if not create:
+        raise RuntimeError(f"No detector authkey: pass one, set ${AUTHKEY_ENV} or copy the service's {path}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    key = secrets.token_hex(32).encode()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    print(f"🔑 Generated detector authkey in {path}")
+    return key
+
+
+def _to_wire(images_dict):
+    # PIL images pickle as raw pixels; RGB keeps the payload identical to what YOLOE sees locally
+    return {cam: img if img.mode == "RGB" else img.convert("RGB") for cam, img in images_dict.items()}
+
+
+class DetectorService:
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None, workers=2, threads=2,
+                 model_size='yoloe-11l-seg.pt', conf_threshold=0.40, backend="pytorch", int8=False,
+                 allow_remote=False):
+        self.address = parse_address(address)
+        if self.address[0] not in LOOPBACK_HOSTS:
+            if not allow_remote:
+                raise ValueError(f"Refusing to listen on {address}: clients can run code through this socket. "
+                                 f"Bind to 127.0.0.1 (tunnel over SSH), or pass allow_remote / --allow_remote on a trusted network.")
+            print(f"⚠️ Detector service reachable from the network ({address}): anyone holding the authkey can run code here")
+        self.authkey = load_authkey(authkey, create=True)
+        self.workers = workers
+        self.threads = threads
+        self.model_size = model_size
+        self.conf_threshold = conf_threshold
+        self.backend = backend
+        self.int8 = int8
+        self.served = 0
+        self._lock = threading.Lock()
+
+    def _handle(self, conn, pool):
+        try:
+            while True:
+                try:
+                    op, payload = conn.recv()
+                except (EOFError, ConnectionResetError):
+                    break
+                try:
+                    if op == "detect_batch":
+                        result = pool.apply(_worker_detect, (payload,))
+                        with self._lock: self.served += 1
+                    elif op == "detect_many":
+                        result = pool.apply(_worker_detect_many, (payload,))
+                        with self._lock: self.served += len(payload)
+                    elif op == "detect_many_structured":
+                        result = pool.apply(_worker_detect_many_structured, (payload,))
+                        with self._lock: self.served += len(payload)
+                    elif op == "ping":
+                        result = {"workers": self.workers, "threads": self.threads,
+                                  "model": self.model_size, "conf": self.conf_threshold, "served": self.served,
+                                  "taxonomy": TAXONOMY_VERSION, "backend": self.backend, "int8": self.int8}
+                    else:
+                        raise ValueError(f"Unknown op '{op}'")
+                    conn.send(("ok", result))
+                except Exception as e:
+                    conn.send(("error", str(e)))
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        ctx = mp.get_context("spawn")
+        if self.backend != "pytorch":
+            # Export once here, so the workers don't all run the exporter on the same files at startup
+            with ctx.Pool(1, initializer=_init_worker,
+                          initargs=(self.model_size, self.conf_threshold, 1, self.backend, self.int8)) as warmup:
+                warmup.apply(_worker_tag)
+        print(f"🚀 Starting {self.workers} YOLOE worker(s) x {self.threads} torch thread(s)...")
+        pool = ctx.Pool(self.workers, initializer=_init_worker,
+                        initargs=(self.model_size, self.conf_threshold, self.threads, self.backend, self.int8))
+
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"✅ Detector service listening on {self.address[0]}:{self.address[1]}")
+            try:
+                while True:
+                    conn = listener.accept()
+                    threading.Thread(target=self._handle, args=(conn, pool), daemon=True).start()
+            except KeyboardInterrupt:
+                print("\n🛑 Shutting down detector service")
+            finally:
+                pool.terminate()
+
+
+class RemoteDetector:
+    """
+    Drop-in for ObjectDetector.detect_batch backed by a running DetectorService.
+    Each calling thread gets its own connection, so pipeline detect workers run in parallel.
+    """
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None):
+        self.address = parse_address(address)
+        self.authkey = load_authkey(authkey)
+        self._local = threading.local()
+        info = self._call("ping", None)
+        self.tag = detector_tag(info['model'], info.get('conf'), info.get('taxonomy'), info.get('backend', "pytorch"), info.get('int8'))
+        print(f"✅ Connected to detector service at {address} ({info['workers']} worker(s), {info['model']})")
+
+    def _conn(self):
+        if getattr(self._local, "conn", None) is None:
+            self._local.conn = Client(self.address, authkey=self.authkey)
+        return self._local.conn
+
+    def _drop_conn(self):
+        conn, self._local.conn = self._local.conn, None
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def _call(self, op, payload):
+        # A restarted service (or a dropped socket) leaves this thread holding a dead connection:
+        # forget it and retry once on a fresh one. Detection is read-only, so a resend is safe.
+        for attempt in range(2):
+            conn = self._conn()
+            try:
+                conn.send((op, payload))
+                status, result = conn.recv()
+                break
+            except TRANSPORT_ERRORS:
+                self._drop_conn()
+                if attempt:
+                    raise
+        if status != "ok":
+            raise RuntimeError(f"Detector service error: {result}")
+        return result
+
+    def detect_batch(self, images_dict):
+        return self._call("detect_batch", _to_wire(images_dict))
+
+    def detect_many(self, frames):
+        return self._call("detect_many", [_to_wire(images_dict) for images_dict in frames])
+
+    def detect_many_structured(self, frames):
+        return self._call("detect_many_structured", [_to_wire(images_dict) for images_dict in frames])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--address", type=str, default=DEFAULT_ADDRESS, help="host:port to listen on")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Inference processes")
+    parser.add_argument("--threads", type=int, default=2, help="torch threads per worker")
+    parser.add_argument("--model_size", type=str, default='yoloe-11l-seg.pt')
+    parser.add_argument("--conf", type=float, default=0.40)
+    parser.add_argument("--backend", type=str, default="pytorch", choices=["pytorch", "onnx", "openvino"], help="YOLOE checkpoint or CPU export")
+    parser.add_argument("--int8", action="store_true", help="int8-quantised export (openvino backend)")
+    parser.add_argument("--authkey", type=str, default=None, help=f"Shared secret (default: ${AUTHKEY_ENV}, else {AUTHKEY_FILE}, generated if missing)")
+    parser.add_argument("--allow_remote", action="store_true", help="Allow binding to a non-loopback address (trusted networks only)")
+    args = parser.parse_args()
+
+    try:
+        service = DetectorService(args.address, authkey=args.authkey, workers=args.workers, threads=args.threads,
+                                  model_size=args.model_size, conf_threshold=args.conf,
+                                  backend=args.backend, int8=args.int8, allow_remote=args.allow_remote)
+    except ValueError as e:
+        parser.error(str(e))
+    service.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# src/model/json_repair.py
+# Local repair of almost-valid VLM answers, so they don't cost another generation.
+#
+# Syntax: // and /* */ comments (copied from OUTPUT_SKELETON), trailing commas,
+# Python literals (True/False/None), text after the object, and truncated tails
+# (open strings/brackets closed, or cut back to the last complete member).
+# Schema (src.model.schema): enum values a few characters off the vocabulary are snapped
+# to the closest allowed value (difflib), near-miss key names renamed, unknown keys
+# dropped, numbers coerced/clamped, "..." placeholders removed from lists.
+# Every change is reported; if the result still doesn't validate, the caller re-asks the model.
+import difflib
+import json
+import re
+
+from src.model.schema import OUTPUT_SCHEMA, validate
+
+PLACEHOLDERS = {"...", "…", ""}
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _scan(text):
+    """
+    One pass over the text outside of strings: drops comments and trailing commas and maps
+    Python literals. Returns (clean, in_string, open_brackets, cuts, fixes) where 'cuts'
+    are (position, open_brackets) of member-separating commas, for cutting a truncated tail.
+    """
+    out = []
+    stack = []
+    cuts = []
+    fixes = set()
+    in_str = escape = False
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if in_str:
+            out.append(ch)
+            if escape: escape = False
+            elif ch == "\\": escape = True
+            elif ch == '"': in_str = False
+            i += 1
+            continue
+        if ch == '"':
+            in_str = True
+        elif text.startswith("//", i):
+            j = text.find("\n", i)
+            i = n if j == -1 else j
+            fixes.add("comments")
+            continue
+        elif text.startswith("/*", i):
+            j = text.find("*/", i + 2)
+            i = n if j == -1 else j + 2
+            fixes.add("comments")
+            continue
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            # Trailing comma before the closer
+            k = len(out) - 1
+            while k >= 0 and out[k].isspace(): k -= 1
+            if k >= 0 and out[k] == ",":
+                del out[k]
+                fixes.add("trailing_comma")
+            if stack: stack.pop()
+        elif ch == "," and stack:
+            cuts.append((len(out), list(stack)))
+        elif ch.isalpha():
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"): j += 1
+            word = text[i:j]
+            if word in _PY_LITERALS:
+                word = _PY_LITERALS[word]
+                fixes.add("python_literal")
+            out.append(word)
+            i = j
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out), in_str, stack, cuts, fixes
+
+
+def _close(body, stack):
+    body = body.rstrip()
+    if body.endswith(","): body = body[:-1]
+    return body + "".join(_CLOSERS[b] for b in reversed(stack))
+
+
+def repair_syntax(text, max_cuts=8):
+    """(object or None, [repairs]). Well-formed JSON comes back untouched with no repairs."""
+    try:
+        return json.loads(text), []
+    except ValueError:
+        pass
+    if not text or "{" not in text:
+        return None, []
+    text = text[text.find("{"):]
+    clean, in_str, stack, cuts, fixes = _scan(text)
+
+    candidates = []
+    if in_str or stack:
+        candidates.append((clean + ('"' if in_str else ""), stack, "closed_truncated"))
+        # Cutting at a comma drops a half-written member like '"risk_sc' or '"description": "Rain an'
+        candidates += [(clean[:pos], st, "cut_truncated_member") for pos, st in reversed(cuts[-max_cuts:])]
+    else:
+        candidates.append((clean, [], None))
+
+    decoder = json.JSONDecoder()
+    for body, st, fix in candidates:
+        try:
+            closed = _close(body, st)
+            obj, end = decoder.raw_decode(closed)
+        except ValueError:
+            continue
+        if not isinstance(obj, dict):
+            continue
+        repairs = sorted(fixes) + ([fix] if fix else [])
+        if closed[end:].strip():
+            repairs.append("trailing_text")
+        return obj, repairs
+    return None, sorted(fixes)
+
+
+def _norm(value):
+    return re.sub(r"[\s\-/]+", "_", value.strip().lower())
+
+
+def snap_value(value, allowed, cutoff=0.8):
+    """Closest allowed value for a near-miss string ('Heavy Rain' -> 'heavy_rain', 'jaywalking_hesitent' -> ...), else None."""
+    if value in allowed:
+        return value
+    norm = _norm(value)
+    by_norm = {_norm(a): a for a in allowed}
+    if norm in by_norm:
+        return by_norm[norm]
+    match = difflib.get_close_matches(norm, list(by_norm), n=1, cutoff=cutoff)
+    return by_norm[match[0]] if match else None
+
+
+def conform(obj, schema=OUTPUT_SCHEMA, path="$", repairs=None, cutoff=0.8):
+    """Best-effort fit of 'obj' to the schema. Returns (fixed obj, repairs); check with validate() afterwards."""
+    repairs = [] if repairs is None else repairs
+    kind = schema.get("type")
+
+    if kind == "object" and isinstance(obj, dict):
+        props = schema["properties"]
+        fixed = {}
+        for key, value in obj.items():
+            if key in props or key.startswith("_"):
+                fixed[key] = value
+                continue
+            missing = [k for k in props if k not in obj and k not in fixed]
+            match = difflib.get_close_matches(key, missing, n=1, cutoff=cutoff)
+            if match:
+                repairs.append(f"{path}: key '{key}' -> '{match[0]}'")
+                fixed[match[0]] = value
+            elif schema.get("additionalProperties") is False:
+                repairs.append(f"{path}: dropped key '{key}'")
+            else:
+                fixed[key] = value
+        for key in list(fixed):
+            if key in props:
+                fixed[key], _ = conform(fixed[key], props[key], f"{path}.{key}", repairs, cutoff)
+        return fixed, repairs
+
+    if kind == "array":
+        if isinstance(obj, str):
+            repairs.append(f"{path}: wrapped '{obj}' in a list")
+            obj = [obj]
+        if not isinstance(obj, list):
+            return obj, repairs
+        items = []
+        for i, item in enumerate(obj):
+            if isinstance(item, str) and item.strip() in PLACEHOLDERS:
+                repairs.append(f"{path}[{i}]: dropped placeholder")
+                continue
+            item, _ = conform(item, schema["items"], f"{path}[{i}]", repairs, cutoff)
+            if schema.get("uniqueItems") and item in items:
+                repairs.append(f"{path}[{i}]: dropped duplicate '{item}'")
+                continue
+            items.append(item)
+        return items, repairs
+
+    if kind == "integer":
+        value = obj
+        if isinstance(obj, str) and re.fullmatch(r"\s*-?\d+(\.\d+)?\s*", obj):
+            value = float(obj)
+        if isinstance(value, float):
+            value = int(round(value))
+        if isinstance(value, int) and not isinstance(value, bool):
+            lo, hi = schema.get("minimum", value), schema.get("maximum", value)
+            value = min(max(value, lo), hi)
+            if value != obj:
+                repairs.append(f"{path}: {obj!r} -> {value}")
+            return value, repairs
+        return obj, repairs
+
+    if kind == "string" and isinstance(obj, str) and "enum" in schema and obj not in schema["enum"]:
+        if obj.strip() in PLACEHOLDERS:
+            return obj, repairs  # Nothing to snap to; validation fails and the model is asked again
+        snapped = snap_value(obj, schema["enum"], cutoff)
+        if snapped is not None:
+            repairs.append(f"{path}: '{obj}' -> '{snapped}'")
+            return snapped, repairs
+    return obj, repairs
+
+
+def repair_output(text, schema=OUTPUT_SCHEMA):
+    """
+    JSON text from the model -> (object or None, repairs, errors).
+    'errors' are the schema violations left after repair; the answer is only usable if empty.
+    """
+    obj, repairs = repair_syntax(text)
+    if obj is None:
+        return None, repairs, ["unparseable JSON"]
+    obj, repairs = conform(obj, schema, repairs=repairs)
+    errors = validate(obj, schema)
+    if not errors and isinstance(obj.get("description"), str) and obj["description"].strip() in PLACEHOLDERS:
+        errors.append("$.description: placeholder")
+    return obj, repairs, errors
@@ -0,0 +1,212 @@
+# src/model/retry.py
+# Failure classification, retry policy and circuit breaker for VLM calls.
+#
+# The old loop retried every failure 3x with a fixed 1-2 s sleep. That is wrong in both
+# directions: a JSON parse failure deserves an immediate resample, a truncated answer
+# (hit max_tokens) will just be truncated again, and a server restart turned every frame
+# into 3 quick failures. Now each failure gets a kind, the kind decides whether and how
+# long to back off, and a shared CircuitBreaker parks all callers while the server is down.
+import json
+import random
+import threading
+import time
+
+import openai
+
+# --- FAILURE KINDS ---
+CONNECTION = "connection"  # Server unreachable / connection dropped
+TIMEOUT = "timeout"
+SERVER = "server"          # 5xx or 429: up but overloaded / crashing
+CLIENT = "client"          # Other 4xx: the request itself is bad, retrying won't help
+TRUNCATED = "truncated"    # finish_reason == 'length'
+PARSE = "parse"            # Answer arrived but had no valid JSON
+RUNAWAY = "runaway"        # Streaming stopped a repetition loop / think-budget overrun
+UNKNOWN = "unknown"
+
+# Failures that say nothing about the model, only about the endpoint
+TRANSPORT_KINDS = {CONNECTION, TIMEOUT, SERVER}
+
+
+def classify_exception(e):
+    if isinstance(e, openai.APITimeoutError):  # Subclass of APIConnectionError, check first
+        return TIMEOUT
+    if isinstance(e, openai.APIConnectionError):
+        return CONNECTION
+    if isinstance(e, openai.RateLimitError):
+        return SERVER
+    if isinstance(e, openai.APIStatusError):
+        return SERVER if e.status_code >= 500 else CLIENT
+    if isinstance(e, json.JSONDecodeError):
+        return PARSE
+    return UNKNOWN
+
+
+def classify(result=None, exc=None):
+    """None on success, else one of the failure kinds above."""
+    if exc is not None:
+        return classify_exception(exc)
+    if result is None:
+        return UNKNOWN
+    if result["success"]:
+        return None
+    if result.get("finish_reason") == "length":  # Before error_kind: a cut-off answer also fails to parse
+        return TRUNCATED
+    if result.get("error_kind"):
+        return result["error_kind"]
+    if result.get("raw_response") is not None:
+        return PARSE
+    return UNKNOWN
+
+
+class RetryPolicy:
+    """
+    'limits': max total attempts when the latest failure is of that kind.
+    Transport failures back off exponentially with full jitter, so workers that failed
+    together don't hammer a restarting server together; parse failures resample at once.
+    """
+    DEFAULT_LIMITS = {CONNECTION: 6, TIMEOUT: 4, SERVER: 5, PARSE: 3, TRUNCATED: 1, RUNAWAY: 2, CLIENT: 1, UNKNOWN: 3}
+
+    def __init__(self, limits=None, base_delay=1.0, max_delay=30.0, backoff_kinds=(CONNECTION, TIMEOUT, SERVER, UNKNOWN)):
+        self.limits = dict(self.DEFAULT_LIMITS, **(limits or {}))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.backoff_kinds = set(backoff_kinds)
+
+    def should_retry(self, kind, attempts_used):
+        return attempts_used < self.limits.get(kind, 1)
+
+    def delay(self, kind, attempts_used):
+        if kind not in self.backoff_kinds:
+            return 0.0
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempts_used - 1)))
+
+
+class CircuitBreaker:
+    """
+    closed    -> calls flow; 'threshold' consecutive transport failures trip it
+    open      -> every caller waits in wait() until 'cooldown' has passed
+    half-open -> exactly one caller probes; success closes, failure re-opens with a doubled cooldown
+    """
+    def __init__(self, threshold=3, cooldown=5.0, max_cooldown=120.0, name="VLM"):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.name = name
+        self.state = "closed"
+        self.failures = 0
+        self.open_until = 0.0
+        self.trips = 0
+        self._probing = False
+        self._cond = threading.Condition()
+
+    def wait(self):
+        with self._cond:
+            while True:
+                if self.state == "closed":
+                    return
+                now = time.time()
+                if self.state == "open" and now >= self.open_until:
+                    self.state = "half-open"
+                if self.state == "half-open" and not self._probing:
+                    self._probing = True
+                    return
+                timeout = self.open_until - now if self.state == "open" else None
+                self._cond.wait(timeout=timeout if timeout is None else max(timeout, 0.01))
+
+    def record(self, ok):
+        with self._cond:
+            if ok:
+                if self.state != "closed":
+                    print(f"\n🟢 {self.name} endpoint back, circuit closed")
+                self.state = "closed"
+                self.failures = 0
+                self.cooldown = self.base_cooldown
+            else:
+                self.failures += 1
+                if self.state == "half-open":
+                    self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                    self._trip()
+                elif self.state == "closed" and self.failures >= self.threshold:
+                    self._trip()
+            self._probing = False
+            self._cond.notify_all()
+
+    def _trip(self):
+        self.state = "open"
+        self.open_until = time.time() + self.cooldown
+        self.trips += 1
+        print(f"\n🔴 {self.name} endpoint down ({self.failures} consecutive failures), pausing requests for {self.cooldown:.1f}s")
+
+    def stats(self):
+        return {"state": self.state, "trips": self.trips, "consecutive_failures": self.failures}
+
+
+class RetryLoop:
+    """
+    Bookkeeping of one retried request, shared by src.mining.call_vlm_with_retry and its
+    async twin so both apply the same policy and feed the breaker the same way. The caller
+    only waits, sends and sleeps:
+
+        loop = RetryLoop(client, policy)
+        while True:
+            loop.wait_breaker()              # or: await asyncio.to_thread(...) in async code
+            loop.begin()
+            try: result, exc = client.complete(messages, lookup=loop.attempts_used == 1), None
+            except Exception as e: result, exc = None, e
+            delay = loop.end(result, exc)    # None -> stop, else sleep 'delay' and go again
+    """
+    def __init__(self, client, policy):
+        self.policy = policy
+        self.breaker = getattr(client, "breaker", None)
+        self.result = None
+        self.attempts_used = 0
+        self.start_time = self.end_time = time.time()
+        self.failure_kinds = []
+        self.timings = []  # Spans of every attempt, for src.tracing
+
+    def wait_breaker(self):
+        if self.breaker is None:
+            return
+        t_wait = time.time()
+        self.breaker.wait()
+        self.note_wait(t_wait)
+
+    def note_wait(self, t_wait):
+        if time.time() - t_wait > 0.001:
+            self.timings.append(("breaker_wait", t_wait, time.time()))
+
+    def begin(self):
+        self.attempts_used += 1
+        self.start_time = time.time()
+
+    def end(self, result, exc=None):
+        """Records one attempt. Returns None when done, else the delay before the next attempt."""
+        self.end_time = time.time()
+        if exc is None:
+            self.result = result
+            self.timings.extend(result.get("timings") or [])
+        else:
+            print(f"API Error: {exc}")
+
+        kind = classify(result if exc is None else None, exc)
+        if self.breaker is not None:
+            self.breaker.record(kind not in TRANSPORT_KINDS)
+        if kind is None:
+            return None
+        self.failure_kinds.append(kind)
+
+        if not self.policy.should_retry(kind, self.attempts_used):
+            return None
+        delay = self.policy.delay(kind, self.attempts_used)
+        if delay > 0:
+            self.timings.append(("backoff", self.end_time, self.end_time + delay))
+        return delay
+
+    def outcome(self):
+        """(result, attempts_used, last_attempt_start) with failure_kinds / timings / latency attached."""
+        if self.result is not None:
+            self.result["failure_kinds"] = self.failure_kinds
+            self.result["timings"] = self.timings
+            self.result["last_attempt_latency"] = self.end_time - self.start_time
+        return self.result, self.attempts_used, self.start_time
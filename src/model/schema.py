@@ -0,0 +1,120 @@
+# src/model/schema.py
+# JSON Schema for the scenario JSON, generated from the prompt text itself.
+#
+# SCHEMA_GUIDE lists the allowed values per field and OUTPUT_SKELETON gives the nesting,
+# so both are parsed here instead of maintaining a second copy of the vocabulary.
+# The schema goes to servers that support constrained decoding via
+# response_format={"type": "json_schema", ...} (vLLM, llama.cpp server, LM Studio):
+# the model can then only emit schema-valid JSON and parse failures disappear.
+import json
+import re
+
+from src.model.prompts import SCHEMA_GUIDE, OUTPUT_SKELETON
+
+SCHEMA_NAME = "scenario_dna"
+
+# "- `weather`: ["clear", ...]"  /  "- `traffic_controls`: (Select list): ["green_light", ...]"
+_ENUM_LINE = re.compile(r"-\s*`(\w+)`\s*:[^\[]*\[(.*)\]")
+# "risk_score": 0 // Integer 0-10
+_INT_RANGE = re.compile(r'"(\w+)"\s*:\s*-?\d+\s*,?\s*//\s*Integer\s*(\d+)\s*-\s*(\d+)', re.IGNORECASE)
+
+
+def parse_enums(guide=SCHEMA_GUIDE):
+    """{field: [allowed values]} from the vocabulary text. Parenthesised notes are ignored."""
+    enums = {}
+    for line in guide.splitlines():
+        match = _ENUM_LINE.search(line)
+        if match:
+            enums[match.group(1)] = re.findall(r'"([^"]+)"', match.group(2))
+    return enums
+
+
+def parse_skeleton(skeleton=OUTPUT_SKELETON):
+    """The skeleton as a Python object ("..." placeholders kept) plus {field: (min, max)} for integers."""
+    ranges = {m.group(1): (int(m.group(2)), int(m.group(3))) for m in _INT_RANGE.finditer(skeleton)}
+    body = skeleton[skeleton.find("{"):skeleton.rfind("}") + 1]
+    body = re.sub(r"//[^\n]*", "", body)  # The skeleton carries // comments, JSON doesn't
+    return json.loads(body), ranges
+
+
+def _node(key, value, enums, ranges):
+    if isinstance(value, dict):
+        return {
+            "type": "object",
+            "properties": {k: _node(k, v, enums, ranges) for k, v in value.items()},
+            "required": list(value),
+            "additionalProperties": False,
+        }
+    if isinstance(value, list):
+        items = {"type": "string", "enum": enums[key]} if key in enums else {"type": "string"}
+        return {"type": "array", "items": items, "uniqueItems": True}
+    if isinstance(value, bool):
+        return {"type": "boolean"}
+    if isinstance(value, int):
+        node = {"type": "integer"}
+        if key in ranges:
+            node["minimum"], node["maximum"] = ranges[key]
+        return node
+    if key in enums:
+        return {"type": "string", "enum": enums[key]}
+    return {"type": "string"}
+
+
+def build_schema(guide=SCHEMA_GUIDE, skeleton=OUTPUT_SKELETON):
+    enums = parse_enums(guide)
+    structure, ranges = parse_skeleton(skeleton)
+    return _node(None, structure, enums, ranges)
+
+
+OUTPUT_SCHEMA = build_schema()
+
+
+def response_format(schema=OUTPUT_SCHEMA, name=SCHEMA_NAME):
+    """OpenAI-style structured output request field."""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def validate(obj, schema=OUTPUT_SCHEMA, path="$"):
+    """
+    Errors of 'obj' against the schema subset generated above (type, enum, required,
+    additionalProperties, integer range, uniqueItems). Empty list == valid.
+    Keys starting with '_' (e.g. '_reasoning_trace') are ours and always allowed.
+    """
+    errors = []
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(obj, dict):
+            return [f"{path}: expected object"]
+        for key in schema.get("required", []):
+            if key not in obj:
+                errors.append(f"{path}.{key}: missing")
+        for key, value in obj.items():
+            if key in schema["properties"]:
+                errors += validate(value, schema["properties"][key], f"{path}.{key}")
+            elif schema.get("additionalProperties") is False and not key.startswith("_"):
+                errors.append(f"{path}.{key}: unexpected key")
+    elif kind == "array":
+        if not isinstance(obj, list):
+            return [f"{path}: expected array"]
+        for i, item in enumerate(obj):
+            errors += validate(item, schema["items"], f"{path}[{i}]")
+        if schema.get("uniqueItems") and len(set(map(json.dumps, obj))) != len(obj):
+            errors.append(f"{path}: duplicate items")
+    elif kind == "integer":
+        if isinstance(obj, bool) or not isinstance(obj, int):
+            return [f"{path}: expected integer"]
+        if obj < schema.get("minimum", obj) or obj > schema.get("maximum", obj):
+            errors.append(f"{path}: {obj} out of range [{schema.get('minimum')}, {schema.get('maximum')}]")
+    elif kind == "string":
+        if not isinstance(obj, str):
+            return [f"{path}: expected string"]
+        if "enum" in schema and obj not in schema["enum"]:
+            errors.append(f"{path}: '{obj}' not in vocabulary")
+    elif kind == "boolean" and not isinstance(obj, bool):
+        errors.append(f"{path}: expected boolean")
+    return errors
+
+
+if __name__ == "__main__":
+    # python -m src.model.schema  -> prints the generated schema (e.g. for a llama.cpp --json-schema file)
+    print(json.dumps(OUTPUT_SCHEMA, indent=2))
@@ -0,0 +1,170 @@
+# src/model/streaming.py
+# Watches a streamed VLM answer and says when to hang up.
+#
+# With a blocking call, a model stuck in a <think> loop burns all 16k tokens before we
+# see a single character. Streaming lets us stop the request:
+#   - json_complete: the first complete top-level JSON object after the think block parsed
+#   - repetition:    the tail of the output is the same snippet over and over
+#   - think_budget:  the reasoning went past N chunks (~ tokens) without an answer
+# Closing the stream drops the HTTP connection, which llama.cpp / vLLM / LM Studio
+# treat as a cancel, so the GPU is freed immediately.
+import json
+
+THINK_START_TAGS = ["◁think▷", "<think>"]
+THINK_END_TAGS = ["◁/think▷", "</think>"]
+
+# Stop reasons (result["stop_reason"])
+JSON_COMPLETE = "json_complete"
+REPETITION = "repetition"
+THINK_BUDGET = "think_budget"
+EARLY_STOPS = {JSON_COMPLETE, REPETITION, THINK_BUDGET}
+
+
+class JSONObjectScanner:
+    """
+    Incremental brace matcher over the answer text (strings and escapes aware).
+    Everything inside a think block is ignored, so braces in the reasoning never count.
+    """
+    def __init__(self):
+        self.text = ""
+        self.think = None  # None: no tag seen, "open", "closed"
+        self._think_from = 0
+        self._reset(0)
+        self.found = None
+
+    def _reset(self, pos):
+        self.pos = pos
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.obj_start = -1
+
+    def _find_tag(self, tags, start):
+        hits = [(self.text.find(t, start), t) for t in tags]
+        hits = [(i, t) for i, t in hits if i != -1]
+        return min(hits) if hits else (-1, None)
+
+    def _update_think(self, new_from):
+        # Re-search a little before the new text so tags split across chunks are still found
+        start = max(self._think_from, new_from - 16)
+        if self.think is None:
+            idx, tag = self._find_tag(THINK_START_TAGS, start)
+            if idx != -1 and (self.obj_start == -1 or idx < self.obj_start):
+                self.think = "open"
+                self._think_from = idx + len(tag)
+                self._reset(len(self.text))
+        if self.think == "open":
+            idx, tag = self._find_tag(THINK_END_TAGS, max(self._think_from, start))
+            if idx != -1:
+                self.think = "closed"
+                self._reset(idx + len(tag))
+            else:
+                self.pos = len(self.text)  # Still thinking: nothing to scan
+
+    @property
+    def thinking(self):
+        return self.think == "open"
+
+    def feed(self, chunk):
+        """Returns the first complete, parseable top-level JSON string, or None."""
+        if self.found is not None:
+            return self.found
+        new_from = len(self.text)
+        self.text += chunk
+        self._update_think(new_from)
+
+        text = self.text
+        i = self.pos
+        while i < len(text):
+            ch = text[i]
+            if self.in_string:
+                if self.escape: self.escape = False
+                elif ch == "\\": self.escape = True
+                elif ch == '"': self.in_string = False
+            elif ch == '"' and self.depth > 0:
+                self.in_string = True
+            elif ch == "{":
+                if self.depth == 0: self.obj_start = i
+                self.depth += 1
+            elif ch == "}" and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    candidate = text[self.obj_start:i + 1]
+                    try:
+                        json.loads(candidate)
+                        self.found = candidate
+                        self.pos = i + 1
+                        return candidate
+                    except ValueError:
+                        self.obj_start = -1
+            i += 1
+        self.pos = i
+        return None
+
+
+class RepetitionDetector:
+    """
+    True once the last 'min_span'+ characters are one snippet (period <= max_period)
+    repeated at least 'min_repeats' times. Checked every 'check_every' new characters.
+    """
+    def __init__(self, min_span=800, min_repeats=4, max_period=300, check_every=200, keep=4000):
+        self.min_span = min_span
+        self.min_repeats = min_repeats
+        self.max_period = max_period
+        self.check_every = check_every
+        self.keep = keep
+        self.tail = ""
+        self._since_check = 0
+
+    def feed(self, chunk):
+        self.tail = (self.tail + chunk)[-self.keep:]
+        self._since_check += len(chunk)
+        if self._since_check < self.check_every:
+            return False
+        self._since_check = 0
+        tail = self.tail
+        for period in range(1, self.max_period + 1):
+            reps = max(self.min_repeats, -(-self.min_span // period))
+            span = period * reps
+            if span > len(tail):
+                break
+            unit = tail[-period:]
+            if tail[-span:] == unit * reps:
+                return True
+        return False
+
+
+class StreamMonitor:
+    """Feed reasoning / content deltas; returns a stop reason as soon as one applies."""
+    def __init__(self, think_budget=None, detect_repetition=True):
+        self.think_budget = think_budget  # In chunks (~ tokens); None = unlimited
+        self.scanner = JSONObjectScanner()
+        self.repetition = RepetitionDetector() if detect_repetition else None
+        self.reasoning = ""
+        self.content = ""
+        self.chunks = 0
+        self.think_chunks = 0
+        self.stop_reason = None
+
+    def _check(self, chunk, thinking):
+        self.chunks += 1
+        if thinking:
+            self.think_chunks += 1
+            if self.think_budget is not None and self.think_chunks > self.think_budget:
+                return THINK_BUDGET
+        if self.repetition is not None and self.repetition.feed(chunk):
+            return REPETITION
+        return None
+
+    def feed_reasoning(self, chunk):
+        self.reasoning += chunk
+        self.stop_reason = self._check(chunk, thinking=True)
+        return self.stop_reason
+
+    def feed_content(self, chunk):
+        self.content += chunk
+        if self.scanner.feed(chunk) is not None:
+            self.stop_reason = JSON_COMPLETE
+            return self.stop_reason
+        self.stop_reason = self._check(chunk, thinking=self.scanner.thinking)
+        return self.stop_reason
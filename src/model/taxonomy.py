@@ -0,0 +1,71 @@
+# src/model/taxonomy.py
+# The YOLOE open-vocabulary class list, versioned.
+#
+# Bump TAXONOMY_VERSION whenever CLASSES changes: it is part of the detector tag stored next
+# to detections, so inventories from different class lists can be told apart. The cached
+# text-prompt embeddings (src.model.detector) are keyed by a hash of the list itself, so a
+# stale cache can't be picked up even if the bump is forgotten.
+import hashlib
+import json
+
+TAXONOMY_VERSION = "wod-e2e-v1"
+
+# ObjectDetector defaults, here so the tag of a detector is known without loading YOLOE
+DEFAULT_WEIGHTS = "yoloe-11l-seg.pt"
+DEFAULT_CONF = 0.40
+
+# DEFINING THE LONG-TAIL TAXONOMY (WOD-E2E Optimized)
+# We include synonyms to boost recall for specific edge cases.
+CLASSES = [
+    # 1. VRUs (Vulnerable Road Users)
+    "person", "pedestrian", "child",
+    "cyclist", "bicyclist", "motorcyclist", "scooter rider",
+    "construction worker", "worker in safety vest", "police officer",
+
+    # 2. Vehicles (Specialized)
+    "car", "pickup truck", "suv", "van", "sedan", "coupe",
+    "truck", "semi truck", "trailer", "cement mixer",
+    "bus", "school bus",
+    "police car", "police vehicle", "ambulance", "fire truck",
+    "construction vehicle", "bulldozer", "excavator", "forklift",
+    "road sweeper", "street cleaner",
+
+    # 3. Construction & Barriers
+    "traffic cone", "orange cone",  "traffic drum",
+    "construction barrel", "orange drum", # Crucial for Highway Construction
+    "traffic barrier", "concrete barrier", "jersey barrier",
+    "road work sign", "temporary sign",
+    "construction fence", "safety fence",
+    "scaffolding", "construction scaffolding",
+
+    # 4. Hazards / Debris (FOD)
+    "debris", "cardboard box", "tire",
+    "plastic bag", "tree branch", "large rock",
+    "puddle",
+
+    # 5. Traffic Control
+    "traffic light", "traffic signal", "red light",
+    "stop sign", "yield sign", "speed limit sign",
+    "pedestrian crossing sign", "school zone sign",
+    "crosswalk",
+]
+
+
+def classes_hash(classes=CLASSES):
+    """Short content hash of a class list (order matters: it defines the class ids)."""
+    return hashlib.sha1(json.dumps(list(classes)).encode()).hexdigest()[:16]
+
+
+def detector_tag(model_size=DEFAULT_WEIGHTS, conf_threshold=DEFAULT_CONF, taxonomy=TAXONOMY_VERSION, backend="pytorch", int8=False):
+    """'yoloe-11l-seg.pt@0.4/wod-e2e-v1[/openvino-int8]': stored next to detections (src.data.detection_store)."""
+    tag = f"{model_size}@{conf_threshold}/{taxonomy}"
+    if backend != "pytorch":
+        tag += f"/{backend}{'-int8' if int8 else ''}"
+    return tag
+
+
+if __name__ == "__main__":
+    # python -m src.model.taxonomy
+    print(f"{TAXONOMY_VERSION} ({len(CLASSES)} classes, hash {classes_hash()})")
+    print("\n".join(CLASSES))
+
@@ -0,0 +1,89 @@
+# python -m pytest src/model/test_json_repair.py
+import json
+
+from src.model.json_repair import repair_syntax, snap_value, repair_output
+from src.model.schema import parse_skeleton, validate, OUTPUT_SCHEMA
+from src.model.vlm_client import VLMClient
+
+
+def valid_answer():
+    """The prompt skeleton with every placeholder replaced by an allowed value."""
+    def fill(node, schema):
+        if schema["type"] == "object":
+            return {k: fill(node[k], schema["properties"][k]) for k in schema["properties"]}
+        if schema["type"] == "array":
+            return [schema["items"]["enum"][0]] if "enum" in schema["items"] else []
+        if schema["type"] == "integer":
+            return schema.get("minimum", 0)
+        if schema["type"] == "boolean":
+            return False
+        return schema["enum"][0] if "enum" in schema else "A clear road."
+    skeleton, _ = parse_skeleton()
+    return fill(skeleton, OUTPUT_SCHEMA)
+
+
+def completion(content):
+    return {"choices": [{"message": {"content": content}, "finish_reason": "stop"}], "usage": None}
+
+
+def test_valid_json_untouched():
+    answer = valid_answer()
+    assert validate(answer) == []
+    obj, repairs, errors = repair_output(json.dumps(answer))
+    assert obj == answer and repairs == [] and errors == []
+
+
+def test_syntax_repairs():
+    obj, repairs = repair_syntax('{"a": True, // note\n "b": [1, 2,],} trailing words')
+    assert obj == {"a": True, "b": [1, 2]}
+    assert repairs == ["comments", "python_literal", "trailing_comma", "trailing_text"]
+
+
+def test_truncated_tail_is_closed_or_cut():
+    obj, repairs = repair_syntax('{"a": {"b": "text", "c": [1, 2')
+    assert obj == {"a": {"b": "text", "c": [1, 2]}} and "closed_truncated" in repairs
+    obj, repairs = repair_syntax('{"a": 1, "b": tr')
+    assert obj == {"a": 1} and "cut_truncated_member" in repairs
+    assert repair_syntax("no json here") == (None, [])
+
+
+def test_snap_value():
+    allowed = ["clear", "heavy_rain", "jaywalking_hesitant"]
+    assert snap_value("Heavy Rain", allowed) == "heavy_rain"
+    assert snap_value("jaywalking_hesitent", allowed) == "jaywalking_hesitant"
+    assert snap_value("volcano", allowed) is None
+
+
+def test_schema_near_misses_are_snapped():
+    answer = valid_answer()
+    enum_field = next(k for k, v in OUTPUT_SCHEMA["properties"].items() if v["type"] == "object")
+    key, node = next((k, v) for k, v in OUTPUT_SCHEMA["properties"][enum_field]["properties"].items() if "enum" in v)
+    target = node["enum"][-1]
+    answer[enum_field][key] = target.replace("_", " ").title()
+    answer["unexpected"] = 1
+    obj, repairs, errors = repair_output(json.dumps(answer))
+    assert errors == []
+    assert obj[enum_field][key] == target and "unexpected" not in obj
+    assert len(repairs) == 2
+
+
+def test_leftover_violation_is_reported():
+    answer = valid_answer()
+    del answer[next(iter(OUTPUT_SCHEMA["required"]))]
+    obj, _, errors = repair_output(json.dumps(answer))
+    assert obj is not None and len(errors) == 1 and errors[0].endswith("missing")
+
+
+def test_client_records_violations_unless_strict():
+    answer = valid_answer()
+    del answer[next(iter(OUTPUT_SCHEMA["required"]))]
+    body = completion(json.dumps(answer))
+
+    lenient = VLMClient().parse_completion(body)
+    assert lenient["success"] and len(lenient["schema_errors"]) == 1
+
+    strict = VLMClient(strict_schema=True).parse_completion(body)
+    assert not strict["success"] and strict["error"].startswith("Invalid JSON after repair")
+
+    unparseable = VLMClient().parse_completion(completion("I cannot answer that."))
+    assert not unparseable["success"]
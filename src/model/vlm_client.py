@@ -1,31 +1,132 @@
 # src/model/vlm_client.py
 import base64
+import hashlib
 import json
 import os
 import re
-import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+import httpx
+import openai
 from openai import OpenAI
 from src.config import CAM_ORDER
+from src.data.images import source_sha1
+from src.model.retry import CircuitBreaker, classify_exception, RUNAWAY
+from src.model.streaming import StreamMonitor, REPETITION, THINK_BUDGET, THINK_END_TAGS
+from src.model.schema import response_format
+from src.model.json_repair import repair_output
 import time
 
 # Configuration for Local Inference
 # Ensure LM Studio is running specifically on this port
 # LM_STUDIO_URL = "http://192.168.1.67:1234/v1"
 API_KEY = "lm-studio" # Placeholder, not used locally usually
+JPEG_QUALITY = 95
+MAX_SEND_SIZE = 1600
+ENCODE_THREADS = 3  # One per camera
+IMAGE_PLACEHOLDER = "<BASE64_IMAGE_DATA_REMOVED>"
+REQUEST_TIMEOUT = 600.0  # Seconds per request (connect: 10 s)
+# classic:      [inventory + intro] [images] [instruction]
+# static_first: [intro + instruction] [images] [inventory]  -> fixed text sits in the shared prefix
+PROMPT_LAYOUTS = ("classic", "static_first")
 
 class VLMClient:
-    def __init__(self, model_id="qwen3-vl-30b", port=1234):
-        # Allow dynamic port assignment
-        base_url = f"http://localhost:{port}/v1"
-        self.client = OpenAI(base_url=base_url, api_key="lm-studio")
+    def __init__(self, model_id="qwen3-vl-30b", port=1234, base_url=None, payload_cache=None, passthrough=False,
+                 response_cache=None, cache_bypass=False, stream=False, think_budget=None, constrained=False,
+                 repair=True, strict_schema=False, encode_threads=ENCODE_THREADS, debug=False, prompt_layout="classic",
+                 api_key=API_KEY, temperature=0.1, timeout=REQUEST_TIMEOUT):
+        # Allow dynamic port assignment (or a full URL for remote hosts)
+        if base_url is None:
+            base_url = f"http://localhost:{port}/v1"
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = httpx.Timeout(timeout, connect=10.0)
+        # max_retries=0: the SDK would otherwise retry 5xx/429/connection errors itself, hidden from
+        # the retry policy, the circuit breaker and the pool's limiter (src.model.retry, src.mining)
+        self.client = OpenAI(base_url=base_url, api_key=api_key, max_retries=0, timeout=self.timeout)
         self.model_id = model_id
-        print(f"✅ VLM Client connected to Port {port}")
+        self.temperature = temperature
+        # Optional DiskLRUCache of ready-to-send base64 payloads (see _payload_key)
+        self.payload_cache = payload_cache
+        # Send untouched source JPEGs as-is instead of decoding + re-encoding them
+        self.passthrough = passthrough
+        # Optional DiskLRUCache of successful completions (see response_key).
+        # cache_bypass skips lookups but still stores fresh answers.
+        self.response_cache = response_cache
+        self.cache_bypass = cache_bypass
+        # Streaming: hang up once the JSON is complete, on repetition loops or past think_budget chunks
+        self.stream = stream
+        self.think_budget = think_budget
+        # Schema-constrained decoding (src.model.schema). Switched off for good if the server rejects it.
+        self.constrained = constrained
+        self.schema_supported = True
+        # Fix near-valid JSON locally (src.model.json_repair). Violations left after the repair are
+        # recorded as 'schema_errors'; strict_schema rejects such answers instead (PARSE -> retried).
+        self.repair = repair
+        self.strict_schema = strict_schema
+        # Cameras of a frame are JPEG-encoded concurrently (Pillow releases the GIL while compressing)
+        self.encode_threads = encode_threads
+        self._encode_pool = None
+        self._pool_lock = threading.Lock()
+        # Raw-text / reasoning dumps, off by default (they print whole responses)
+        self.debug = debug
+        # Order of the user message parts (see PROMPT_LAYOUTS). Changing it changes response cache keys.
+        if prompt_layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"prompt_layout must be one of {PROMPT_LAYOUTS}, got '{prompt_layout}'")
+        self.prompt_layout = prompt_layout
+        # Shared by every thread using this client (see call_vlm_with_retry)
+        self.breaker = CircuitBreaker(name=base_url)
+        print(f"✅ VLM Client connected to {base_url}")
+
+    def _payload_key(self, pil_image):
+        """
+        Content-addressed cache key: (source file hash, decoded size, max sent size, codec, quality).
+        Only images loaded through src.data.images carry a source hash; others are not cached.
+        """
+        source = source_sha1(pil_image)
+        if source is None:
+            return None
+        w, h = pil_image.size
+        return f"{source}:{w}x{h}:max{MAX_SEND_SIZE}:jpeg:q{JPEG_QUALITY}"
+
+    def _source_jpeg(self, pil_image):
+        """
+        Original file bytes if pil_image is an unresized decode of a JPEG that is
+        small enough to send as-is, else None.
+        """
+        info = pil_image.info
+        if info.get("source_format") != "JPEG" or info.get("source_path") is None:
+            return None
+        if tuple(info.get("source_size") or ()) != pil_image.size or max(pil_image.size) > MAX_SEND_SIZE:
+            return None
+        with open(info["source_path"], 'rb') as f:
+            return f.read()
 
     def _encode_image(self, pil_image):
         """
         Converts a PIL Image to a base64 string for the API.
         """
+        if self.passthrough:
+            data = self._source_jpeg(pil_image)
+            if data is not None:
+                return base64.b64encode(data).decode('utf-8'), pil_image.size
+
+        key = self._payload_key(pil_image) if self.payload_cache is not None else None
+        if key is not None:
+            cached = self.payload_cache.get(key)
+            if cached is not None:
+                # Stored as "WxH;<base64>"
+                size_str, b64 = cached.decode('ascii').split(";", 1)
+                w, h = size_str.split("x")
+                return b64, (int(w), int(h))
+
+        b64, size = self._encode_pixels(pil_image)
+        if key is not None:
+            self.payload_cache.put(key, f"{size[0]}x{size[1]};{b64}".encode('ascii'))
+        return b64, size
+
+    def _encode_pixels(self, pil_image):
         buffered = BytesIO()
         # Convert to RGB to ensure no alpha channel issues
         if pil_image.mode != "RGB":
@@ -33,8 +134,8 @@ class VLMClient:
             
         # Resize if massive to save tokens (optional but recommended for 6 images)
         # Keeping max dimension around 1000px is usually a good balance
-        if max(pil_image.size) > 1600:
-            pil_image.thumbnail((1600, 1600))
+        if max(pil_image.size) > MAX_SEND_SIZE:
+            pil_image.thumbnail((MAX_SEND_SIZE, MAX_SEND_SIZE))
             
         # DEBUG: Print exact size being sent
         # print(f"🔍 DEBUG: Encoding Image Size: {pil_image.size} (WxH)") 
@@ -44,21 +145,31 @@ class VLMClient:
         # save_path = os.path.join("debug_images", filename)
         # pil_image.save(save_path, quality=95)
             
-        pil_image.save(buffered, format="JPEG", quality=95)
+        pil_image.save(buffered, format="JPEG", quality=JPEG_QUALITY)
         return base64.b64encode(buffered.getvalue()).decode('utf-8'), pil_image.size
 
+    def _encode_all(self, images):
+        """[(base64, size)] for several images, in order."""
+        if self.encode_threads <= 1 or len(images) <= 1:
+            return [self._encode_image(img) for img in images]
+        with self._pool_lock:
+            if self._encode_pool is None:
+                self._encode_pool = ThreadPoolExecutor(max_workers=self.encode_threads, thread_name_prefix="vlm-encode")
+        return list(self._encode_pool.map(self._encode_image, images))
+
     def _sanitize_for_logging(self, messages):
         """
-        Creates a copy of the messages but replaces massive Base64 strings 
-        with <IMAGE_DATA> placeholders so logs are readable.
+        Log view of the messages with the Base64 images replaced by placeholders.
+        Built from references instead of a deepcopy: text parts are shared with 'messages'
+        and the multi-MB image strings are never copied. Treat it as read-only.
         """
-        clean_msgs = copy.deepcopy(messages)
-        for msg in clean_msgs:
-            if isinstance(msg.get('content'), list):
-                for item in msg['content']:
-                    if item.get('type') == 'image_url':
-                        item['image_url']['url'] = "<BASE64_IMAGE_DATA_REMOVED>"
-        return clean_msgs
+        return [
+            {**msg, "content": [
+                {"type": "image_url", "image_url": {"url": IMAGE_PLACEHOLDER}} if item.get('type') == 'image_url' else item
+                for item in msg['content']
+            ]} if isinstance(msg.get('content'), list) else msg
+            for msg in messages
+        ]
 
     def _extract_json(self, raw_text):
         """Aggressively hunts for a JSON block using Regex."""
@@ -84,7 +195,7 @@ class VLMClient:
         """
         start_tag = "◁think▷"
         
-        if start_tag not in raw_text:
+        if not self.debug or start_tag not in raw_text:
             return
 
         start_idx = raw_text.find(start_tag) + len(start_tag)
@@ -120,8 +231,9 @@ class VLMClient:
         Fallback: Returns the entire raw text if no tags are found.
         """
         
-        print("🔍 Extracting reasoning trace from response...")
-        print(f" Raw text: {raw_text}")
+        if self.debug:
+            print("🔍 Extracting reasoning trace from response...")
+            print(f" Raw text: {raw_text}")
         # Supports both DeepSeek/Kimi style tags
         start_patterns = ["◁think▷", "<think>"]
         end_patterns = ["◁/think▷", "</think>"]
@@ -156,81 +268,352 @@ class VLMClient:
 
         return raw_text[start_idx:end_idx].strip()
     
-    def analyze_multiview(self, camera_images, system_prompt, object_inventory=None, verbose=False):
+    def build_messages(self, camera_images, system_prompt, object_inventory=None, verbose=False):
+        """
+        Encodes the camera images and assembles the chat messages.
+        Split out from analyze_multiview so the pipeline can encode on a CPU stage
+        and hand the ready payload to the VLM stage.
+        """
         # 1. Construct Prompt
         intro = "Here are the synchronized Front-View cameras."
-        if object_inventory:
-            intro = f"### DETECTED OBJECTS (YOLO) ###\n{object_inventory}\n\n{intro}"
-
-        user_content = [{"type": "text", "text": intro}]
+        instruction = "\nThink deeply inside <think> tags, then output valid JSON."
+        static_first = self.prompt_layout == "static_first"
+        if static_first:
+            # Everything fixed goes right after the system prompt, so a server-side prefix (KV) cache
+            # reuses it on every frame; the per-frame images and inventory come last
+            user_content = [{"type": "text", "text": intro + instruction}]
+        else:
+            if object_inventory:
+                intro = f"### DETECTED OBJECTS (YOLO) ###\n{object_inventory}\n\n{intro}"
+            user_content = [{"type": "text", "text": intro}]
         img_sizes = [] # Track sizes for debug log
 
         # 2. Add Images (Using Config Order)
-        for cam_name in CAM_ORDER:
-            if cam_name in camera_images:
-                base64_img, size = self._encode_image(camera_images[cam_name])
-                img_sizes.append(f"{cam_name}: {size}")
-                user_content.append({"type": "text", "text": f"\n### VIEW: {cam_name} ###\n"})
-                user_content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_img}"}})
-
-        user_content.append({"type": "text", "text": "\nThink deeply inside <think> tags, then output valid JSON."})
+        cams = [cam_name for cam_name in CAM_ORDER if cam_name in camera_images]
+        encoded = self._encode_all([camera_images[cam_name] for cam_name in cams])
+        for cam_name, (base64_img, size) in zip(cams, encoded):
+            img_sizes.append(f"{cam_name}: {size}")
+            user_content.append({"type": "text", "text": f"\n### VIEW: {cam_name} ###\n"})
+            user_content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_img}"}})
+
+        if not static_first:
+            user_content.append({"type": "text", "text": instruction})
+        elif object_inventory:
+            user_content.append({"type": "text", "text": f"\n### DETECTED OBJECTS (YOLO) ###\n{object_inventory}"})
         
         # DEBUG PRINT
         if verbose:
             print(f"🔍 INPUT AUDIT: Sending {len(img_sizes)} images. Dimensions: {img_sizes}")
 
-        messages = [
+        return [
             {"role": "system", "content": system_prompt}, 
             {"role": "user", "content": user_content}
         ]
-                
-        # 2. Prepare Result Object
-        result_pkg = {
+
+    def request_kwargs(self, messages):
+        """Sampling parameters live here so live calls and exported batch requests match."""
+        kwargs = {
+            "model": self.model_id,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": 16384
+        }
+        if self.constrained and self.schema_supported:
+            kwargs["response_format"] = response_format()
+        return kwargs
+
+    def _create(self, messages, **extra):
+        """
+        chat.completions.create. If the server refuses response_format (400/422), the
+        request is sent again without it and later requests stay unconstrained.
+        """
+        kwargs = self.request_kwargs(messages)
+        try:
+            return self.client.chat.completions.create(**kwargs, **extra)
+        except (openai.BadRequestError, openai.UnprocessableEntityError) as e:
+            if "response_format" not in kwargs:
+                raise
+            self.schema_supported = False
+            try:
+                response = self.client.chat.completions.create(**self.request_kwargs(messages), **extra)
+            except Exception:
+                self.schema_supported = True  # Rejected either way: the schema was not the problem
+                raise
+            print(f"\n⚠️ {self.base_url} does not accept response_format ({e}). Falling back to unconstrained decoding.")
+            return response
+
+    def response_key(self, messages):
+        """
+        Fingerprint of everything that determines the answer: model ID, system prompt,
+        inventory text, sampling params and a hash of every image payload.
+        """
+        kwargs = self.request_kwargs(messages)
+        fingerprint = {k: v for k, v in kwargs.items() if k != "messages"}
+        fingerprint["messages"] = [
+            {"role": msg["role"], "content": [
+                {"image_sha1": hashlib.sha1(item["image_url"]["url"].encode('ascii')).hexdigest()}
+                if item.get("type") == "image_url" else item
+                for item in msg["content"]
+            ] if isinstance(msg["content"], list) else msg["content"]}
+            for msg in kwargs["messages"]
+        ]
+        blob = json.dumps(fingerprint, sort_keys=True, ensure_ascii=False)
+        return "resp:" + hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def cached_result(self, messages):
+        """
+        Result package from the response cache, or None on a miss / when caching is off.
+        An entry that no longer parses (e.g. after a repair or schema change) is evicted and
+        counts as a miss, so the request goes to the server instead of failing from the cache.
+        """
+        if self.response_cache is None or self.cache_bypass:
+            return None
+        key = self.response_key(messages)
+        cached = self.response_cache.get(key)
+        if cached is None:
+            return None
+        result_pkg = self._new_result(self._sanitize_for_logging(messages))
+        try:
+            entry = json.loads(cached.decode('utf-8'))
+            self._package(result_pkg, entry["raw"], entry["reasoning"], entry["usage"])
+        except Exception as e:
+            result_pkg["error"] = str(e)
+        if not result_pkg["success"]:
+            self.response_cache.delete(key)
+            return None
+        result_pkg["cache_hit"] = True
+        return result_pkg
+
+    def _store_result(self, messages, raw, reasoning, usage):
+        entry = {"raw": raw, "reasoning": reasoning, "usage": usage}
+        self.response_cache.put(self.response_key(messages), json.dumps(entry).encode('utf-8'))
+
+    def _new_result(self, messages_log):
+        return {
             "success": False,
             "parsed_json": None,
             "raw_response": None,
             "reasoning_trace": None,
-            "input_messages_log": self._sanitize_for_logging(messages), # Clean for saving
+            "input_messages_log": messages_log, # Clean for saving
             "usage": None,  # <--- NEW FIELD
-            "error": None
+            "finish_reason": None,
+            "stop_reason": None,  # Streaming only: why we stopped reading (see src.model.streaming)
+            "error": None,
+            "error_kind": None,  # Set when the call raised (see src.model.retry)
+            "timings": []  # [(span name, start, end)] for src.tracing
         }
+
+    def _package(self, result_pkg, raw, reasoning, usage, json_str=None):
+        """
+        Fills the result with the raw text, trace, usage and parsed JSON. May raise on bad JSON.
+        json_str: already-located JSON (streaming) instead of searching 'raw' for it.
+        """
+        result_pkg["raw_response"] = raw
+        result_pkg["reasoning_trace"] = reasoning
+
+        # --- CAPTURE TOKEN USAGE ---
+        if usage:
+            details = usage.get("prompt_tokens_details") or {}
+            result_pkg["usage"] = {
+                "input_tokens": usage.get("prompt_tokens"),
+                "output_tokens": usage.get("completion_tokens"),
+                "total_tokens": usage.get("total_tokens"),
+                # Prompt tokens served from the server's prefix cache (vLLM / OpenAI-style servers)
+                "cached_tokens": details.get("cached_tokens") if isinstance(details, dict) else None
+            }
+        # ---------------------------
+
+        if json_str is None:
+            json_str = self._extract_json(raw or "")
+        if self.repair:
+            data = self._repaired_json(result_pkg, raw, json_str)
+        elif json_str:
+            data = json.loads(json_str)
+        else:
+            data = None
+            result_pkg["error"] = "No Valid JSON found in response"
+        if data is not None:
+            # Inject trace into JSON for the final index too
+            data['_reasoning_trace'] = reasoning or "None"
+            result_pkg["parsed_json"] = data
+            result_pkg["success"] = True
+        return result_pkg
+
+    def _repaired_json(self, result_pkg, raw, json_str):
+        """
+        Object after local repair (repairs and leftover schema violations recorded in the result),
+        or None with the error set. Only strict_schema turns leftover violations into a failure.
+        """
+        # A truncated answer has no closing brace, so the extracted span may be empty or cut short
+        answer = raw or ""
+        for tag in THINK_END_TAGS:
+            if tag in answer:
+                answer = answer.rsplit(tag, 1)[1]  # Braces in the reasoning are not the answer
+        tail = answer[answer.find("{"):] if "{" in answer else None
+        if not json_str and not tail:
+            result_pkg["error"] = "No Valid JSON found in response"
+            return None
+        data, repairs, errors = repair_output(json_str or tail)
+        if errors and tail and tail != json_str:
+            retry = repair_output(tail)
+            if data is None or not retry[2]:
+                data, repairs, errors = retry
+        result_pkg["repairs"] = repairs
+        if data is None or (errors and self.strict_schema):
+            result_pkg["error"] = f"Invalid JSON after repair: {'; '.join(errors[:5])}"
+            return None
+        result_pkg["schema_errors"] = errors
+        return data
+
+    def complete(self, messages, lookup=True):
+        """Sends pre-built messages to the server and packages the parsed result."""
+        t_lookup = time.time()
+        cached = self.cached_result(messages) if lookup else None
+        if cached is not None:
+            cached["timings"].append(("cache_lookup", t_lookup, time.time()))
+            return cached
+
+        # 1. Prepare Result Object
+        result_pkg = self._new_result(self._sanitize_for_logging(messages))
         
-        # 3. Call API
+        # 2. Call API
+        if self.stream:
+            return self._complete_stream(messages, result_pkg)
+        t_gen = time.time()
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_id,
-                messages=messages,
-                temperature=0.1,
-                max_tokens=16384
-            )
-            raw = response.choices[0].message.content
-            result_pkg["raw_response"] = raw
-
-            # Extract Components
-            reasoning =  response.choices[0].message.model_extra.get('reasoning_content') or None
-            json_str = self._extract_json(raw)
-            
-            result_pkg["reasoning_trace"] = reasoning
-            
-            # --- CAPTURE TOKEN USAGE ---
-            if response.usage:
-                result_pkg["usage"] = {
-                    "input_tokens": response.usage.prompt_tokens,
-                    "output_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens
-                }
-            # ---------------------------
-
-            if json_str:
-                data = json.loads(json_str)
-                # Inject trace into JSON for the final index too
-                data['_reasoning_trace'] = reasoning or "None"
-                result_pkg["parsed_json"] = data
-                result_pkg["success"] = True
-            else:
-                result_pkg["error"] = "No Valid JSON found in response"
+            response = self._create(messages)
+            self._handle_response(messages, response, result_pkg, t_gen)
+        except Exception as e:
+            result_pkg["error"] = str(e)
+            result_pkg["error_kind"] = classify_exception(e)
+
+        result_pkg["constrained"] = self.constrained and self.schema_supported  # After a possible fallback
+        return result_pkg
 
+    def _handle_response(self, messages, response, result_pkg, t_gen):
+        """chat.completion -> result package (shared by the sync and async clients)."""
+        t_parse = time.time()
+        result_pkg["timings"].append(("generation", t_gen, t_parse))
+        message = response.choices[0].message
+        result_pkg["finish_reason"] = response.choices[0].finish_reason
+
+        # Extract Components
+        reasoning = message.model_extra.get('reasoning_content') or None
+        usage = response.usage.model_dump() if response.usage else None
+        try:
+            self._package(result_pkg, message.content, reasoning, usage)
+        finally:
+            result_pkg["timings"].append(("parse", t_parse, time.time()))
+
+        self._note_prefill(result_pkg, (response.model_extra or {}).get("timings"), t_gen)
+
+        # Only answers that parsed are worth replaying; failures should hit the server again
+        if self.response_cache is not None and result_pkg["success"]:
+            self._store_result(messages, message.content, reasoning, usage)
+
+    def _note_prefill(self, result_pkg, server_timings, t_gen, t_first=None):
+        """
+        Prompt-processing measurements: llama.cpp reports 'timings' (prompt_ms, cache_n);
+        with streaming the time to the first token is measured here. Adds 'ttft' and a 'prefill' span.
+        """
+        usage = result_pkg["usage"]
+        if server_timings and usage is not None:
+            if usage.get("cached_tokens") is None and server_timings.get("cache_n") is not None:
+                usage["cached_tokens"] = server_timings["cache_n"]
+            if server_timings.get("prompt_ms") is not None:
+                usage["prompt_ms"] = round(server_timings["prompt_ms"], 1)
+        if t_first is not None:
+            result_pkg["ttft"] = t_first - t_gen
+        elif usage is not None and usage.get("prompt_ms") is not None:
+            result_pkg["ttft"] = usage["prompt_ms"] / 1000.0
+        if result_pkg.get("ttft") is not None:
+            result_pkg["timings"].append(("prefill", t_gen, t_gen + result_pkg["ttft"]))
+
+    def _complete_stream(self, messages, result_pkg):
+        """Streaming variant of complete(): same result package plus stop_reason."""
+        monitor = StreamMonitor(think_budget=self.think_budget)
+        usage = None
+        stream = None
+        t_gen = time.time()
+        try:
+            stream = self._create(messages, stream=True)
+            for chunk in stream:
+                stop, usage = self._feed_chunk(chunk, monitor, result_pkg, usage)
+                if stop is not None:
+                    break
         except Exception as e:
             result_pkg["error"] = str(e)
-            
-        return result_pkg
\ No newline at end of file
+            result_pkg["error_kind"] = classify_exception(e)
+        finally:
+            if stream is not None:
+                stream.close()  # Dropping the connection cancels generation server-side
+            result_pkg["timings"].append(("generation", t_gen, time.time()))
+        return self._finish_stream(messages, result_pkg, monitor, usage, t_gen)
+
+    def _feed_chunk(self, chunk, monitor, result_pkg, usage):
+        """One streamed chunk into the monitor. Returns (stop reason or None, usage so far)."""
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage.model_dump()  # Only if the server sends it before we hang up
+        if (chunk.model_extra or {}).get("timings"):
+            result_pkg["server_timings"] = chunk.model_extra["timings"]  # llama.cpp, last chunk
+        if not chunk.choices:
+            return None, usage
+        choice = chunk.choices[0]
+        delta = choice.delta
+        extra = delta.model_extra or {}
+        reasoning_delta = extra.get('reasoning_content') or extra.get('reasoning')
+        if (reasoning_delta or delta.content) and "t_first_token" not in result_pkg:
+            result_pkg["t_first_token"] = time.time()
+        stop = None
+        if reasoning_delta:
+            stop = monitor.feed_reasoning(reasoning_delta)
+        if delta.content and stop is None:
+            stop = monitor.feed_content(delta.content)
+        if choice.finish_reason:
+            result_pkg["finish_reason"] = choice.finish_reason
+        return stop, usage
+
+    def _finish_stream(self, messages, result_pkg, monitor, usage, t_gen):
+        server_timings = result_pkg.pop("server_timings", None)
+        t_first = result_pkg.pop("t_first_token", None)
+        result_pkg["constrained"] = self.constrained and self.schema_supported
+        result_pkg["stop_reason"] = monitor.stop_reason or result_pkg["finish_reason"]
+        if usage is None and monitor.chunks:
+            # Stopped early: the server never sent usage. One chunk is ~one token.
+            usage = {"prompt_tokens": None, "completion_tokens": monitor.chunks, "total_tokens": None}
+            result_pkg["usage_estimated"] = True
+        if result_pkg["error_kind"] is not None:
+            return result_pkg
+
+        t_parse = time.time()
+        try:
+            self._package(result_pkg, monitor.content, monitor.reasoning or None, usage, json_str=monitor.scanner.found)
+            self._note_prefill(result_pkg, server_timings, t_gen, t_first)
+            if self.response_cache is not None and result_pkg["success"]:
+                self._store_result(messages, monitor.content, monitor.reasoning or None, usage)
+        except Exception as e:
+            result_pkg["error"] = str(e)
+            result_pkg["error_kind"] = classify_exception(e)
+        result_pkg["timings"].append(("parse", t_parse, time.time()))
+        if not result_pkg["success"] and monitor.stop_reason in (REPETITION, THINK_BUDGET):
+            result_pkg["error"] = f"Stopped early: {monitor.stop_reason}"
+            result_pkg["error_kind"] = RUNAWAY
+        return result_pkg
+
+    def parse_completion(self, body, messages_log=None):
+        """
+        Same result package as complete(), built from a chat.completion JSON body
+        (e.g. a line of an offline batch output file) instead of a live call.
+        """
+        result_pkg = self._new_result(messages_log)
+        try:
+            message = body["choices"][0]["message"]
+            result_pkg["finish_reason"] = body["choices"][0].get("finish_reason")
+            self._package(result_pkg, message.get("content"), message.get("reasoning_content") or None, body.get("usage"))
+        except Exception as e:
+            result_pkg["error"] = str(e)
+        return result_pkg
+
+    def analyze_multiview(self, camera_images, system_prompt, object_inventory=None, verbose=False):
+        messages = self.build_messages(camera_images, system_prompt, object_inventory=object_inventory, verbose=verbose)
+        return self.complete(messages)
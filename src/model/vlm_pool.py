@@ -0,0 +1,191 @@
+# src/model/vlm_pool.py
+# Keeps N requests in flight across one or more OpenAI-compatible endpoints.
+# LM Studio / llama.cpp / vLLM batch concurrent requests internally, so a single
+# serial client leaves most of the server throughput on the table.
+import threading
+import time
+from src.model.vlm_client import VLMClient
+from src.model.retry import CircuitBreaker, classify, TRANSPORT_KINDS
+
+
+def parse_endpoint(spec):
+    """'1234' -> localhost:1234, 'gpu2:1234' -> http://gpu2:1234/v1, full URLs pass through."""
+    spec = str(spec)
+    if spec.startswith("http://") or spec.startswith("https://"):
+        return spec.rstrip("/")
+    if ":" not in spec:
+        spec = f"localhost:{spec}"
+    return f"http://{spec}/v1"
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit.
+    Every 'window' completions we look at generated tokens/sec and the transport error rate:
+      - errors above 'max_error_rate'  -> multiplicative decrease (limit * backoff)
+      - throughput dropped              -> back off by one
+      - otherwise, if we were saturated -> additive increase (+1)
+    """
+    def __init__(self, initial=2, min_limit=1, max_limit=16, window=8,
+                 backoff=0.5, max_error_rate=0.2, tolerance=0.05, adaptive=True):
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.window = window
+        self.backoff = backoff
+        self.max_error_rate = max_error_rate
+        self.tolerance = tolerance
+        self.adaptive = adaptive
+
+        self.inflight = 0
+        self._cond = threading.Condition()
+        self._reset_window()
+        self._last_tps = None
+
+    def _reset_window(self):
+        self._w_start = time.time()
+        self._w_done = 0
+        self._w_errors = 0
+        self._w_tokens = 0
+        self._w_saturated = False
+
+    def acquire(self):
+        with self._cond:
+            while self.inflight >= self.limit:
+                self._cond.wait()
+            self.inflight += 1
+            if self.inflight >= self.limit:
+                self._w_saturated = True
+
+    def release(self, ok=True, output_tokens=0):
+        with self._cond:
+            self.inflight -= 1
+            self._w_done += 1
+            self._w_tokens += output_tokens or 0
+            if not ok: self._w_errors += 1
+
+            if self.adaptive and self._w_done >= self.window:
+                self._adapt()
+            self._cond.notify_all()
+
+    def _adapt(self):
+        elapsed = max(time.time() - self._w_start, 1e-6)
+        tps = self._w_tokens / elapsed
+        error_rate = self._w_errors / self._w_done
+        old = self.limit
+
+        if error_rate > self.max_error_rate:
+            self.limit = max(self.min_limit, int(self.limit * self.backoff))
+        elif self._last_tps is not None and tps < self._last_tps * (1 - self.tolerance):
+            self.limit = max(self.min_limit, self.limit - 1)
+        elif self._w_saturated:
+            self.limit = min(self.max_limit, self.limit + 1)
+
+        if self.limit != old:
+            print(f"\n🎚️ Concurrency {old} -> {self.limit} (tps={tps:.1f}, errors={error_rate:.0%})")
+        self._last_tps = tps
+        self._reset_window()
+
+
+class Endpoint:
+    def __init__(self, base_url, model_id, ewma_alpha=0.2, **client_kwargs):
+        self.base_url = base_url
+        self.client = VLMClient(model_id=model_id, base_url=base_url, **client_kwargs)
+        self.inflight = 0
+        self.ewma_latency = None  # Seconds per request, None until first response
+        self.ewma_alpha = ewma_alpha
+        self.down_until = 0.0
+        self.completed = 0
+        self.errors = 0
+
+    def score(self):
+        # Expected wait if we queue one more request here. Untried endpoints go first.
+        latency = self.ewma_latency if self.ewma_latency is not None else 0.0
+        return (self.inflight + 1) * latency
+
+    def observe(self, duration, ok):
+        if ok:
+            self.completed += 1
+            if self.ewma_latency is None:
+                self.ewma_latency = duration
+            else:
+                self.ewma_latency = self.ewma_alpha * duration + (1 - self.ewma_alpha) * self.ewma_latency
+        else:
+            self.errors += 1
+
+
+class VLMPool:
+    """
+    Drop-in for VLMClient (build_messages / complete / analyze_multiview) that
+    spreads requests over several endpoints and caps in-flight requests with an
+    AdaptiveLimiter. Callers provide the concurrency (e.g. pipeline VLM workers);
+    the limiter decides how many of them may hit the servers at once.
+    """
+    def __init__(self, model_id, endpoints, concurrency=4, max_concurrency=32,
+                 adaptive=True, down_cooldown=5.0, **client_kwargs):
+        self.model_id = model_id
+        # client_kwargs (e.g. payload_cache) are forwarded to every endpoint's VLMClient
+        self.endpoints = [Endpoint(parse_endpoint(e), model_id, **client_kwargs) for e in endpoints]
+        self.limiter = AdaptiveLimiter(initial=concurrency, max_limit=max_concurrency, adaptive=adaptive)
+        self.max_concurrency = max_concurrency
+        self.down_cooldown = down_cooldown
+        self._lock = threading.Lock()
+        # Trips only when the pool as a whole keeps failing (single dead endpoints are routed around)
+        self.breaker = CircuitBreaker(threshold=max(3, len(self.endpoints) * 2), name=f"pool {model_id}")
+        print(f"✅ VLM Pool: {len(self.endpoints)} endpoint(s), concurrency {concurrency} (max {max_concurrency}, adaptive={adaptive})")
+
+    def _pick(self):
+        with self._lock:
+            now = time.time()
+            live = [ep for ep in self.endpoints if ep.down_until <= now] or self.endpoints
+            ep = min(live, key=lambda e: e.score())
+            ep.inflight += 1
+            return ep
+
+    def build_messages(self, camera_images, system_prompt, object_inventory=None, verbose=False):
+        # Payload is endpoint-independent; any client can encode it
+        return self.endpoints[0].client.build_messages(camera_images, system_prompt, object_inventory=object_inventory, verbose=verbose)
+
+    def complete(self, messages, lookup=True):
+        # Cache hits never touch a server, so they must not count towards the limiter's tps
+        cached = self.endpoints[0].client.cached_result(messages) if lookup else None
+        if cached is not None:
+            return cached
+
+        t_queue = time.time()
+        self.limiter.acquire()
+        ep = self._pick()
+        t0 = time.time()
+        result = None
+        try:
+            result = ep.client.complete(messages, lookup=False)  # Already looked up above
+            result["timings"].insert(0, ("request_queue", t_queue, t0))
+            return result
+        finally:
+            duration = time.time() - t0
+            # Connection errors, timeouts and 5xx/429 mean congestion or a dead server.
+            # A JSON parse failure or truncation is the model's fault, not congestion.
+            transport_ok = result is not None and classify(result) not in TRANSPORT_KINDS
+            output_tokens = (result.get("usage") or {}).get("output_tokens", 0) if result else 0
+            with self._lock:
+                ep.inflight -= 1
+                ep.observe(duration, transport_ok)
+                if not transport_ok:
+                    ep.down_until = time.time() + self.down_cooldown
+            self.limiter.release(ok=transport_ok, output_tokens=output_tokens)
+
+    def analyze_multiview(self, camera_images, system_prompt, object_inventory=None, verbose=False):
+        messages = self.build_messages(camera_images, system_prompt, object_inventory=object_inventory, verbose=verbose)
+        return self.complete(messages)
+
+    def stats(self):
+        return {
+            "limit": self.limiter.limit,
+            "breaker": self.breaker.stats(),
+            "inflight": self.limiter.inflight,
+            "endpoints": [
+                {"url": ep.base_url, "inflight": ep.inflight, "completed": ep.completed,
+                 "errors": ep.errors, "ewma_latency": ep.ewma_latency}
+                for ep in self.endpoints
+            ],
+        }
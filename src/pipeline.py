@@ -0,0 +1,308 @@
+# src/pipeline.py
+# Stage-overlapped mining loop.
+#
+#   tokens -> [load] -> [detect] -> [encode] -> [vlm x scouts] -> [write]
+#
+# Every arrow is a bounded queue, so a slow stage applies backpressure instead of
+# buffering the whole dataset in RAM. While the VLM server is generating for frame N,
+# the CPU is already decoding / running YOLOE / encoding frames N+1..N+k.
+#
+# With several Scouts the frame is decoded, detected and encoded ONCE and the same
+# payload is fanned out to every scout that has not processed the token yet.
+import queue
+import threading
+import time
+from tqdm import tqdm
+
+from src.tracing import NULL_TRACER
+from src.mining import (
+    load_camera_images, run_detector, run_detector_many, call_vlm_with_retry,
+    build_log_entry, build_index_entry, commit_frame, MAX_IMAGE_SIZE,
+)
+
+_STOP = object()  # Sentinel travelling down the queues
+
+# Span names per stage fn (see src.tracing)
+_SPAN_NAMES = {"_load": "decode", "_detect": "detect", "_detect_many": "detect", "_encode": "encode", "_vlm": "vlm"}
+
+
+class Scout:
+    """One VLM configuration (model + client) and the index/log files it writes to."""
+    def __init__(self, model, output_name, client, index_file=None, log_file=None, processed=None, prompts=None):
+        self.model = model
+        self.output_name = output_name
+        self.client = client
+        self.index_file = index_file
+        self.log_file = log_file
+        self.f_index = None  # Opened by the caller
+        self.f_log = None
+        self.processed = processed or set()  # Resume Logic, per scout
+        self.prompts = prompts  # PromptRegistry (None = full prompt_messages in every log line)
+
+
+class MiningPipeline:
+    def __init__(self, loader, detector, scouts, system_prompt,
+                 queue_size=8, load_workers=2, detect_workers=1, encode_workers=1, vlm_workers=1,
+                 detect_batch_frames=1, batch_timeout=0.05, ordered=True, verbose=False,
+                 max_image_size=MAX_IMAGE_SIZE, detection_store=None, tracer=NULL_TRACER):
+        self.loader = loader
+        self.detector = detector
+        self.scouts = scouts
+        self.system_prompt = system_prompt
+        self.queue_size = queue_size
+        self.load_workers = load_workers
+        self.detect_workers = detect_workers
+        self.encode_workers = encode_workers
+        self.vlm_workers = vlm_workers
+        self.detect_batch_frames = detect_batch_frames
+        self.batch_timeout = batch_timeout
+        self.ordered = ordered
+        self.verbose = verbose
+        self.max_image_size = max_image_size
+        self.detection_store = detection_store  # Frames already in the store skip YOLOE
+        self.tracer = tracer
+        self.feed_error = None  # Set if the token iterable raised (see _feed)
+
+    # --- STAGES ---
+    # Each stage fn mutates the job dict in place and may return a list of jobs to
+    # emit instead (fan-out). A job that fails a stage is flagged with 'skip' and
+    # still flows downstream so ordered commit never stalls.
+
+    def _load(self, job):
+        job["images"] = load_camera_images(self.loader, job["token"], max_size=self.max_image_size)
+        if job["images"] is None:
+            job["skip"] = True
+
+    def _detect(self, job):
+        t0 = time.time()
+        job["t0"] = t0
+        job["inventory"] = run_detector(self.detector, job["images"], self.detection_store, job["token"])
+        job["yolo_duration"] = time.time() - t0
+
+    def _detect_many(self, jobs):
+        # One predict call for up to detect_batch_frames frames. Latency is amortised
+        # over the batch so perf_yolo_latency stays a per-frame number.
+        t0 = time.time()
+        inventories = run_detector_many(self.detector, [job["images"] for job in jobs],
+                                        self.detection_store, [job["token"] for job in jobs])
+        per_frame = (time.time() - t0) / len(jobs)
+        for job, inventory in zip(jobs, inventories):
+            job["t0"] = t0
+            job["inventory"] = inventory
+            job["yolo_duration"] = per_frame
+
+    def _encode(self, job):
+        t_enc = time.time()
+        # The payload does not depend on the model, so any scout's client can build it
+        job["messages"] = self.scouts[0].client.build_messages(job["images"], self.system_prompt, object_inventory=job["inventory"])
+        job["encode_duration"] = time.time() - t_enc
+        job["images"] = None  # Release decoded pixels as early as possible
+        return [dict(job, scout=i) for i in job["scouts"]]
+
+    def _vlm(self, job):
+        t_vlm = time.time()
+        client = self.scouts[job["scout"]].client
+        result, attempts_used, last_attempt_start = call_vlm_with_retry(client, job["messages"])
+        # Keep the old meaning of perf_vlm_latency (encode + generation)
+        job["vlm_duration"] = job["encode_duration"] + (time.time() - t_vlm)
+        job["result"] = result
+        job["attempts_used"] = attempts_used
+        job["last_attempt_start"] = last_attempt_start
+        job["messages"] = None
+        if result is not None:
+            # request_queue / generation / parse / backoff spans measured inside the client
+            self.tracer.add_timings(result.get("timings"), job["token"])
+
+    def _worker(self, fn, in_q, out_q, state):
+        while True:
+            job = in_q.get()
+            if job is _STOP:
+                in_q.put(_STOP)  # Let sibling workers see it too
+                with state["lock"]:
+                    state["alive"] -= 1
+                    last = state["alive"] == 0
+                if last:
+                    out_q.put(_STOP)
+                return
+
+            out = None
+            name = _SPAN_NAMES.get(fn.__name__, fn.__name__)
+            if "t_put" in job:
+                self.tracer.add_span(f"wait_{name}", job["t_put"], time.time(), job["token"])
+            if not job.get("skip"):
+                try:
+                    with self.tracer.span(name, job["token"]):
+                        out = fn(job)
+                except Exception as e:
+                    print(f"\n❌ Stage {fn.__name__} failed for {job['token']}: {e}")
+                    job["skip"] = True
+                    out = None
+            for item in (out if out is not None else [job]):
+                item["t_put"] = time.time()
+                out_q.put(item)
+
+    def _batch_worker(self, fn, in_q, out_q, state, batch_size):
+        """Like _worker, but hands fn up to batch_size jobs at once (waiting at most batch_timeout to fill)."""
+        stopped = False
+        while not stopped:
+            batch = []
+            job = in_q.get()
+            while True:
+                if job is _STOP:
+                    stopped = True
+                    break
+                batch.append(job)
+                if len(batch) >= batch_size: break
+                try:
+                    job = in_q.get(timeout=self.batch_timeout)
+                except queue.Empty:
+                    break
+
+            name = _SPAN_NAMES.get(fn.__name__, fn.__name__)
+            now = time.time()
+            for j in batch:
+                if "t_put" in j: self.tracer.add_span(f"wait_{name}", j["t_put"], now, j["token"])
+            todo = [j for j in batch if not j.get("skip")]
+            if todo:
+                try:
+                    with self.tracer.span(name, f"{len(todo)} frame(s)"):
+                        fn(todo)
+                except Exception as e:
+                    print(f"\n❌ Stage {fn.__name__} failed for {len(todo)} frame(s): {e}")
+                    for j in todo: j["skip"] = True
+            for j in batch:
+                j["t_put"] = time.time()
+                out_q.put(j)
+
+        in_q.put(_STOP)  # Let sibling workers see it too
+        with state["lock"]:
+            state["alive"] -= 1
+            last = state["alive"] == 0
+        if last:
+            out_q.put(_STOP)
+
+    def _start_stage(self, fn, in_q, out_q, n_workers, batch_size=1):
+        state = {"alive": n_workers, "lock": threading.Lock()}
+        for _ in range(n_workers):
+            if batch_size > 1:
+                args = (fn, in_q, out_q, state, batch_size)
+                t = threading.Thread(target=self._batch_worker, args=args, daemon=True)
+            else:
+                t = threading.Thread(target=self._worker, args=(fn, in_q, out_q, state), daemon=True)
+            t.start()
+
+    def _feed(self, tokens, token_q, on_commit=None):
+        seq = 0
+        try:
+            for token in tokens:
+                needed = [i for i, s in enumerate(self.scouts) if token not in s.processed]
+                if not needed:
+                    # Already in every index: still finish it, or a work-queue lease would expire and be handed out again
+                    if on_commit: on_commit(token, True)
+                    continue
+                token_q.put({"seq": seq, "token": token, "scouts": needed})
+                seq += 1
+        except Exception as e:
+            # e.g. a WorkQueue lease hitting a SQLite error: drain what's in flight, then run() raises it
+            print(f"\n❌ Token feed failed after {seq} frame(s): {e}")
+            self.feed_error = e
+        finally:
+            token_q.put(_STOP)
+
+    # --- WRITER ---
+
+    def _commit(self, job):
+        """Writes one (frame, scout) result. Returns True if it reached the index."""
+        scout = self.scouts[job["scout"]]
+        result = job["result"]
+        log_entry = build_log_entry(
+            job["token"], scout.model, job["inventory"], result, job["attempts_used"],
+            job["t0"], job["yolo_duration"], job["vlm_duration"], job["last_attempt_start"],
+            prompt_registry=scout.prompts,
+        )
+        index_entry = None
+        if result and result["success"]:
+            index_entry = build_index_entry(job["token"], scout.output_name, job["inventory"], result)
+        with self.tracer.span("write", job["token"]):
+            commit_frame(scout.f_index, scout.f_log, log_entry, index_entry)
+
+        tag = f"{job['token']}" if len(self.scouts) == 1 else f"{job['token']} @ {scout.output_name}"
+        if index_entry is not None:
+            if self.verbose and result.get("reasoning_trace"):
+                print(f"\n[Token: {tag}] 🧠 Reasoning:\n{result['reasoning_trace'][:300]}...\n")
+        elif result and not result["success"]:
+            print(f"\n❌ Failed Token {tag}: {result['error']}")
+        return index_entry is not None
+
+    def _commit_frame(self, parts, on_commit):
+        if "scout" not in parts[0]:
+            success = False  # Skipped before fan-out (e.g. missing cameras)
+        else:
+            success = all([False if p.get("skip") else self._commit(p) for p in parts])
+        self.tracer.count("frames_committed")
+        self.tracer.count("frames_ok" if success else "frames_failed")
+        if on_commit: on_commit(parts[0]["token"], success)
+
+    def run(self, tokens, total=None, on_commit=None):
+        """
+        Processes 'tokens' and commits each scout's results to its open files.
+        'tokens' may be a lazy iterable (e.g. leases from a WorkQueue); 'on_commit(token, success)'
+        is called from the writer once every scout's result for the frame is on disk (from the
+        feeder for frames every scout has already processed).
+        """
+        if total is None and hasattr(tokens, "__len__"):
+            total = len(tokens)
+        self.feed_error = None
+        n = self.queue_size
+        token_q = queue.Queue(maxsize=n)
+        detect_q = queue.Queue(maxsize=max(n, self.detect_batch_frames))
+        encode_q = queue.Queue(maxsize=n)
+        vlm_q = queue.Queue(maxsize=n * len(self.scouts))
+        write_q = queue.Queue(maxsize=n * len(self.scouts))
+        for name, q in [("load", token_q), ("detect", detect_q), ("encode", encode_q), ("vlm", vlm_q), ("write", write_q)]:
+            self.tracer.gauge(name, q.qsize)
+        if self.tracer.total is None:
+            self.tracer.total = total
+
+        threading.Thread(target=self._feed, args=(tokens, token_q, on_commit), daemon=True).start()
+        self._start_stage(self._load, token_q, detect_q, self.load_workers)
+        # A local YOLOE model is not thread-safe; >1 only makes sense with a RemoteDetector
+        if self.detect_batch_frames > 1:
+            self._start_stage(self._detect_many, detect_q, encode_q, self.detect_workers, batch_size=self.detect_batch_frames)
+        else:
+            self._start_stage(self._detect, detect_q, encode_q, self.detect_workers)
+        self._start_stage(self._encode, encode_q, vlm_q, self.encode_workers)
+        self._start_stage(self._vlm, vlm_q, write_q, self.vlm_workers)
+
+        # A frame is complete once all its scout results arrived (or it was skipped upstream).
+        # Ordered commit holds complete frames back until the gap is filled, so the line
+        # order matches the sample order like the sequential loop.
+        parts = {}
+        ready = {}
+        next_seq = 0
+        with tqdm(total=total) as pbar:
+            while True:
+                job = write_q.get()
+                if job is _STOP: break
+                if "t_put" in job:
+                    self.tracer.add_span("wait_write", job["t_put"], time.time(), job["token"])
+
+                seq = job["seq"]
+                parts.setdefault(seq, []).append(job)
+                expected = len(job["scouts"]) if "scout" in job else 1
+                if len(parts[seq]) < expected: continue
+                frame = sorted(parts.pop(seq), key=lambda p: p.get("scout") or 0)
+
+                if not self.ordered:
+                    self._commit_frame(frame, on_commit)
+                    pbar.update(1)
+                    continue
+
+                ready[seq] = frame
+                while next_seq in ready:
+                    self._commit_frame(ready.pop(next_seq), on_commit)
+                    next_seq += 1
+                    pbar.update(1)
+
+        if self.feed_error is not None:
+            raise RuntimeError(f"Token feed failed: {self.feed_error}") from self.feed_error
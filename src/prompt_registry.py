@@ -0,0 +1,121 @@
+# src/prompt_registry.py
+# Content-addressed prompt registry for the mining logs.
+#
+# Every log line used to carry 'prompt_messages': the full multi-kilobyte SYSTEM_PROMPT
+# plus the per-frame inventory. Now the prompt template (messages with the inventory
+# swapped for a marker) is written ONCE to prompts_{name}.jsonl and each log line stores
+# only 'prompt_id'. The variable part is the 'yolo_inventory' the log already keeps.
+#
+#   python -m src.prompt_registry show --output_name qwen3_run --token <sample_token>
+#   python -m src.prompt_registry rehydrate --output_name qwen3_run   (-> output/rehydrated/logs_qwen3_run.jsonl)
+import argparse
+import hashlib
+import json
+import os
+
+INVENTORY_MARKER = "<<YOLO_INVENTORY>>"
+
+
+def registry_path(output_dir, output_name):
+    return os.path.join(output_dir, f"prompts_{output_name}.jsonl")
+
+
+def _replace_strings(obj, old, new):
+    if isinstance(obj, str):
+        return obj.replace(old, new)
+    if isinstance(obj, list):
+        return [_replace_strings(x, old, new) for x in obj]
+    if isinstance(obj, dict):
+        return {k: _replace_strings(v, old, new) for k, v in obj.items()}
+    return obj
+
+
+def make_template(messages_log, inventory):
+    """Sanitized messages -> (prompt_id, template) with the inventory factored out."""
+    template = messages_log
+    if inventory:
+        template = _replace_strings(messages_log, inventory, INVENTORY_MARKER)
+    blob = json.dumps(template, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()[:16], template
+
+
+class PromptRegistry:
+    def __init__(self, path):
+        self.path = path
+        self.templates = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        obj = json.loads(line)
+                        self.templates[obj['prompt_id']] = obj['messages']
+                    except: pass
+
+    def intern(self, messages_log, inventory):
+        """Returns the prompt_id, appending the template to the registry file the first time."""
+        prompt_id, template = make_template(messages_log, inventory)
+        if prompt_id not in self.templates:
+            self.templates[prompt_id] = template
+            # Append-only: several workers may share the file, duplicates are harmless
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({"prompt_id": prompt_id, "messages": template}) + "\n")
+        return prompt_id
+
+    def rehydrate(self, entry):
+        """Full prompt_messages for a log entry (old entries with inline messages pass through)."""
+        if "prompt_messages" in entry:
+            return entry["prompt_messages"]
+        template = self.templates.get(entry.get("prompt_id"))
+        if template is None:
+            return None
+        return _replace_strings(template, INVENTORY_MARKER, entry.get("yolo_inventory") or "")
+
+
+def iter_log(log_file, registry=None):
+    """Yields log entries; with a registry, 'prompt_messages' is filled back in."""
+    with open(log_file, 'r') as f:
+        for line in f:
+            try: entry = json.loads(line)
+            except: continue
+            if registry is not None and "prompt_messages" not in entry:
+                entry["prompt_messages"] = registry.rehydrate(entry)
+            yield entry
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_show = sub.add_parser("show", help="Print the full prompt of one logged frame")
+    p_show.add_argument("--output_name", required=True)
+    p_show.add_argument("--token", required=True)
+    p_show.add_argument("--output_dir", default="output")
+
+    p_full = sub.add_parser("rehydrate", help="Write a log copy with full prompt_messages")
+    p_full.add_argument("--output_name", required=True)
+    p_full.add_argument("--output_dir", default="output")
+    args = parser.parse_args()
+
+    registry = PromptRegistry(registry_path(args.output_dir, args.output_name))
+    log_file = os.path.join(args.output_dir, f"logs_{args.output_name}.jsonl")
+
+    if args.cmd == "show":
+        for entry in iter_log(log_file, registry):
+            if entry["token"] == args.token:
+                print(json.dumps(entry["prompt_messages"], indent=2, ensure_ascii=False))
+                return
+        print(f"❌ Token {args.token} not in {log_file}")
+    elif args.cmd == "rehydrate":
+        # Own folder so the logs_*.jsonl globs (analytics, shard merge) never pick it up
+        out_dir = os.path.join(args.output_dir, "rehydrated")
+        os.makedirs(out_dir, exist_ok=True)
+        out_file = os.path.join(out_dir, os.path.basename(log_file))
+        n = 0
+        with open(out_file, 'w') as f:
+            for entry in iter_log(log_file, registry):
+                f.write(json.dumps(entry) + "\n")
+                n += 1
+        print(f"✅ Rehydrated {n} log entries -> {out_file}")
+
+if __name__ == "__main__":
+    main()
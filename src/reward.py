@@ -1,4 +1,5 @@
 # src/reward.py
+from src.data.detection_store import detected_classes
 
 class SymbolicVerifier:
     def __init__(self):
@@ -18,10 +19,17 @@ class SymbolicVerifier:
                 return True
         return False
 
-    def calculate_score(self, json_output, yolo_text):
+    def calculate_score(self, json_output, yolo_text, detections=None):
         score = 0.0
         reasons = []
         
+        # Structured detections (DetectionStore) match on class names only, so words like
+        # "Clear" or "Large" in the formatted inventory can never count as evidence.
+        if detections is not None:
+            yolo_text = " ".join(sorted(detected_classes(detections)))
+            if not yolo_text:
+                yolo_text = "clear"  # Detected, nothing found: still valid grounding context
+
         # If no YOLO text provided, we can't verify grounding.
         if not yolo_text:
             return 0.0, ["No YOLO context"]
@@ -0,0 +1,77 @@
+# python -m pytest src/test_cache.py
+import json
+
+from src.cache import DiskLRUCache
+from src.mining import call_vlm_with_retry
+from src.model.vlm_client import VLMClient
+
+MESSAGES = [{"role": "system", "content": "sys"}, {"role": "user", "content": [{"type": "text", "text": "frame"}]}]
+
+
+def test_hit_miss_and_delete(tmp_path):
+    cache = DiskLRUCache(str(tmp_path / "c.sqlite"))
+    assert cache.get("k") is None
+    cache.put("k", b"value")
+    assert cache.get("k") == b"value"
+    cache.delete("k")
+    assert cache.get("k") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_lru_eviction(tmp_path):
+    cache = DiskLRUCache(str(tmp_path / "c.sqlite"), max_bytes=100, evict_every=1)
+    cache.put("old", b"x" * 40)
+    cache.put("used", b"x" * 40)
+    cache.get("used")  # Now more recent than 'old'
+    cache.put("new", b"x" * 40)  # 120 bytes > 100 -> drop LRU entries down to 90
+    assert cache.get("old") is None
+    assert cache.get("used") is not None and cache.get("new") is not None
+
+
+class FakeServerClient(VLMClient):
+    """VLMClient whose server answers with canned contents (one per call)."""
+    def __init__(self, answers, **kwargs):
+        super().__init__(**kwargs)
+        self.answers = list(answers)
+        self.sent = 0
+
+    def complete(self, messages, lookup=True):
+        cached = self.cached_result(messages) if lookup else None
+        if cached is not None:
+            return cached
+        self.sent += 1
+        result = self._new_result(None)
+        content = self.answers.pop(0)
+        self._package(result, content, None, None)
+        if result["success"]:
+            self._store_result(messages, content, None, None)
+        return result
+
+
+def test_successful_answer_is_replayed(tmp_path):
+    cache = DiskLRUCache(str(tmp_path / "r.sqlite"))
+    client = FakeServerClient(['{"a": 1}'], response_cache=cache, repair=False)
+    assert client.complete(MESSAGES)["success"] and client.sent == 1
+    hit = client.complete(MESSAGES)
+    assert hit["cache_hit"] and hit["parsed_json"]["a"] == 1 and client.sent == 1
+
+
+def test_unparseable_entry_is_evicted(tmp_path):
+    cache = DiskLRUCache(str(tmp_path / "r.sqlite"))
+    client = FakeServerClient(['{"a": 1}'], response_cache=cache, repair=False)
+    key = client.response_key(MESSAGES)
+    cache.put(key, json.dumps({"raw": "no json", "reasoning": None, "usage": None}).encode('utf-8'))
+    assert client.cached_result(MESSAGES) is None
+    assert cache.get(key) is None
+    result, attempts, _ = call_vlm_with_retry(client, MESSAGES)
+    assert result["success"] and not result.get("cache_hit") and client.sent == 1
+
+
+def test_retries_skip_the_cache(tmp_path):
+    cache = DiskLRUCache(str(tmp_path / "r.sqlite"))
+    client = FakeServerClient(["not json", '{"a": 2}'], response_cache=cache, repair=False)
+    cached = []
+    client.cached_result = lambda messages: cached.append(1)  # Counts lookups, always a miss
+    result, attempts, _ = call_vlm_with_retry(client, MESSAGES)
+    assert result["success"] and attempts == 2 and client.sent == 2
+    assert len(cached) == 1
@@ -0,0 +1,75 @@
+# python -m pytest src/test_work_queue.py
+import json
+import os
+
+from src.work_queue import WorkQueue, shard_paths, merge
+
+
+def test_seed_is_idempotent(tmp_path):
+    wq = WorkQueue(str(tmp_path / "q.sqlite"))
+    assert wq.seed(["a", "b", "c"]) == 3
+    assert wq.seed(["a", "b", "c", "d"]) == 1
+    assert wq.counts() == {"pending": 4}
+
+
+def test_leases_do_not_overlap_and_complete(tmp_path):
+    wq = WorkQueue(str(tmp_path / "q.sqlite"))
+    wq.seed(["a", "b", "c"])
+    assert wq.lease("w1", 2) == ["a", "b"]
+    assert wq.lease("w2", 2) == ["c"]
+    assert wq.complete("w1", "a") == 1
+    assert wq.complete("w1", "b", success=False) == 1
+    assert wq.complete("w1", "c") == 0  # Leased by w2
+    assert wq.counts() == {"done": 1, "failed": 1, "leased": 1}
+    assert wq.requeue_failed() == 1
+    assert wq.lease("w1", 5) == ["b"]
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    wq = WorkQueue(str(tmp_path / "q.sqlite"), lease_seconds=-1)  # Every lease is already expired
+    wq.seed(["a"])
+    assert wq.lease("dead", 1) == ["a"]
+    assert wq.lease("alive", 1) == ["a"]
+    assert wq.complete("dead", "a") == 0  # The dead worker lost it
+    assert wq.complete("alive", "a") == 1
+    assert wq.lease("alive", 1) == []
+
+
+def test_heartbeat_keeps_lease_and_release_hands_it_back(tmp_path):
+    wq = WorkQueue(str(tmp_path / "q.sqlite"), lease_seconds=60)
+    wq.seed(["a", "b"])
+    wq.lease("w1", 2)
+    assert wq.heartbeat("w1") == 2
+    assert wq.lease("w2", 2) == []
+    assert wq.release("w1") == 2
+    assert list(wq.iter_tokens("w2", 1)) == ["a", "b"]
+
+
+def write_jsonl(path, rows):
+    with open(path, 'w') as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_merge_dedups_shards_into_canonical_files(tmp_path):
+    out = str(tmp_path)
+    write_jsonl(os.path.join(out, "index_run.jsonl"), [{"token": "a", "v": 0}])
+    index_1, log_1 = shard_paths(out, "run", "w1")
+    index_2, log_2 = shard_paths(out, "run", "w2")
+    assert os.path.dirname(index_1) == os.path.join(out, "shards")
+    write_jsonl(index_1, [{"token": "a", "v": 1}, {"token": "b", "v": 1}])
+    write_jsonl(index_2, [{"token": "c", "v": 2}, {"token": "b", "v": 2}])
+    write_jsonl(log_1, [{"token": "b", "timestamp": 1}, {"token": "b", "timestamp": 2}])
+    write_jsonl(log_2, [{"token": "b", "timestamp": 2}])
+
+    merge(out, "run")
+    merge(out, "run")  # Re-running changes nothing
+    assert read_jsonl(os.path.join(out, "index_run.jsonl")) == [
+        {"token": "a", "v": 0}, {"token": "b", "v": 1}, {"token": "c", "v": 2}]
+    assert len(read_jsonl(os.path.join(out, "logs_run.jsonl"))) == 2
+    assert sorted(os.listdir(out)) == ["index_run.jsonl", "logs_run.jsonl", "shards"]
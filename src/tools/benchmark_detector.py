@@ -0,0 +1,174 @@
+# src/tools/benchmark_detector.py
+# CPU YOLOE backends on a fixed frame set: the PyTorch checkpoint vs ONNX / OpenVINO exports
+# (fp32 and int8) with the taxonomy baked in.
+#
+# Reports latency per frame (3 cameras) and how far each export's inventory drifts from PyTorch:
+#   inventory_exact  - frames whose prompt inventory text is identical
+#   counts_match     - cameras with the same number of detections per class
+#   class_jaccard    - mean Jaccard of the detected class sets per frame
+#   box_f1           - same-class boxes matched at IoU >= 0.5
+#
+# python -m src.tools.benchmark_detector --samples 50 --backends pytorch onnx openvino openvino-int8
+# python -m src.tools.benchmark_detector --tokens output/bench_tokens.txt --batch_frames 4 --out output/bench_detector.json
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+sys.path.append(os.path.abspath('.'))
+
+from src.data.loader import NuScenesLoader
+from src.data.detection_store import format_inventory, detected_classes
+from src.mining import load_camera_images, MAX_IMAGE_SIZE
+
+
+def parse_backend(name):
+    """'openvino-int8' -> ('openvino', True)."""
+    backend, _, quant = name.partition("-")
+    return backend, quant == "int8"
+
+
+def iou(a, b):
+    w = min(a[2], b[2]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[1], b[1])
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / ((a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter)
+
+
+def match_boxes(ref, dets, thr=0.5):
+    """Greedy same-class matching (highest confidence first). Returns true positives."""
+    used = set()
+    tp = 0
+    for det in sorted(dets, key=lambda d: -d["conf"]):
+        best, best_iou = None, thr
+        for j, r in enumerate(ref):
+            if j in used or r["cls"] != det["cls"]:
+                continue
+            score = iou(det["box"], r["box"])
+            if score >= best_iou:
+                best, best_iou = j, score
+        if best is not None:
+            used.add(best)
+            tp += 1
+    return tp
+
+
+def agreement(reference, structured):
+    """Inventory agreement of one backend's detections against the PyTorch reference (lists of frames)."""
+    exact, cams_same, cams, jaccards = 0, 0, 0, []
+    tp = n_ref = n_det = 0
+    for ref_frame, frame in zip(reference, structured):
+        exact += format_inventory(ref_frame) == format_inventory(frame)
+        ref_cls, cls = detected_classes(ref_frame), detected_classes(frame)
+        jaccards.append(len(ref_cls & cls) / len(ref_cls | cls) if ref_cls | cls else 1.0)
+        for cam, ref_dets in ref_frame.items():
+            dets = frame.get(cam, [])
+            cams += 1
+            cams_same += Counter(d["cls"] for d in ref_dets) == Counter(d["cls"] for d in dets)
+            tp += match_boxes(ref_dets, dets)
+            n_ref += len(ref_dets)
+            n_det += len(dets)
+    precision = tp / n_det if n_det else 1.0
+    recall = tp / n_ref if n_ref else 1.0
+    return {
+        "inventory_exact": round(exact / len(reference), 3),
+        "counts_match": round(cams_same / cams, 3) if cams else 1.0,
+        "class_jaccard": round(float(np.mean(jaccards)), 3),
+        "box_f1": round(2 * precision * recall / (precision + recall), 3) if precision + recall else 0.0,
+    }
+
+
+def run_backend(name, frames, args):
+    from src.model.detector import ObjectDetector
+    backend, int8 = parse_backend(name)
+
+    t0 = time.perf_counter()
+    detector = ObjectDetector(model_size=args.model_size, conf_threshold=args.conf, backend=backend,
+                              int8=int8, imgsz=args.imgsz, calib_data=args.calib_data)
+    load_s = time.perf_counter() - t0
+
+    batches = [frames[i:i + args.batch_frames] for i in range(0, len(frames), args.batch_frames)]
+    detector.detect_many_structured(batches[0])  # Warm-up (graph compilation, allocator)
+    structured, batch_t = [], []
+    for batch in batches:
+        t = time.perf_counter()
+        structured += detector.detect_many_structured(batch)
+        batch_t.append((time.perf_counter() - t) / len(batch))
+    del detector
+
+    row = {
+        "backend": name,
+        "load_s": round(load_s, 2),
+        "ms_per_frame": round(float(np.mean(batch_t)) * 1000, 1),
+        "p95_ms_per_frame": round(float(np.percentile(batch_t, 95)) * 1000, 1),
+        "fps": round(len(frames) / sum(b * len(batch) for b, batch in zip(batch_t, batches)), 2),
+    }
+    return row, structured
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=50, help="First N nuScenes samples (ignored with --tokens)")
+    parser.add_argument("--tokens", type=str, default=None, help="File with one sample token per line (a pinned frame set)")
+    parser.add_argument("--backends", nargs="+", default=["pytorch", "onnx", "openvino", "openvino-int8"],
+                        help="pytorch, onnx, openvino, openvino-int8; the first one is the reference")
+    parser.add_argument("--model_size", type=str, default='yoloe-11l-seg.pt')
+    parser.add_argument("--conf", type=float, default=0.40)
+    parser.add_argument("--imgsz", type=int, default=640, help="Export input size")
+    parser.add_argument("--calib_data", type=str, default=None, help="Ultralytics dataset YAML for int8 calibration")
+    parser.add_argument("--batch_frames", type=int, default=1, help="Frames per predict call (like --detect_batch_frames)")
+    parser.add_argument("--threads", type=int, default=None, help="torch threads (PyTorch backend)")
+    parser.add_argument("--out", type=str, default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    loader = NuScenesLoader()
+    if args.tokens:
+        with open(args.tokens) as f:
+            tokens = [line.strip() for line in f if line.strip()]
+    else:
+        tokens = loader.get_all_samples()[:args.samples]
+
+    # Decoded once, so every backend sees the same pixels and only detection is timed
+    frames = [images for images in (load_camera_images(loader, t, max_size=MAX_IMAGE_SIZE) for t in tokens) if images]
+    print(f"🖼️ {len(frames)} frame(s) x {len(frames[0]) if frames else 0} camera(s)")
+
+    results = []
+    reference = None
+    for name in args.backends:
+        print(f"\n--- {name} ---")
+        row, structured = run_backend(name, frames, args)
+        if reference is None:
+            reference = structured
+            row["reference"] = True
+        else:
+            row.update(agreement(reference, structured))
+        results.append(row)
+        print(f"📏 {row}")
+
+    print("\n--- SUMMARY ---")
+    base_ms = results[0]["ms_per_frame"]
+    for row in results:
+        line = f"{row['backend']:<15} {row['ms_per_frame']:>8.1f} ms/frame  (p95 {row['p95_ms_per_frame']:>7.1f})  x{base_ms / row['ms_per_frame']:.2f}"
+        if not row.get("reference"):
+            line += (f"  exact {row['inventory_exact']:.0%}  counts {row['counts_match']:.0%}"
+                     f"  jaccard {row['class_jaccard']:.3f}  box F1 {row['box_f1']:.3f}")
+        print(line)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({"frames": len(frames), "tokens": tokens, "batch_frames": args.batch_frames,
+                       "results": results}, f, indent=2)
+        print(f"💾 Saved to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# src/tools/benchmark_encoding.py
+# Compares the VLM image payload paths on real nuScenes frames:
+#   reencode    - decode (+ resize) and re-encode as JPEG q95 (the default path)
+#   passthrough - send the source JPEG bytes untouched whenever no resize is needed
+# Reports bytes sent, load + encode time and, with --e2e, the end-to-end VLM latency.
+#
+# python -m src.tools.benchmark_encoding --samples 20 --sizes 1280 1600
+# python -m src.tools.benchmark_encoding --samples 10 --sizes 1600 --e2e --model qwen3-30b --port 1234
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath('.'))
+
+from src.data.loader import NuScenesLoader
+from src.model.vlm_client import VLMClient
+from src.model.prompts import SYSTEM_PROMPT
+from src.mining import load_camera_images
+
+
+def payload_bytes(messages):
+    # Size of the base64 image URLs actually sent over the wire
+    total = 0
+    for msg in messages:
+        if isinstance(msg.get('content'), list):
+            for item in msg['content']:
+                if item.get('type') == 'image_url':
+                    total += len(item['image_url']['url'])
+    return total
+
+
+def run_mode(loader, tokens, client, max_size, e2e=False):
+    load_t, encode_t, vlm_t, sizes = [], [], [], []
+    for token in tokens:
+        t0 = time.perf_counter()
+        images = load_camera_images(loader, token, max_size=max_size)
+        if images is None: continue
+        t1 = time.perf_counter()
+        messages = client.build_messages(images, SYSTEM_PROMPT)
+        t2 = time.perf_counter()
+        load_t.append(t1 - t0)
+        encode_t.append(t2 - t1)
+        sizes.append(payload_bytes(messages))
+        if e2e:
+            client.complete(messages)
+            vlm_t.append(time.perf_counter() - t2)
+
+    row = {
+        "frames": len(sizes),
+        "payload_kb": round(np.mean(sizes) / 1024, 1) if sizes else 0,
+        "load_ms": round(np.mean(load_t) * 1000, 1) if load_t else 0,
+        "encode_ms": round(np.mean(encode_t) * 1000, 1) if encode_t else 0,
+    }
+    if e2e:
+        row["vlm_s"] = round(np.mean(vlm_t), 2) if vlm_t else 0
+        row["total_s"] = round(np.mean(np.array(load_t) + np.array(encode_t) + np.array(vlm_t)), 2) if vlm_t else 0
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1280, 1600], help="--max_image_size values to compare")
+    parser.add_argument("--e2e", action="store_true", help="Also send every request to the VLM server")
+    parser.add_argument("--model", type=str, default="qwen3-vl-30b")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--out", type=str, default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    loader = NuScenesLoader()
+    tokens = loader.get_all_samples()[:args.samples]
+
+    results = []
+    for size in args.sizes:
+        for mode in ("reencode", "passthrough"):
+            client = VLMClient(model_id=args.model, port=args.port, passthrough=(mode == "passthrough"))
+            # Warm the page cache so the first mode is not penalised for cold reads
+            run_mode(loader, tokens[:2], client, (size, size))
+            row = {"max_image_size": size, "mode": mode, **run_mode(loader, tokens, client, (size, size), e2e=args.e2e)}
+            results.append(row)
+            print(f"📏 {row}")
+
+    print("\n--- SUMMARY ---")
+    for row in results:
+        line = f"{row['max_image_size']:>5} {row['mode']:<12} {row['payload_kb']:>8.1f} KB  load {row['load_ms']:>7.1f} ms  encode {row['encode_ms']:>7.1f} ms"
+        if args.e2e:
+            line += f"  vlm {row['vlm_s']:>6.2f} s  total {row['total_s']:>6.2f} s"
+        print(line)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Saved to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from PIL import Image, ImageDraw, ImageFont
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
 from src.data.loader import NuScenesLoader
+from src.data.images import load_image
 
 # CONFIG
 OUTPUT_DIR = "assets/figures"
@@ -25,8 +26,7 @@ def create_high_res_pano(loader, token, save_path):
     
     for cam in cam_order:
         if cam in paths and os.path.exists(paths[cam]):
-            img = Image.open(paths[cam])
-            images.append(img)
+            images.append(load_image(paths[cam]).pil)
         else:
             print(f"❌ Missing {cam} for {token}")
             return
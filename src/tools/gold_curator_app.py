@@ -3,7 +3,6 @@ import os
 import sys
 import json
 import pandas as pd
-from PIL import Image
 import random
 
 
@@ -11,6 +10,7 @@ import random
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
 from src.data.loader import NuScenesLoader
+from src.data.images import load_image
 
 # --- PAGE CONFIG ---
 st.set_page_config(layout="wide", page_title="Semantic-Drive Gold Curator")
@@ -208,7 +208,8 @@ try:
     paths = loader.get_camera_paths(token)
     imgs = []
     for cam in ["CAM_FRONT_LEFT", "CAM_FRONT", "CAM_FRONT_RIGHT"]:
-        if cam in paths: imgs.append(Image.open(paths[cam]))
+        # Shown at 350px wide: a half-scale DCT decode is plenty
+        if cam in paths: imgs.append(load_image(paths[cam], max_size=(800, 800)).pil)
     
     st.image(imgs, caption=["Front Left", "Front Center", "Front Right"], width=350)
 except Exception as e:
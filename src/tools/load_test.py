@@ -0,0 +1,299 @@
+# src/tools/load_test.py
+# End-to-end load test of the mining + judge path against the mock VLM server.
+# No GPU, no nuScenes, no YOLOE: synthetic 1600x900 JPEG frames, a canned detector and
+# src.tools.mock_vlm_server in a subprocess. What's left is OUR overhead (decode, encode,
+# HTTP, parsing, logging), reported as frames/sec and CPU-seconds per frame.
+#
+#   python -m src.tools.load_test --frames 200 --ttft 0.05 --tokens_per_sec 2000 -- --pipeline --vlm_workers 8
+#   python -m src.tools.load_test --frames 200 --fail_rate 0.05 --drop_rate 0.02 -- --endpoints MOCK MOCK --concurrency 4
+#   python -m src.tools.load_test --frames 100 --report output/load_test.json --baseline output/load_test_baseline.json
+#
+# Anything after '--' goes straight to src.main ('MOCK', also inside an argument, is replaced by the mock's port).
+# With --baseline, exits 1 when fps drops or CPU/frame grows by more than --tolerance: usable as a CI gate.
+import argparse
+import json
+import os
+import re
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.abspath('.'))
+
+from src.config import CAM_ORDER
+from src.data.detection_store import format_inventory
+
+# Typical urban frame: what the null detector 'sees' on every camera
+CANNED_OBJECTS = [("car", 0.91, 0.12), ("car", 0.64, 0.02), ("person", 0.55, 0.004), ("traffic light", 0.48, 0.001)]
+
+
+class SyntheticLoader:
+    """Stands in for NuScenesLoader: 'unique' distinct 3-camera frames, cycled over 'n' tokens."""
+    def __init__(self, root, n, unique=16, size=(1600, 900), seed=0):
+        self.root = root
+        self.tokens = [f"synthetic_{i:06d}" for i in range(n)]
+        self.unique = unique
+        rng = np.random.default_rng(seed)
+        w, h = size
+        gradient = np.linspace(0, 255, w, dtype=np.float32)[None, :, None]
+        for k in range(unique):
+            for c, cam in enumerate(CAM_ORDER):
+                path = self._path(k, cam)
+                if os.path.exists(path): continue
+                # Gradient + noise compresses about like a real street scene (~300-500 KB at q90)
+                noise = rng.normal(0, 40, (h, w, 3)).astype(np.float32)
+                pixels = np.clip(gradient * (0.5 + 0.1 * c) + noise + 20 * k, 0, 255).astype(np.uint8)
+                Image.fromarray(pixels).save(path, quality=90)
+
+    def _path(self, k, cam):
+        return os.path.join(self.root, f"frame{k:03d}_{cam}.jpg")
+
+    def get_all_samples(self):
+        return list(self.tokens)
+
+    def get_sparse_samples(self, frames_per_scene=3):
+        return list(self.tokens)
+
+    def get_camera_paths(self, sample_token):
+        k = int(sample_token.rsplit("_", 1)[1]) % self.unique
+        return {cam: self._path(k, cam) for cam in CAM_ORDER}
+
+
+class NullDetector:
+    """Same interface as ObjectDetector / RemoteDetector, constant answer, ~zero cost."""
+    tag = "null@load_test"
+
+    def detect_many_structured(self, frames):
+        out = []
+        for images in frames:
+            out.append({cam: [{"cls": name, "conf": conf, "size": size, "box": [0, 0, 1, 1]}
+                              for name, conf, size in CANNED_OBJECTS] for cam in images})
+        return out
+
+    def detect_many(self, frames):
+        return [format_inventory(d) for d in self.detect_many_structured(frames)]
+
+    def detect_batch(self, images):
+        return self.detect_many([images])[0]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock(args, port):
+    cmd = [sys.executable, "-m", "src.tools.mock_vlm_server", "--port", str(port),
+           "--ttft", str(args.ttft), "--tokens_per_sec", str(args.tokens_per_sec),
+           "--fail_rate", str(args.fail_rate), "--drop_rate", str(args.drop_rate),
+           "--bad_json_rate", str(args.bad_json_rate), "--seed", str(args.seed)]
+    if args.slots: cmd += ["--slots", str(args.slots)]
+    if args.replay: cmd += ["--replay", args.replay]
+    if args.prefill_tokens_per_sec: cmd += ["--prefill_tokens_per_sec", str(args.prefill_tokens_per_sec)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}/v1/models"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return proc
+        except Exception:
+            if proc.poll() is not None: break
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Mock VLM server did not come up")
+
+
+def mock_stats(port):
+    try: return json.loads(urllib.request.urlopen(f"http://127.0.0.1:{port}/v1/stats", timeout=2).read())
+    except Exception: return None
+
+
+def read_metrics(path):
+    """Per-stage mean latency from the Prometheus file written by the Tracer."""
+    stages = {}
+    if not os.path.exists(path):
+        return stages
+    with open(path, 'r') as f:
+        for line in f:
+            if line.startswith("semantic_drive_stage_latency_seconds_mean"):
+                name = line.split('stage="', 1)[1].split('"', 1)[0]
+                stages[name] = float(line.rsplit(" ", 1)[1])
+    return stages
+
+
+def prompt_cache_stats(log_file):
+    """Share of prompt tokens the server reported as cached, and mean TTFT, from the mining log."""
+    prompt = cached = 0
+    ttfts = []
+    if os.path.exists(log_file):
+        with open(log_file, 'r') as f:
+            for line in f:
+                entry = json.loads(line)
+                usage = entry.get("usage") or {}
+                prompt += usage.get("input_tokens") or 0
+                cached += usage.get("cached_tokens") or 0
+                if entry.get("perf_ttft") is not None: ttfts.append(entry["perf_ttft"])
+    return {
+        "cached_token_ratio": round(cached / prompt, 4) if prompt else None,
+        "mean_ttft_s": round(float(np.mean(ttfts)), 4) if ttfts else None,
+    }
+
+
+def count_lines(path):
+    if not os.path.exists(path): return 0
+    with open(path, 'r') as f:
+        return sum(1 for _ in f)
+
+
+def cpu_seconds(who=resource.RUSAGE_SELF):
+    r = resource.getrusage(who)
+    return r.ru_utime + r.ru_stime
+
+
+def run_mining(args, main_args, work_dir, port):
+    from src.main import main as run_main
+
+    loader = SyntheticLoader(os.path.join(work_dir, "frames"), args.frames, unique=args.unique)
+    out_dir = os.path.join(work_dir, "output")
+    metrics_file = os.path.join(out_dir, "metrics.prom")
+    # 'MOCK' in the extra args (e.g. --endpoints MOCK MOCK, --scouts a=model@MOCK) becomes the mock's port
+    main_args = [re.sub(r"\bMOCK\b", str(port), a) for a in main_args]
+    argv = ["--model", "mock-vlm", "--output_name", "load_test", "--port", str(port),
+            "--output_dir", out_dir, "--metrics_file", metrics_file] + main_args
+
+    cpu0, t0 = cpu_seconds(), time.time()
+    run_main(argv, loader=loader, detector=NullDetector())
+    wall, cpu = time.time() - t0, cpu_seconds() - cpu0
+
+    # With --scouts, frames are counted on the first scout's files
+    name = "load_test"
+    if "--scouts" in main_args and main_args.index("--scouts") + 1 < len(main_args):
+        name = main_args[main_args.index("--scouts") + 1].split("=", 1)[0]
+    if "--queue_db" in main_args:
+        # Work-queue workers write to output/shards: fold them into the canonical files (outside the timing)
+        from src.work_queue import merge
+        merge(out_dir, name)
+    committed = count_lines(os.path.join(out_dir, f"logs_{name}.jsonl"))
+    ok = count_lines(os.path.join(out_dir, f"index_{name}.jsonl"))
+    return {
+        "frames": committed,
+        "frames_ok": ok,
+        "wall_s": round(wall, 3),
+        "fps": round(committed / wall, 3) if wall > 0 else 0.0,
+        "cpu_s": round(cpu, 3),
+        "cpu_s_per_frame": round(cpu / max(committed, 1), 5),
+        "cpu_util": round(cpu / wall, 3) if wall > 0 else 0.0,  # Cores kept busy by the client side
+        "stage_mean_s": read_metrics(metrics_file),
+        **prompt_cache_stats(os.path.join(out_dir, f"logs_{name}.jsonl")),
+    }, os.path.join(out_dir, f"index_{name}.jsonl")
+
+
+def run_judge(args, index_file, work_dir, port):
+    # 3 scouts in production; the same index three times gives the judge the same prompt size
+    out_file = os.path.join(work_dir, "output", "consensus_load_test.jsonl")
+    cmd = [sys.executable, "-m", "src.judge", "--files", index_file, index_file, index_file,
+           "--output", out_file, "--n", str(args.judge_n), "--concurrency", str(args.judge_concurrency),
+           "--judge_url", f"http://127.0.0.1:{port}/v1", "--judge_model", "mock-vlm"]
+    cpu0, t0 = cpu_seconds(resource.RUSAGE_CHILDREN), time.time()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    wall, cpu = time.time() - t0, cpu_seconds(resource.RUSAGE_CHILDREN) - cpu0
+    n = count_lines(out_file)
+    return {
+        "frames": n,
+        "wall_s": round(wall, 3),
+        "fps": round(n / wall, 3) if wall > 0 else 0.0,
+        "cpu_s": round(cpu, 3),  # Includes interpreter start-up
+        "cpu_s_per_frame": round(cpu / max(n, 1), 5),
+    }
+
+
+def check_baseline(report, baseline, tolerance):
+    """List of regressions vs. a previous report (fps down / CPU per frame up by more than 'tolerance')."""
+    problems = []
+    for part in ("mining", "judge"):
+        if part not in report or part not in baseline: continue
+        new, old = report[part], baseline[part]
+        if old.get("fps") and new["fps"] < old["fps"] * (1 - tolerance):
+            problems.append(f"{part}: fps {new['fps']} < baseline {old['fps']} (-{tolerance:.0%})")
+        if old.get("cpu_s_per_frame") and new["cpu_s_per_frame"] > old["cpu_s_per_frame"] * (1 + tolerance):
+            problems.append(f"{part}: cpu/frame {new['cpu_s_per_frame']} > baseline {old['cpu_s_per_frame']} (+{tolerance:.0%})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--unique", type=int, default=16, help="Distinct synthetic frames (cycled)")
+    parser.add_argument("--work_dir", type=str, default=None, help="Keep frames/outputs here (default: temp dir)")
+    # Mock server behaviour
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--tokens_per_sec", type=float, default=2000.0)
+    parser.add_argument("--slots", type=int, default=None)
+    parser.add_argument("--prefill_tokens_per_sec", type=float, default=None, help="Mock prompt processing speed (prefix cache hits are free)")
+    parser.add_argument("--fail_rate", type=float, default=0.0)
+    parser.add_argument("--drop_rate", type=float, default=0.0)
+    parser.add_argument("--bad_json_rate", type=float, default=0.0)
+    parser.add_argument("--replay", type=str, default=None, help="Glob of real logs_*.jsonl to replay answers from")
+    parser.add_argument("--seed", type=int, default=0)
+    # Judge
+    parser.add_argument("--skip_judge", action="store_true")
+    parser.add_argument("--judge_n", type=int, default=1)
+    parser.add_argument("--judge_concurrency", type=int, default=1, help=">1 runs the asyncio judge path")
+    # Reporting / regression gate
+    parser.add_argument("--report", type=str, default=None, help="Write the JSON report here")
+    parser.add_argument("--baseline", type=str, default=None, help="Earlier --report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args, main_args = parser.parse_known_args()
+    if main_args and main_args[0] == "--": main_args = main_args[1:]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = args.work_dir or tmp
+        os.makedirs(os.path.join(work_dir, "frames"), exist_ok=True)
+        port = free_port()
+        print(f"🧪 Load test: {args.frames} synthetic frame(s), mock VLM on :{port} (ttft={args.ttft}s, {args.tokens_per_sec} tok/s)")
+        mock = start_mock(args, port)
+        try:
+            report = {"config": {k: v for k, v in vars(args).items() if k not in ("report", "baseline")}, "main_args": main_args}
+            report["mining"], index_file = run_mining(args, main_args, work_dir, port)
+            if not args.skip_judge:
+                print("👨‍⚖️ Judge pass...")
+                report["judge"] = run_judge(args, index_file, work_dir, port)
+            report["mock"] = mock_stats(port)
+        finally:
+            mock.terminate()
+            mock.wait()
+
+    print("\n📊 LOAD TEST")
+    for part in ("mining", "judge"):
+        if part in report:
+            r = report[part]
+            print(f"   {part:<7} {r['frames']} frame(s) in {r['wall_s']}s -> {r['fps']} fps, {r['cpu_s_per_frame'] * 1000:.1f} ms CPU/frame")
+    print(f"   prompt cache: {report['mining']['cached_token_ratio']} of prompt tokens cached, mean TTFT {report['mining']['mean_ttft_s']}s")
+    for name, mean in sorted(report["mining"]["stage_mean_s"].items(), key=lambda kv: -kv[1]):
+        print(f"   stage {name:<20} mean {mean * 1000:.1f} ms")
+    print(f"   mock server: {report['mock']}")
+
+    if args.report:
+        os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report -> {args.report}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            problems = check_baseline(report, json.load(f), args.tolerance)
+        if problems:
+            for p in problems: print(f"❌ Regression: {p}")
+            sys.exit(1)
+        print(f"✅ Within {args.tolerance:.0%} of baseline {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+# src/tools/mock_vlm_server.py
+# Stand-in for LM Studio / llama.cpp / vLLM: an OpenAI-compatible /v1/chat/completions
+# that answers with canned (or replayed) VLM outputs after a configurable delay.
+# Lets us measure the Python side of mining / judging on CPU-only machines.
+#
+#   python -m src.tools.mock_vlm_server --port 8010 --ttft 0.2 --tokens_per_sec 400
+#   python -m src.tools.mock_vlm_server --port 8010 --replay "output/logs_qwen3_run.jsonl" --fail_rate 0.05
+#
+# Supports stream=true (SSE), max_tokens truncation (finish_reason='length'), 5xx / dropped
+# connection / bad-JSON injection and a server-side slot limit (--slots) to emulate batching.
+import argparse
+import glob
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A schema-valid answer (see src/model/prompts.py) used when nothing is replayed
+DEFAULT_ANSWER = {
+    "odd_attributes": {
+        "weather": "clear", "time_of_day": "day", "lighting_condition": "nominal",
+        "road_surface_friction": "dry", "sensor_integrity": "nominal"
+    },
+    "road_topology": {
+        "scene_type": "urban_street", "lane_configuration": "straight",
+        "drivable_area_status": "nominal", "traffic_controls": ["none"]
+    },
+    "key_interacting_agents": {
+        "vru_status": "none", "lead_vehicle_behavior": "nominal",
+        "adjacent_vehicle_behavior": "none", "special_agent_class": "none"
+    },
+    "scenario_criticality": {
+        "primary_challenge": "none", "ego_required_action": "lane_keep",
+        "blocking_factor": "none", "risk_score": 1
+    },
+    "wod_e2e_tags": [],
+    "description": "Nominal urban driving with no hazards in view."
+}
+DEFAULT_THINK = "1. Detailed Visual Sweep: the road ahead is clear. 2. Grounding: inventory matches. " * 8
+
+
+def default_response():
+    text = f"<think>\n{DEFAULT_THINK}\n</think>\n```json\n{json.dumps(DEFAULT_ANSWER, indent=2)}\n```"
+    return {"content": text, "reasoning": None}
+
+
+def load_replay(pattern):
+    """Successful raw responses (+ reasoning traces) from logs_*.jsonl files."""
+    responses = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    if entry.get("success") and entry.get("raw_response"):
+                        responses.append({"content": entry["raw_response"], "reasoning": entry.get("reasoning_trace")})
+                except: pass
+    return responses
+
+
+def _count_tokens(text):
+    return max(1, len(text) // 4)  # ~4 chars per token is close enough for throughput math
+
+
+def _prompt_parts(messages):
+    """[(part hash, tokens)] in prompt order: one part per message string / content item."""
+    parts = []
+    for msg in messages:
+        content = msg.get("content")
+        items = [{"type": "text", "text": content}] if isinstance(content, str) else (content or [])
+        for item in items:
+            if item.get("type") == "image_url":
+                blob, tokens = item["image_url"]["url"], 1000  # Roughly one 1280px tile for Qwen-VL
+            else:
+                blob, tokens = item.get("text", ""), _count_tokens(item.get("text", ""))
+            parts.append((hashlib.sha1(f"{msg.get('role')}:{blob}".encode()).hexdigest(), tokens))
+    return parts
+
+
+class MockVLMServer:
+    def __init__(self, port=8010, host="127.0.0.1", ttft=0.2, tokens_per_sec=400.0, slots=None,
+                 fail_rate=0.0, drop_rate=0.0, bad_json_rate=0.0, responses=None, seed=None, reject_response_format=False,
+                 prefill_tokens_per_sec=None, prefix_cache_size=4096):
+        self.host = host
+        self.port = port
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.fail_rate = fail_rate
+        self.drop_rate = drop_rate
+        self.bad_json_rate = bad_json_rate
+        self.reject_response_format = reject_response_format  # Behave like a server without structured outputs
+        self.responses = responses or [default_response()]
+        self.slots = threading.BoundedSemaphore(slots) if slots else None
+        # Prefix (KV) cache emulation: uncached prompt tokens cost 1/prefill_tokens_per_sec each
+        self.prefill_tokens_per_sec = prefill_tokens_per_sec
+        self.prefix_cache = OrderedDict()  # Chained part hashes -> True (LRU)
+        self.prefix_cache_size = prefix_cache_size
+        self.rng = random.Random(seed)
+        self.stats = {"requests": 0, "failed": 0, "dropped": 0, "bad_json": 0, "completion_tokens": 0,
+                      "prompt_tokens": 0, "cached_tokens": 0}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _pick(self):
+        with self._lock:
+            self.stats["requests"] += 1
+            roll = self.rng.random()
+            response = self.rng.choice(self.responses)
+        if roll < self.fail_rate:
+            return "fail", None
+        if roll < self.fail_rate + self.drop_rate:
+            return "drop", None
+        if roll < self.fail_rate + self.drop_rate + self.bad_json_rate:
+            return "bad_json", {"content": "I could not decide on an answer for this scene.", "reasoning": None}
+        return "ok", response
+
+    def _prefix_lookup(self, messages):
+        """(prompt tokens, tokens covered by an earlier prompt's prefix), then caches this prompt's prefixes."""
+        parts = _prompt_parts(messages)
+        total = sum(tokens for _, tokens in parts)
+        cached = 0
+        chain = ""
+        with self._lock:
+            hit = True
+            for part_hash, tokens in parts:
+                chain = hashlib.sha1((chain + part_hash).encode()).hexdigest()
+                if hit and chain in self.prefix_cache:
+                    cached += tokens
+                    self.prefix_cache.move_to_end(chain)
+                else:
+                    hit = False
+                    self.prefix_cache[chain] = True
+            while len(self.prefix_cache) > self.prefix_cache_size:
+                self.prefix_cache.popitem(last=False)
+            self.stats["prompt_tokens"] += total
+            self.stats["cached_tokens"] += cached
+        return total, cached
+
+    def _bump(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, code, obj):
+                body = json.dumps(obj).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json(200, {"object": "list", "data": [{"id": "mock-vlm", "object": "model"}]})
+                elif self.path.rstrip("/").endswith("/stats"):
+                    self._send_json(200, server.stats)
+                else:
+                    self._send_json(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if server.reject_response_format and "response_format" in request:
+                    self._send_json(400, {"error": {"message": "response_format is not supported", "type": "invalid_request_error"}})
+                    return
+                outcome, response = server._pick()
+                if outcome == "fail":
+                    server._bump("failed")
+                    self._send_json(500, {"error": {"message": "Injected server failure", "type": "server_error"}})
+                    return
+                if outcome == "drop":
+                    server._bump("dropped")
+                    self.close_connection = True  # No response at all -> connection error client-side
+                    return
+                if outcome == "bad_json":
+                    server._bump("bad_json")
+
+                if server.slots: server.slots.acquire()
+                try:
+                    server._serve_completion(self, request, response)
+                finally:
+                    if server.slots: server.slots.release()
+
+        return Handler
+
+    def _serve_completion(self, handler, request, response):
+        content = response["content"]
+        reasoning = response.get("reasoning")
+        max_tokens = request.get("max_tokens") or 10**9
+        finish_reason = "stop"
+        if _count_tokens(content) > max_tokens:
+            content = content[:max_tokens * 4]
+            finish_reason = "length"
+        completion_tokens = _count_tokens(content) + (_count_tokens(reasoning) if reasoning else 0)
+        prompt_tokens, cached_tokens = self._prefix_lookup(request.get("messages", []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens,
+                 "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": request.get("model", "mock-vlm")}
+
+        prefill = (prompt_tokens - cached_tokens) / self.prefill_tokens_per_sec if self.prefill_tokens_per_sec else 0.0
+        # llama.cpp-style server timings (sent on the final chunk when streaming)
+        timings = {"prompt_n": prompt_tokens - cached_tokens, "prompt_ms": (self.ttft + prefill) * 1000, "cache_n": cached_tokens}
+        time.sleep(self.ttft + prefill)
+        if not request.get("stream"):
+            time.sleep(completion_tokens / self.tokens_per_sec)
+            message = {"role": "assistant", "content": content}
+            if reasoning: message["reasoning_content"] = reasoning
+            self._bump("completion_tokens", completion_tokens)
+            handler._send_json(200, dict(base, object="chat.completion", usage=usage, timings=timings,
+                                         choices=[{"index": 0, "message": message, "finish_reason": finish_reason}]))
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.end_headers()
+
+        def send(delta, finish=None, with_usage=False):
+            chunk = dict(base, object="chat.completion.chunk",
+                         choices=[{"index": 0, "delta": delta, "finish_reason": finish}])
+            if with_usage: chunk["usage"], chunk["timings"] = usage, timings
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            handler.wfile.flush()
+
+        # ~4 chars per token, flushed in slices of >= 10ms so sleeps stay cheap
+        per_slice = max(1, int(self.tokens_per_sec * 0.01)) * 4
+        sent_tokens = 0
+        try:
+            send({"role": "assistant"})
+            for field, text in (("reasoning_content", reasoning), ("content", content)):
+                if not text: continue
+                for i in range(0, len(text), per_slice):
+                    piece = text[i:i + per_slice]
+                    time.sleep(_count_tokens(piece) / self.tokens_per_sec)
+                    send({field: piece})
+                    sent_tokens += _count_tokens(piece)
+            send({}, finish=finish_reason, with_usage=True)
+            handler.wfile.write(b"data: [DONE]\n\n")
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client hung up early (e.g. streaming early stop)
+        finally:
+            self._bump("completion_tokens", sent_tokens)
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), self.make_handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--ttft", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens_per_sec", type=float, default=400.0, help="Generation speed per request")
+    parser.add_argument("--slots", type=int, default=None, help="Max requests generating at once (others queue)")
+    parser.add_argument("--fail_rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--drop_rate", type=float, default=0.0, help="Fraction of connections closed without a response")
+    parser.add_argument("--bad_json_rate", type=float, default=0.0, help="Fraction of answers without any JSON")
+    parser.add_argument("--replay", type=str, default=None, help="Glob of logs_*.jsonl whose successful raw responses are replayed")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--reject_response_format", action="store_true", help="Answer 400 to requests with response_format")
+    parser.add_argument("--prefill_tokens_per_sec", type=float, default=None, help="Emulate prompt processing: uncached prompt tokens add to the TTFT")
+    args = parser.parse_args()
+
+    responses = load_replay(args.replay) if args.replay else None
+    if args.replay:
+        print(f"🎞️ Replaying {len(responses or [])} response(s) from {args.replay}")
+    server = MockVLMServer(args.port, args.host, ttft=args.ttft, tokens_per_sec=args.tokens_per_sec, slots=args.slots,
+                           fail_rate=args.fail_rate, drop_rate=args.drop_rate, bad_json_rate=args.bad_json_rate,
+                           responses=responses, seed=args.seed, reject_response_format=args.reject_response_format,
+                           prefill_tokens_per_sec=args.prefill_tokens_per_sec).start()
+    print(f"🧪 Mock VLM server on http://{args.host}:{args.port}/v1 (ttft={args.ttft}s, {args.tokens_per_sec} tok/s)")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"\n🛑 Stopping. Stats: {server.stats}")
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# src/tracing.py
+# Per-stage spans and live metrics for mining runs.
+#
+# Spans (decode, detect, encode, queue waits, request queueing, generation, parsing,
+# backoff, write) are kept in memory and written at the end as a Chrome trace
+# (open in chrome://tracing or https://ui.perfetto.dev). While the run is going,
+# a snapshot with throughput, ETA, queue depths and p50/p95/p99 per stage is
+# rewritten to a text file and/or served on http://127.0.0.1:<port>/metrics (/json).
+#
+#   python -m src.main ... --pipeline --trace output/trace.json --metrics_file output/metrics.prom --metrics_port 9100
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "token", "start")
+
+    def __init__(self, tracer, name, token):
+        self.tracer = tracer
+        self.name = name
+        self.token = token
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add_span(self.name, self.start, time.time(), self.token)
+
+
+class _NullSpan:
+    def __enter__(self): return self
+    def __exit__(self, *exc): pass
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    def __init__(self, enabled=True, trace_file=None, metrics_file=None, metrics_port=None,
+                 total=None, interval=10.0, window=2048, max_spans=500000):
+        self.enabled = enabled
+        self.trace_file = trace_file
+        self.metrics_file = metrics_file
+        self.metrics_port = metrics_port
+        self.total = total
+        self.interval = interval
+        self.window = window
+        self.max_spans = max_spans
+
+        self.t_start = time.time()
+        self.events = []       # (name, tid, start, end, token) for the trace file
+        self.latencies = {}    # stage -> recent durations (seconds)
+        self.counters = {}
+        self.gauges = {}       # name -> zero-arg callable (e.g. queue.qsize)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+
+    # --- RECORDING ---
+
+    def span(self, name, token=None):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, token)
+
+    def add_span(self, name, start, end, token=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            if name not in self.latencies:
+                self.latencies[name] = deque(maxlen=self.window)
+            self.latencies[name].append(end - start)
+            if self.trace_file and len(self.events) < self.max_spans:
+                self.events.append((name, threading.get_ident(), start, end, token))
+
+    def add_timings(self, timings, token=None):
+        """Spans measured elsewhere (e.g. result['timings'] from the VLM client): [(name, start, end)]."""
+        for name, start, end in timings or []:
+            self.add_span(name, start, end, token)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, fn):
+        self.gauges[name] = fn
+
+    # --- METRICS ---
+
+    def snapshot(self):
+        with self._lock:
+            latencies = {k: np.array(v) for k, v in self.latencies.items() if v}
+            counters = dict(self.counters)
+        elapsed = time.time() - self.t_start
+        done = counters.get("frames_committed", 0)
+        fps = done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - done) / fps if (self.total and fps > 0) else None
+
+        stages = {}
+        for name, arr in latencies.items():
+            p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+            stages[name] = {"n": len(arr), "mean": float(arr.mean()), "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+        queues = {}
+        for name, fn in self.gauges.items():
+            try: queues[name] = fn()
+            except Exception: pass
+
+        return {
+            "elapsed_s": round(elapsed, 1),
+            "frames_committed": done,
+            "total": self.total,
+            "throughput_fps": round(fps, 4),
+            "eta_s": round(eta, 1) if eta is not None else None,
+            "counters": counters,
+            "queues": queues,
+            "stages": stages,
+        }
+
+    def render_text(self, snap=None):
+        """Prometheus text exposition of a snapshot."""
+        snap = snap or self.snapshot()
+        lines = [
+            f"semantic_drive_elapsed_seconds {snap['elapsed_s']}",
+            f"semantic_drive_throughput_fps {snap['throughput_fps']}",
+        ]
+        if snap["total"] is not None:
+            lines.append(f"semantic_drive_frames_target {snap['total']}")
+        if snap["eta_s"] is not None:
+            lines.append(f"semantic_drive_eta_seconds {snap['eta_s']}")
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"semantic_drive_{name}_total {value}")
+        for name, depth in sorted(snap["queues"].items()):
+            lines.append(f'semantic_drive_queue_depth{{queue="{name}"}} {depth}')
+        for name, s in sorted(snap["stages"].items()):
+            for q in ("p50", "p95", "p99"):
+                lines.append(f'semantic_drive_stage_latency_seconds{{stage="{name}",quantile="0.{q[1:]}"}} {s[q]:.4f}')
+            lines.append(f'semantic_drive_stage_latency_seconds_mean{{stage="{name}"}} {s["mean"]:.4f}')
+            lines.append(f'semantic_drive_stage_samples{{stage="{name}"}} {s["n"]}')
+        return "\n".join(lines) + "\n"
+
+    def _write_metrics(self):
+        tmp = self.metrics_file + ".tmp"
+        with open(tmp, 'w') as f:
+            f.write(self.render_text())
+        os.replace(tmp, self.metrics_file)  # Readers never see a half-written file
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try: self._write_metrics()
+            except Exception as e: print(f"\n⚠️ Metrics write failed: {e}")
+
+    def _serve(self):
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/json"):
+                    body, ctype = json.dumps(tracer.snapshot(), indent=2).encode(), "application/json"
+                else:
+                    body, ctype = tracer.render_text().encode(), "text/plain; version=0.0.4"
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Keep tqdm output clean
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.metrics_port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"📈 Metrics on http://127.0.0.1:{self.metrics_port}/metrics")
+
+    # --- LIFECYCLE ---
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        self.t_start = time.time()
+        if self.metrics_file:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        if self.metrics_port:
+            self._serve()
+        return self
+
+    def __exit__(self, *exc):
+        if not self.enabled:
+            return
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+        if self.metrics_file:
+            self._write_metrics()
+        if self.trace_file:
+            self.write_trace()
+        snap = self.snapshot()
+        print(f"📈 Run: {snap['frames_committed']} frame(s) in {snap['elapsed_s']}s ({snap['throughput_fps']} fps)")
+        for name, s in sorted(snap["stages"].items(), key=lambda kv: -kv[1]["mean"] * kv[1]["n"]):
+            print(f"   {name:<22} n={s['n']:<6} p50={s['p50']:.3f}s p95={s['p95']:.3f}s p99={s['p99']:.3f}s")
+
+    def write_trace(self):
+        with self._lock:
+            events = list(self.events)
+        tids = {}
+        trace = []
+        for name, tid, start, end, token in events:
+            trace.append({
+                "name": name, "ph": "X", "pid": os.getpid(),
+                "tid": tids.setdefault(tid, len(tids)),
+                "ts": int((start - self.t_start) * 1e6), "dur": int((end - start) * 1e6),
+                "args": {"token": token} if token else {},
+            })
+        with open(self.trace_file, 'w') as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        print(f"🧵 Trace with {len(trace)} span(s) -> {self.trace_file}")
+
+
+NULL_TRACER = Tracer(enabled=False)
@@ -0,0 +1,223 @@
+# src/work_queue.py
+# Lease-based work queue so several machines can mine the same run without overlap.
+#
+# The queue is a single SQLite file on a shared volume. Workers lease small batches of
+# sample tokens, a heartbeat thread keeps their leases alive, and leases of dead workers
+# expire and are handed out again. Each worker writes its own index/log shard
+# (shards/index_{name}.{worker}.jsonl) and 'merge' folds the shards into the canonical files.
+#
+# NOTE: we keep SQLite's default rollback journal (no WAL) because WAL needs shared
+# memory and does not work on network filesystems.
+#
+# Usage:
+#   python -m src.main --model X --output_name run --sparse --queue_db /shared/run.sqlite   (on every box)
+#   python -m src.work_queue status --db /shared/run.sqlite
+#   python -m src.work_queue merge  --output_name run
+import argparse
+import glob
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+SHARD_DIR = "shards"  # Under the output dir
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    def __init__(self, db_path, lease_seconds=600):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()  # One connection shared by the worker + heartbeat threads
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                token TEXT PRIMARY KEY,
+                seq INTEGER,
+                status TEXT NOT NULL DEFAULT 'pending',  -- pending | leased | done | failed
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated REAL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, seq)")
+
+    def _tx(self, fn):
+        # BEGIN IMMEDIATE takes the write lock up-front so two workers can never lease the same rows
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self.conn)
+                self.conn.execute("COMMIT")
+                return out
+            except:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def seed(self, tokens):
+        """Idempotent: every worker may seed the same token list."""
+        rows = [(t, i, time.time()) for i, t in enumerate(tokens)]
+        def fn(c):
+            before = c.total_changes
+            c.executemany("INSERT OR IGNORE INTO tasks(token, seq, updated) VALUES (?, ?, ?)", rows)
+            return c.total_changes - before
+        return self._tx(fn)
+
+    def lease(self, worker_id, batch_size=8):
+        """Returns up to batch_size tokens, reclaiming expired leases first-come."""
+        def fn(c):
+            now = time.time()
+            reclaimed = c.execute(
+                "UPDATE tasks SET status='pending', worker=NULL WHERE status='leased' AND lease_expires < ?", (now,)
+            ).rowcount
+            if reclaimed:
+                print(f"\n♻️ Reclaimed {reclaimed} stale lease(s)")
+            tokens = [r[0] for r in c.execute(
+                "SELECT token FROM tasks WHERE status='pending' ORDER BY seq LIMIT ?", (batch_size,))]
+            c.executemany(
+                "UPDATE tasks SET status='leased', worker=?, lease_expires=?, attempts=attempts+1, updated=? WHERE token=?",
+                [(worker_id, now + self.lease_seconds, now, t) for t in tokens])
+            return tokens
+        return self._tx(fn)
+
+    def heartbeat(self, worker_id):
+        def fn(c):
+            now = time.time()
+            return c.execute(
+                "UPDATE tasks SET lease_expires=?, updated=? WHERE status='leased' AND worker=?",
+                (now + self.lease_seconds, now, worker_id)).rowcount
+        return self._tx(fn)
+
+    def complete(self, worker_id, token, success=True):
+        status = 'done' if success else 'failed'
+        def fn(c):
+            # Only the lease holder may finish a task (a reclaimed lease belongs to someone else now)
+            return c.execute(
+                "UPDATE tasks SET status=?, lease_expires=NULL, updated=? WHERE token=? AND worker=? AND status='leased'",
+                (status, time.time(), token, worker_id)).rowcount
+        return self._tx(fn)
+
+    def release(self, worker_id):
+        """Hand unfinished leases back on clean shutdown instead of waiting for expiry."""
+        return self._tx(lambda c: c.execute(
+            "UPDATE tasks SET status='pending', worker=NULL, lease_expires=NULL WHERE status='leased' AND worker=?",
+            (worker_id,)).rowcount)
+
+    def requeue_failed(self):
+        return self._tx(lambda c: c.execute(
+            "UPDATE tasks SET status='pending', worker=NULL WHERE status='failed'").rowcount)
+
+    def counts(self):
+        with self._lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+
+    def iter_tokens(self, worker_id, batch_size=8):
+        """Yields leased tokens batch by batch until the queue is drained."""
+        while True:
+            tokens = self.lease(worker_id, batch_size)
+            if not tokens:
+                return
+            yield from tokens
+
+
+class LeaseHeartbeat:
+    """Background thread extending this worker's leases every 'interval' seconds."""
+    def __init__(self, work_queue, worker_id, interval=None):
+        self.wq = work_queue
+        self.worker_id = worker_id
+        self.interval = interval or max(1.0, work_queue.lease_seconds / 3)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try: self.wq.heartbeat(self.worker_id)
+            except Exception as e: print(f"\n⚠️ Heartbeat failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def shard_paths(output_dir, output_name, worker_id):
+    """
+    Per-worker index/log files. They live in their own folder so the logs_*.jsonl globs
+    over output_dir (analytics) never count a shard and the merged file twice.
+    """
+    shard_dir = os.path.join(output_dir, SHARD_DIR)
+    os.makedirs(shard_dir, exist_ok=True)
+    return (os.path.join(shard_dir, f"index_{output_name}.{worker_id}.jsonl"),
+            os.path.join(shard_dir, f"logs_{output_name}.{worker_id}.jsonl"))
+
+
+def _merge_files(canonical, shards, key_fn):
+    seen = set()
+    lines = []
+    for path in [canonical] + shards:
+        if not os.path.exists(path): continue
+        with open(path, 'r') as f:
+            for line in f:
+                try: key = key_fn(json.loads(line))
+                except: continue
+                if key in seen: continue
+                seen.add(key)
+                lines.append(line if line.endswith("\n") else line + "\n")
+
+    tmp = canonical + ".tmp"
+    with open(tmp, 'w') as f:
+        f.writelines(lines)
+    os.replace(tmp, canonical)  # Atomic: readers never see a half-written index
+    return len(lines)
+
+
+def merge(output_dir, output_name):
+    """Folds all worker shards (output_dir/shards) into index_{name}.jsonl / logs_{name}.jsonl. Safe to re-run."""
+    index_file = os.path.join(output_dir, f"index_{output_name}.jsonl")
+    log_file = os.path.join(output_dir, f"logs_{output_name}.jsonl")
+    shard_dir = os.path.join(output_dir, SHARD_DIR)
+    index_shards = sorted(glob.glob(os.path.join(shard_dir, f"index_{output_name}.*.jsonl")))
+    log_shards = sorted(glob.glob(os.path.join(shard_dir, f"logs_{output_name}.*.jsonl")))
+
+    n_index = _merge_files(index_file, index_shards, lambda o: o['token'])
+    # Logs keep every attempt (failures included), so only drop exact re-merges
+    n_log = _merge_files(log_file, log_shards, lambda o: (o['token'], o.get('timestamp')))
+    print(f"✅ Merged {len(index_shards)} shard(s): {n_index} index rows -> {index_file}, {n_log} log rows -> {log_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_status = sub.add_parser("status", help="Show task counts")
+    p_status.add_argument("--db", required=True)
+
+    p_requeue = sub.add_parser("requeue-failed", help="Put failed tokens back to pending")
+    p_requeue.add_argument("--db", required=True)
+
+    p_merge = sub.add_parser("merge", help="Merge worker shards into the canonical index/log")
+    p_merge.add_argument("--output_name", required=True)
+    p_merge.add_argument("--output_dir", default="output")
+    args = parser.parse_args()
+
+    if args.cmd == "status":
+        counts = WorkQueue(args.db).counts()
+        total = sum(counts.values())
+        print(f"📋 {args.db}: {total} tasks")
+        for status in ["pending", "leased", "done", "failed"]:
+            print(f"   {status:<8} {counts.get(status, 0)}")
+    elif args.cmd == "requeue-failed":
+        print(f"♻️ Requeued {WorkQueue(args.db).requeue_failed()} failed task(s)")
+    elif args.cmd == "merge":
+        merge(args.output_dir, args.output_name)
+
+if __name__ == "__main__":
+    main()